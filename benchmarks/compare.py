@@ -0,0 +1,52 @@
+"""Compare two result files written by benchmarks.load.
+
+    python -m benchmarks.compare before.json after.json
+
+Latency changes are shown as a percentage of the first run, negative is
+faster. Runs are only comparable when made on the same machine with the
+same arguments.
+"""
+
+import argparse
+import json
+
+METRICS = ["rps", "p50_ms", "p95_ms", "p99_ms"]
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return "    n/a"
+    return f"{(after - before) / before * 100:+6.1f}%"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    if before["arguments"] != after["arguments"]:
+        print("Warning: the runs used different arguments")
+    print(f"{before['commit'][:10]} -> {after['commit'][:10]}")
+    print(f"{'route':26} " + " ".join(f"{metric:>18}" for metric in METRICS))
+
+    routes = [*before["routes"], "TOTAL"]
+    for name in routes:
+        old = before["total"] if name == "TOTAL" else before["routes"][name]
+        new = after["total"] if name == "TOTAL" else after["routes"].get(name)
+        if new is None:
+            continue
+        cells = [
+            f"{new[metric]:9.2f} {change(old[metric], new[metric])}"
+            for metric in METRICS
+        ]
+        print(f"{name:26} " + " ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Measure the CPU cost and size savings of compressing feed responses.
+
+    python -m benchmarks.compression --posts 20 100 --repeat 200
+
+Builds feed pages shaped like GET /post responses and, for every encoding
+available (gzip always, brotli and zstd when installed) at a few levels,
+reports the compressed size, the time to compress a page and the time to
+serve it from the compressed cache instead.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from benchmarks.seed import sentence
+from socialink.compression import CompressedCache, available_codecs
+
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 5, 11], "zstd": [1, 3, 19]}
+
+
+def feed_page(rng: random.Random, posts: int) -> bytes:
+    page = [
+        {
+            "id": post_id,
+            "body": sentence(rng, rng.randint(5, 40)),
+            "user_id": rng.randint(1, 10_000),
+            "image_url": None,
+            "thumbnail_url": None,
+            "medium_url": None,
+            "image_status": None,
+            "likes": rng.randint(0, 500),
+        }
+        for post_id in range(1, posts + 1)
+    ]
+    return json.dumps(page).encode()
+
+
+def codec(encoding: str, level: int):
+    return available_codecs(gzip_level=level, brotli_quality=level, zstd_level=level)[
+        encoding
+    ]
+
+
+def per_call(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    encodings = list(available_codecs())
+    print(f"encodings available: {', '.join(encodings)}")
+    print(
+        f"{'page':>10} {'encoding':>8} {'level':>5} {'bytes':>8} {'ratio':>6} "
+        f"{'compress':>10} {'MB/s':>7} {'cached':>8}"
+    )
+    for posts in args.posts:
+        body = feed_page(rng, posts)
+        print(f"{posts:>4} posts {'identity':>8} {'':>5} {len(body):>8}")
+        for encoding in encodings:
+            for level in LEVELS[encoding]:
+                compress = codec(encoding, level)
+                compressed = compress(body)
+                seconds = per_call(lambda: compress(body), args.repeat)
+
+                cache = CompressedCache(64 * 1024 * 1024)
+                cache.put(cache.key(encoding, body), compressed)
+                cached = per_call(
+                    lambda: cache.get(cache.key(encoding, body)), args.repeat
+                )
+                print(
+                    f"{'':>10} {encoding:>8} {level:>5} {len(compressed):>8} "
+                    f"{len(body) / len(compressed):>5.1f}x "
+                    f"{seconds * 1e6:>8.0f}us {len(body) / seconds / 1e6:>7.0f} "
+                    f"{cached * 1e6:>6.1f}us"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Measure what idle /events listeners cost a worker and how fast posts reach them.
+
+    python -m benchmarks.events --connections 10000
+
+Starts one uvicorn worker against a fresh SQLite database, opens
+--connections idle Server-Sent Events streams, and reports the worker's
+memory per connection and how long a new post takes to reach every stream.
+"""
+
+import argparse
+import asyncio
+import pathlib
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from passlib.context import CryptContext
+
+from benchmarks.workers import seed, server_env, wait_until_up
+
+EMAIL, PASSWORD = "b@b", "benchmark"
+
+
+def rss(pid: int) -> int:
+    for line in pathlib.Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) * 1024
+    raise RuntimeError("No VmRSS")
+
+
+def raise_file_limit(connections: int) -> None:
+    # Each connection is a file descriptor on both ends, the server inherits this
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, connections + 1024)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+    if wanted < connections + 1024:
+        print(f"warning: open file limit is {hard}, raise it for more connections")
+
+
+def add_login(database: pathlib.Path) -> None:
+    connection = sqlite3.connect(database)
+    password = CryptContext(schemes=["bcrypt"]).hash(PASSWORD)
+    connection.execute(
+        "UPDATE users SET password = ?, confirmed = 1 WHERE email = ?",
+        (password, EMAIL),
+    )
+    connection.commit()
+    connection.close()
+
+
+async def listen(host: str, port: int) -> tuple:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /events HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b"retry: 3000\n\n")
+    return reader, writer
+
+
+async def receive_post(reader: asyncio.StreamReader, started: list) -> float:
+    await reader.readuntil(b"event: post\n")
+    return time.perf_counter() - started[0]
+
+
+async def measure(args: argparse.Namespace, pid: int) -> None:
+    base_url = f"http://127.0.0.1:{args.port}"
+    idle_rss = rss(pid)
+
+    streams = []
+    for start in range(0, args.connections, args.batch):
+        batch = min(args.batch, args.connections - start)
+        streams += await asyncio.gather(
+            *(listen("127.0.0.1", args.port) for _ in range(batch))
+        )
+    await asyncio.sleep(1)
+    per_connection = (rss(pid) - idle_rss) / args.connections
+    print(
+        f"{args.connections} idle streams: "
+        f"{(rss(pid) - idle_rss) / 2**20:.1f} MiB, "
+        f"{per_connection / 1024:.1f} KiB per stream"
+    )
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        response = await client.post(
+            "/token", json={"email": EMAIL, "password": PASSWORD}
+        )
+        token = response.json()["access_token"]
+        started = [0.0]
+        receiving = [
+            asyncio.create_task(receive_post(reader, started)) for reader, _ in streams
+        ]
+        started[0] = time.perf_counter()
+        await client.post(
+            "/post",
+            json={"body": "Fan out"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        latencies = sorted(await asyncio.gather(*receiving))
+
+    print(
+        f"post delivered to all streams in {latencies[-1] * 1000:.0f} ms "
+        f"(p50 {statistics.median(latencies) * 1000:.0f} ms)"
+    )
+    for _, writer in streams:
+        writer.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    raise_file_limit(args.connections)
+    with tempfile.TemporaryDirectory() as workdir:
+        database = pathlib.Path(workdir) / "events.db"
+        seed(database, 1)
+        add_login(database)
+        env = {
+            **server_env(database),
+            "PROD_EVENTS_MAX_SUBSCRIBERS": str(args.connections),
+        }
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "socialink.main:app",
+                "--port",
+                str(args.port),
+                "--backlog",
+                str(args.batch * 2),
+                "--log-level",
+                "warning",
+            ],
+            cwd=workdir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(f"http://127.0.0.1:{args.port}")
+            asyncio.run(measure(args, server.pid))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Measure upload image processing throughput per worker process.
+
+    python -m benchmarks.images --workers 1 2 4 --images 40
+
+Every run encodes the upload variants (UPLOAD_VARIANT_WIDTHS in
+UPLOAD_VARIANT_FORMATS) of --images copies of a synthetic photo in a pool of
+worker processes, the same way /upload does, and reports images per second
+in total and per worker.
+"""
+
+import argparse
+import multiprocessing
+import os
+import pathlib
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageFilter
+
+# socialink reads its config on import, in here and in the spawned workers
+os.environ.setdefault("ENV_STATE", "prod")
+
+from socialink.config import GlobalConfig  # noqa: E402
+from socialink.libs.images import encode_variants  # noqa: E402
+
+
+def sample_photo(path: pathlib.Path, width: int, height: int, format: str) -> None:
+    # Blurred noise compresses roughly like a photo, unlike a flat colour
+    rng = random.Random(42)
+    noise = Image.frombytes(
+        "RGB", (width // 8, height // 8), rng.randbytes(width * height * 3 // 64)
+    )
+    image = noise.resize((width, height)).filter(ImageFilter.GaussianBlur(2))
+    image.save(path, format, quality=90)
+
+
+def run(
+    path: pathlib.Path, images: int, workers: int, widths: list, formats: list
+) -> float:
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as executor:
+        # Warm the workers up so process start up isn't measured
+        warm_up = [str(path)] * workers
+        list(
+            executor.map(
+                encode_variants, warm_up, [[16]] * workers, [["JPEG"]] * workers
+            )
+        )
+        started = time.perf_counter()
+        list(
+            executor.map(
+                encode_variants,
+                [str(path)] * images,
+                [widths] * images,
+                [formats] * images,
+            )
+        )
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    defaults = GlobalConfig()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()])
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--size", default="4000x3000")
+    parser.add_argument("--format", choices=["JPEG", "PNG"], default="JPEG")
+    parser.add_argument(
+        "--widths", type=int, nargs="+", default=defaults.UPLOAD_VARIANT_WIDTHS
+    )
+    parser.add_argument("--formats", nargs="+", default=defaults.UPLOAD_VARIANT_FORMATS)
+    args = parser.parse_args()
+
+    width, height = map(int, args.size.split("x"))
+    with tempfile.TemporaryDirectory() as directory:
+        path = pathlib.Path(directory) / f"photo.{args.format.lower()}"
+        sample_photo(path, width, height, args.format)
+        print(
+            f"{args.images} {args.size} {args.format} images "
+            f"({path.stat().st_size / 1024:.0f} KiB) -> "
+            f"{len(args.widths) * len(args.formats)} variants each"
+        )
+        for workers in args.workers:
+            elapsed = run(path, args.images, workers, args.widths, args.formats)
+            rate = args.images / elapsed
+            print(
+                f"workers={workers:<3} {rate:7.1f} images/s "
+                f"{rate / workers:7.1f} images/s per core"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""Load test every route and report latency percentiles.
+
+    python -m benchmarks.load --duration 30 --users 50 --output results.json
+
+By default the app runs in-process against a freshly seeded SQLite database
+with Mailgun, DeepAI and B2 stubbed out, so no network access is needed.
+Pass --url to drive an already running server instead (nothing is stubbed
+then and the server's database must have been seeded with benchmarks.seed).
+Results are written as JSON and can be compared with benchmarks.compare.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import pathlib
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+import types
+from collections import defaultdict
+from unittest import mock
+
+import httpx
+
+from benchmarks import seed as seeding
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name: str, seconds: float, ok: bool) -> None:
+        self.latencies[name].append(seconds * 1000)
+        if not ok:
+            self.errors[name] += 1
+
+    def summary(self, duration: float) -> dict:
+        routes = {
+            name: summarize(latencies, self.errors[name], duration)
+            for name, latencies in sorted(self.latencies.items())
+        }
+        everything = [ms for latencies in self.latencies.values() for ms in latencies]
+        total = summarize(everything, sum(self.errors.values()), duration)
+        return {"routes": routes, "total": total}
+
+
+def summarize(latencies: list[float], errors: int, duration: float) -> dict:
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 2),
+        "p50_ms": round(p50, 3),
+        "p95_ms": round(p95, 3),
+        "p99_ms": round(p99, 3),
+    }
+
+
+def png_bytes() -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (200, 120, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class Scenario:
+    def __init__(self, client: httpx.AsyncClient, args, rng: random.Random):
+        self.client = client
+        self.args = args
+        self.rng = rng
+        self.tokens: list[str] = []
+        self.refresh_tokens: list[str] = []
+        self.registered = 0
+        self.image = png_bytes()
+
+    def auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+
+    def post_id(self) -> int:
+        return self.rng.randint(1, self.args.posts)
+
+    def user_id(self) -> int:
+        return self.rng.randint(1, self.args.seed_users)
+
+    async def login(self) -> httpx.Response:
+        user = self.user_id()
+        response = await self.client.post(
+            "/token",
+            json={"email": f"user{user}@example.com", "password": seeding.PASSWORD},
+        )
+        if response.status_code == 200:
+            self.tokens.append(response.json()["access_token"])
+            self.refresh_tokens.append(response.json()["refresh_token"])
+        return response
+
+    async def refresh(self) -> httpx.Response:
+        # Each refresh token works once, so one is taken out while it is in
+        # use and the one handed back goes in its place
+        if not self.refresh_tokens:
+            return await self.login()
+        token = self.refresh_tokens.pop(self.rng.randrange(len(self.refresh_tokens)))
+        response = await self.client.post(
+            "/token/refresh", json={"refresh_token": token}
+        )
+        if response.status_code == 200:
+            self.tokens.append(response.json()["access_token"])
+            self.refresh_tokens.append(response.json()["refresh_token"])
+        return response
+
+    async def get_feed(self) -> httpx.Response:
+        sorting = self.rng.choice(["new", "old", "most_likes", "trending"])
+        return await self.client.get("/post", params={"sorting": sorting, "limit": 20})
+
+    async def get_post(self) -> httpx.Response:
+        return await self.client.get(f"/post/{self.post_id()}")
+
+    async def get_posts(self) -> httpx.Response:
+        ids = ",".join(str(self.post_id()) for _ in range(20))
+        return await self.client.get("/posts", params={"ids": ids})
+
+    async def get_comments(self) -> httpx.Response:
+        return await self.client.get(f"/post/{self.post_id()}/comments")
+
+    async def get_timeline(self) -> httpx.Response:
+        return await self.client.get("/timeline", headers=self.auth())
+
+    async def search(self) -> httpx.Response:
+        return await self.client.get("/search", params={"q": "cats"})
+
+    async def create_post(self) -> httpx.Response:
+        return await self.client.post(
+            "/post", json={"body": "Benchmark post about cats"}, headers=self.auth()
+        )
+
+    async def create_post_with_prompt(self) -> httpx.Response:
+        return await self.client.post(
+            "/post",
+            params={"prompt": "A cat"},
+            json={"body": "Benchmark post with an image"},
+            headers=self.auth(),
+        )
+
+    async def create_comment(self) -> httpx.Response:
+        return await self.client.post(
+            "/comment",
+            json={"body": "Benchmark comment", "post_id": self.post_id()},
+            headers=self.auth(),
+        )
+
+    async def like(self) -> httpx.Response:
+        return await self.client.post(
+            "/like", json={"post_id": self.post_id()}, headers=self.auth()
+        )
+
+    async def follow(self) -> httpx.Response:
+        return await self.client.post(f"/follow/{self.user_id()}", headers=self.auth())
+
+    async def register(self) -> httpx.Response:
+        self.registered += 1
+        email = f"load{self.registered}-{self.rng.random()}@example.com"
+        return await self.client.post(
+            "/register", json={"email": email, "password": "1234"}
+        )
+
+    async def confirm(self) -> httpx.Response:
+        from socialink.security import create_confirmation_token
+
+        token = create_confirmation_token(f"user{self.user_id()}@example.com")
+        return await self.client.get(f"/confirm/{token}")
+
+    async def upload(self) -> httpx.Response:
+        return await self.client.post(
+            "/upload",
+            files={"file": ("cat.png", self.image, "image/png")},
+            headers=self.auth(),
+        )
+
+
+# Responses other than 2xx that are a normal outcome of an action, e.g.
+# randomly following yourself
+EXPECTED_ERRORS = {"follow": {400}}
+
+# Relative weight of each action, roughly read heavy like production traffic
+MIX = {
+    "get_feed": 30,
+    "get_post": 20,
+    "get_posts": 5,
+    "get_comments": 10,
+    "get_timeline": 10,
+    "search": 5,
+    "like": 8,
+    "create_post": 5,
+    "create_comment": 5,
+    "upload": 2,
+    "follow": 1,
+    "create_post_with_prompt": 1,
+    "login": 1,
+    "refresh": 1,
+    "register": 1,
+    "confirm": 1,
+}
+
+
+async def virtual_user(scenario: Scenario, stats: Stats, deadline: float) -> None:
+    actions, weights = zip(*MIX.items())
+    while time.perf_counter() < deadline:
+        action = scenario.rng.choices(actions, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await getattr(scenario, action)()
+            ok = response.is_success or response.status_code in EXPECTED_ERRORS.get(
+                action, ()
+            )
+        except httpx.HTTPError:
+            ok = False
+        stats.record(action, time.perf_counter() - started, ok)
+
+
+async def run_load(client: httpx.AsyncClient, args) -> dict:
+    scenario = Scenario(client, args, random.Random(args.seed))
+    for _ in range(args.logins):
+        await scenario.login()
+    if not scenario.tokens:
+        raise RuntimeError("Could not log in any seeded user")
+
+    stats = Stats()
+    deadline = time.perf_counter() + args.duration
+    await asyncio.gather(
+        *(virtual_user(scenario, stats, deadline) for _ in range(args.users))
+    )
+    return stats.summary(args.duration)
+
+
+class StubResponseClient:
+    """Stands in for httpx.AsyncClient in socialink.tasks."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return httpx.Response(
+            200,
+            json={"output_url": "https://example.com/image.png"},
+            request=httpx.Request("POST", url),
+        )
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs):
+        yield httpx.Response(
+            200,
+            content=png_bytes(),
+            headers={"content-type": "image/png"},
+            request=httpx.Request(method, url),
+        )
+
+
+@contextlib.contextmanager
+def stubbed_services():
+    with (
+        # Only socialink.tasks' view of httpx, warm-up and our own client
+        # keep the real one
+        mock.patch(
+            "socialink.tasks.httpx",
+            types.SimpleNamespace(**{**vars(httpx), "AsyncClient": StubResponseClient}),
+        ),
+        mock.patch(
+            "socialink.storage.put_file",
+            return_value="https://example.com/upload.png",
+        ),
+        mock.patch(
+            "socialink.storage.put_bytes",
+            side_effect=lambda data, name, content_type: f"https://example.com/{name}",
+        ),
+    ):
+        yield
+
+
+async def run_in_process(args) -> dict:
+    from socialink.main import create_app
+
+    app = create_app()
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        with stubbed_services():
+            async with app.router.lifespan_context(app):
+                if not args.log:
+                    logging.getLogger("socialink").setLevel(logging.WARNING)
+                return await run_load(client, args)
+
+
+async def run_remote(args) -> dict:
+    async with httpx.AsyncClient(base_url=args.url) as client:
+        return await run_load(client, args)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(results: dict) -> None:
+    header = f"{'route':26} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    print(header)
+    rows = [*results["routes"].items(), ("TOTAL", results["total"])]
+    for name, route in rows:
+        print(
+            f"{name:26} {route['requests']:7} {route['errors']:5} "
+            f"{route['rps']:8.1f} {route['p50_ms']:8.2f} "
+            f"{route['p95_ms']:8.2f} {route['p99_ms']:8.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="Drive a running server instead")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--users", type=int, default=50, help="Virtual users")
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seed-users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--comments", type=int, default=30000)
+    parser.add_argument("--likes", type=int, default=100000)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--log", action="store_true", help="Keep app logging on")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    if args.url:
+        results = asyncio.run(run_remote(args))
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            database = os.path.join(workdir, "bench.db")
+            os.environ["ENV_STATE"] = "prod"
+            os.environ["PROD_DATABASE_URL"] = f"sqlite:///{database}"
+            seeding.seed(
+                database,
+                args.seed_users,
+                args.posts,
+                args.comments,
+                args.likes,
+                args.seed,
+            )
+            results = asyncio.run(run_in_process(args))
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "arguments": vars(args),
+        **results,
+    }
+    print_report(results)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
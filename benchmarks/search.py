@@ -0,0 +1,115 @@
+"""Benchmark full-text search over a synthetic corpus.
+
+    python -m benchmarks.search --posts 1000000 --db /tmp/search_bench.db
+
+The corpus is written straight to SQLite and then queried through
+socialink.search, the same code path used by GET /search.
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import time
+
+VOCABULARY_SIZE = 20000
+WORDS_PER_POST = (5, 30)
+BATCH_SIZE = 10000
+
+
+def make_vocabulary(rng: random.Random) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choices(letters, k=rng.randint(3, 10))))
+    return sorted(words)
+
+
+def populate(path: str, posts: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    # Zipf-like word frequencies so some terms are very common and most are rare
+    weights = list(itertools.accumulate(1 / r for r in range(1, VOCABULARY_SIZE + 1)))
+
+    connection = sqlite3.connect(path)
+    connection.execute("INSERT INTO users (id, email, password) VALUES (1, 'b@b', '')")
+
+    started = time.perf_counter()
+    for start in range(0, posts, BATCH_SIZE):
+        rows = []
+        for post_id in range(start + 1, min(start + BATCH_SIZE, posts) + 1):
+            body = " ".join(
+                rng.choices(
+                    vocabulary, cum_weights=weights, k=rng.randint(*WORDS_PER_POST)
+                )
+            )
+            rows.append((post_id, body))
+        connection.executemany(
+            "INSERT INTO posts (id, body, user_id) VALUES (?, ?, 1)", rows
+        )
+        connection.executemany(
+            "INSERT INTO search_index (body, kind, ref_id, post_id) "
+            "VALUES (?, 'post', ?, ?)",
+            [(body, post_id, post_id) for post_id, body in rows],
+        )
+        connection.commit()
+    print(f"Indexed {posts} posts in {time.perf_counter() - started:.1f}s")
+
+    connection.close()
+    return vocabulary
+
+
+async def run_queries(path: str, vocabulary: list[str], repeat: int) -> None:
+    from databases import Database
+
+    from socialink.search import search
+
+    queries = {
+        "common term": vocabulary[0],
+        "rare term": vocabulary[-1],
+        "two terms": f"{vocabulary[1]} {vocabulary[50]}",
+        "deep page": vocabulary[0],
+    }
+
+    async with Database(f"sqlite:///{path}") as database:
+        for name, text in queries.items():
+            offset = 1000 if name == "deep page" else 0
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await search(database, text, 20, offset)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            print(
+                f"{name:12} p50={statistics.median(timings):8.2f}ms "
+                f"p95={timings[int(len(timings) * 0.95) - 1]:8.2f}ms"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--db", default="search_bench.db")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+
+    # Creates the schema, including the search index, in the benchmark database
+    os.environ["ENV_STATE"] = "test"
+    os.environ["TEST_DATABASE_URL"] = f"sqlite:///{args.db}"
+    from socialink.database import create_tables
+
+    create_tables()
+
+    vocabulary = populate(args.db, args.posts, args.seed)
+    asyncio.run(run_queries(args.db, vocabulary, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
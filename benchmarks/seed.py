@@ -0,0 +1,294 @@
+"""Bulk seed a database with synthetic users, posts, comments and likes.
+
+    python -m benchmarks.seed --db bench.db --posts 200000 --likes 500000
+    python -m benchmarks.seed --db postgresql://localhost/socialink_bench
+
+Rows are written straight to the tables, bypassing the API: batched
+prepared inserts on SQLite and COPY on Postgres. The output only depends
+on the arguments, so the same --seed always produces the same database.
+
+Likes per post follow a Zipf distribution (--like-skew) and so do comments
+per author (--commenter-skew), giving a few viral posts and heavy
+commenters. Every user is confirmed and has the password
+benchmarks.seed.PASSWORD, stored pre-hashed so seeding does not pay bcrypt
+per user.
+"""
+
+import argparse
+import datetime
+import itertools
+import os
+import random
+import sqlite3
+import time
+from collections import Counter
+from typing import Iterable, Iterator
+
+PASSWORD = "benchmark"
+# bcrypt hash of PASSWORD, fixed rather than hashed per run so seeds repeat exactly
+PASSWORD_HASH = "$2b$12$1IXqIDWcKv3q6gByQhksyOxoMrFT5tqMLzVJThq0yaTBvG1FiSvb2"
+BATCH_SIZE = 50000
+# Posts are spread over the month before this date, fixed so runs are repeatable
+EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+SPAN_SECONDS = 30 * 86400
+
+WORDS = (
+    "cat dog couch blue british shorthair sunny park coffee morning city night "
+    "music photo travel beach mountain friends weekend food pizza garden rain "
+    "book movie game code python coffee happy cute tiny fluffy sleepy"
+).split()
+
+
+def batched(rows: Iterable[tuple], size: int = BATCH_SIZE) -> Iterator[list]:
+    iterator = iter(rows)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def zipf_sampler(rng: random.Random, n: int, skew: float):
+    # Rank 1 is the most popular, ranks are shuffled onto ids so popular rows
+    # are spread over the table instead of being the lowest ids.
+    cum_weights = list(itertools.accumulate(1 / rank**skew for rank in range(1, n + 1)))
+    ids = list(range(1, n + 1))
+    rng.shuffle(ids)
+
+    def sample(k: int) -> list[int]:
+        return rng.choices(ids, cum_weights=cum_weights, k=k)
+
+    return sample
+
+
+def post_created_at(post_id: int, posts: int) -> datetime.datetime:
+    return EPOCH - datetime.timedelta(
+        seconds=SPAN_SECONDS * (posts - post_id) / max(posts, 1)
+    )
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+class SqliteWriter:
+    def __init__(self, path: str) -> None:
+        self.connection = sqlite3.connect(path)
+        # The file is thrown away if seeding fails, so durability is not needed
+        self.connection.execute("PRAGMA journal_mode = OFF")
+        self.connection.execute("PRAGMA synchronous = OFF")
+
+    def write(self, table: str, columns: list[str], rows: Iterable[tuple]) -> int:
+        query = (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})"
+        )
+        count = 0
+        for batch in batched(rows):
+            self.connection.executemany(query, batch)
+            count += len(batch)
+        return count
+
+    def timestamp(self, value: datetime.datetime) -> str:
+        # The format SQLAlchemy's DateTime type uses on SQLite
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    def close(self) -> None:
+        self.connection.commit()
+        self.connection.close()
+
+
+class PostgresWriter:
+    SEQUENCES = ["users", "posts", "comments", "likes"]
+
+    def __init__(self, url: str) -> None:
+        import psycopg
+
+        self.connection = psycopg.connect(url)
+
+    def write(self, table: str, columns: list[str], rows: Iterable[tuple]) -> int:
+        count = 0
+        with self.connection.cursor() as cursor:
+            with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    count += 1
+        return count
+
+    def timestamp(self, value: datetime.datetime) -> datetime.datetime:
+        return value
+
+    def close(self) -> None:
+        # Ids were written explicitly, move the sequences past them
+        with self.connection.cursor() as cursor:
+            for table in self.SEQUENCES:
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"coalesce(max(id), 1)) FROM {table}"
+                )
+        self.connection.commit()
+        self.connection.close()
+
+
+def database_url(database: str) -> str:
+    return database if "://" in database else f"sqlite:///{database}"
+
+
+def create_schema(url: str) -> None:
+    os.environ.setdefault("ENV_STATE", "prod")
+    os.environ.setdefault("PROD_DATABASE_URL", url)
+    import sqlalchemy
+
+    from socialink.database import metadata
+
+    engine = sqlalchemy.create_engine(url)
+    metadata.create_all(engine)
+    engine.dispose()
+
+
+def seed(
+    database: str,
+    users: int,
+    posts: int,
+    comments: int,
+    likes: int,
+    seed: int = 42,
+    like_skew: float = 1.1,
+    commenter_skew: float = 1.2,
+    search_index: bool = True,
+) -> dict[str, int]:
+    url = database_url(database)
+    create_schema(url)
+
+    from socialink.ranking import hot_score
+
+    if url.startswith("sqlite"):
+        writer = SqliteWriter(url.removeprefix("sqlite:///"))
+    else:
+        writer = PostgresWriter(url)
+
+    rng = random.Random(seed)
+    counts = Counter()
+
+    counts["users"] = writer.write(
+        "users",
+        ["id", "email", "password", "confirmed", "follower_count"],
+        (
+            (i, f"user{i}@example.com", PASSWORD_HASH, True, 0)
+            for i in range(1, users + 1)
+        ),
+    )
+
+    post_authors = [rng.randint(1, users) for _ in range(posts)]
+    post_bodies = [sentence(rng, rng.randint(3, 20)) for _ in range(posts)]
+    counts["posts"] = writer.write(
+        "posts",
+        ["id", "body", "user_id", "created_at"],
+        (
+            (
+                i,
+                post_bodies[i - 1],
+                post_authors[i - 1],
+                writer.timestamp(post_created_at(i, posts)),
+            )
+            for i in range(1, posts + 1)
+        ),
+    )
+    counts["timelines"] = writer.write(
+        "timelines",
+        ["user_id", "post_id"],
+        ((post_authors[i - 1], i) for i in range(1, posts + 1)),
+    )
+
+    commenters = zipf_sampler(rng, users, commenter_skew)
+    commented_posts = zipf_sampler(rng, posts, like_skew)
+    comment_posts = commented_posts(comments)
+    comment_bodies = [sentence(rng, rng.randint(2, 12)) for _ in range(comments)]
+    counts["comments"] = writer.write(
+        "comments",
+        ["id", "body", "post_id", "user_id"],
+        zip(
+            range(1, comments + 1),
+            comment_bodies,
+            comment_posts,
+            commenters(comments),
+        ),
+    )
+
+    liked_posts = zipf_sampler(rng, posts, like_skew)
+    likes_per_post = Counter()
+
+    def like_rows():
+        for start in range(0, likes, BATCH_SIZE):
+            size = min(BATCH_SIZE, likes - start)
+            for offset, post_id in enumerate(liked_posts(size), start + 1):
+                likes_per_post[post_id] += 1
+                yield (offset, post_id, rng.randint(1, users))
+
+    counts["likes"] = writer.write("likes", ["id", "post_id", "user_id"], like_rows())
+
+    counts["post_rankings"] = writer.write(
+        "post_rankings",
+        ["post_id", "likes", "hot"],
+        (
+            (
+                i,
+                likes_per_post[i],
+                hot_score(likes_per_post[i], post_created_at(i, posts)),
+            )
+            for i in range(1, posts + 1)
+        ),
+    )
+
+    if search_index:
+        counts["search_index"] = writer.write(
+            "search_index",
+            ["body", "kind", "ref_id", "post_id"],
+            itertools.chain(
+                ((post_bodies[i - 1], "post", i, i) for i in range(1, posts + 1)),
+                (
+                    (comment_bodies[i - 1], "comment", i, comment_posts[i - 1])
+                    for i in range(1, comments + 1)
+                ),
+            ),
+        )
+
+    writer.close()
+    return dict(counts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--db", default="bench.db", help="SQLite path or URL")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=200000)
+    parser.add_argument("--comments", type=int, default=300000)
+    parser.add_argument("--likes", type=int, default=500000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--like-skew", type=float, default=1.1)
+    parser.add_argument("--commenter-skew", type=float, default=1.2)
+    parser.add_argument("--no-search-index", dest="search_index", action="store_false")
+    args = parser.parse_args()
+
+    if "://" not in args.db and os.path.exists(args.db):
+        os.remove(args.db)
+
+    started = time.perf_counter()
+    counts = seed(
+        args.db,
+        args.users,
+        args.posts,
+        args.comments,
+        args.likes,
+        args.seed,
+        args.like_skew,
+        args.commenter_skew,
+        args.search_index,
+    )
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print(", ".join(f"{count} {table}" for table, count in counts.items()))
+    print(f"Seeded {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Measure how read throughput scales with the number of gunicorn workers.
+
+    python -m benchmarks.workers --workers 1 2 4 --duration 10
+
+Every run starts gunicorn with socialink/gunicorn_conf.py against a fresh
+SQLite database seeded with --posts posts, then drives GET /post and
+GET /post/{id} from --clients load generator processes.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import pathlib
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+GUNICORN_CONF = ROOT / "socialink" / "gunicorn_conf.py"
+CREATE_TABLES = "from socialink.database import create_tables; create_tables()"
+
+
+def server_env(database: pathlib.Path) -> dict:
+    return {
+        **os.environ,
+        "ENV_STATE": "prod",
+        "PROD_DATABASE_URL": f"sqlite:///{database}",
+        "PYTHONPATH": str(ROOT),
+    }
+
+
+def seed(path: pathlib.Path, posts: int) -> None:
+    subprocess.run(
+        [sys.executable, "-c", CREATE_TABLES], env=server_env(path), check=True
+    )
+    connection = sqlite3.connect(path)
+    connection.execute("INSERT INTO users (id, email, password) VALUES (1, 'b@b', '')")
+    connection.executemany(
+        "INSERT INTO posts (id, body, user_id) VALUES (?, ?, 1)",
+        [(i, f"Post {i}") for i in range(1, posts + 1)],
+    )
+    connection.executemany(
+        "INSERT INTO post_rankings (post_id, likes, hot) VALUES (?, 0, 0)",
+        [(i,) for i in range(1, posts + 1)],
+    )
+    connection.commit()
+    connection.close()
+
+
+async def drive(base_url: str, posts: int, duration: float, concurrency: int) -> int:
+    deadline = time.perf_counter() + duration
+    done = 0
+
+    async def user(client: httpx.AsyncClient) -> None:
+        nonlocal done
+        while time.perf_counter() < deadline:
+            if random.random() < 0.5:
+                response = await client.get("/post", params={"limit": 20})
+            else:
+                response = await client.get(f"/post/{random.randint(1, posts)}")
+            response.raise_for_status()
+            done += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        await asyncio.gather(*(user(client) for _ in range(concurrency)))
+    return done
+
+
+def client_process(args: tuple) -> int:
+    return asyncio.run(drive(*args))
+
+
+def wait_until_up(base_url: str, timeout: float = 30) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            # 503 until the worker that answers has finished warming up
+            httpx.get(f"{base_url}/ready").raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+def run(workers: int, args: argparse.Namespace, workdir: pathlib.Path) -> float:
+    database = workdir / f"workers_{workers}.db"
+    seed(database, args.posts)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            str(GUNICORN_CONF),
+            "--workers",
+            str(workers),
+            "--bind",
+            f"127.0.0.1:{args.port}",
+        ],
+        cwd=workdir,
+        env=server_env(database),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(base_url)
+        job = (base_url, args.posts, args.duration, args.concurrency)
+        with multiprocessing.Pool(args.clients) as pool:
+            requests = sum(pool.map(client_process, [job] * args.clients))
+    finally:
+        server.terminate()
+        server.wait()
+    return requests / args.duration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        baseline = None
+        for workers in args.workers:
+            throughput = run(workers, args, pathlib.Path(workdir))
+            baseline = baseline or throughput
+            print(
+                f"{workers:3} workers: {throughput:8.1f} req/s "
+                f"({throughput / baseline:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import asyncio
+import datetime
+import logging
+from typing import Optional
+
+import sqlalchemy
+from databases import Database
+
+from socialink.config import config
+from socialink.database import (
+    archived_comment_table,
+    archived_post_table,
+    comment_table,
+    likes_table,
+    post_ranking_table,
+    post_table,
+    pulled_post_table,
+    timeline_table,
+    upsert,
+)
+
+logger = logging.getLogger(__name__)
+
+POST_COLUMNS = [column.name for column in post_table.columns]
+
+
+def as_utc(moment: datetime.datetime) -> datetime.datetime:
+    # SQLite hands back naive datetimes, everything is stored in UTC
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=datetime.timezone.utc)
+    return moment
+
+
+async def oldest_post_ids(
+    database: Database, before: datetime.datetime, limit: int
+) -> list[int]:
+    # Ids grow with created_at, so the oldest posts are the first ones by id.
+    # Walking the primary key and stopping at the first newer post avoids
+    # scanning the whole table for created_at, which has no index.
+    query = (
+        sqlalchemy.select(post_table.c.id, post_table.c.created_at)
+        .order_by(post_table.c.id)
+        .limit(limit)
+    )
+    post_ids = []
+    for post in await database.fetch_all(query):
+        if post.created_at is None or as_utc(post.created_at) >= before:
+            break
+        post_ids.append(post.id)
+    return post_ids
+
+
+async def archive_batch(
+    database: Database, before: datetime.datetime, batch_size: int
+) -> int:
+    """Moves up to `batch_size` posts created before `before` to the archive.
+
+    A batch is one short transaction, so writes to the hot tables only ever
+    wait on a few hundred rows. Archiving a post twice, e.g. from two workers
+    at once, leaves a single copy.
+    """
+    async with database.transaction():
+        post_ids = await oldest_post_ids(database, before, batch_size)
+        if not post_ids:
+            return 0
+
+        likes = (
+            sqlalchemy.select(sqlalchemy.func.count(likes_table.c.id))
+            .where(likes_table.c.post_id == post_table.c.id)
+            .scalar_subquery()
+        )
+        comment_count = (
+            sqlalchemy.select(sqlalchemy.func.count(comment_table.c.id))
+            .where(comment_table.c.post_id == post_table.c.id)
+            .scalar_subquery()
+        )
+        posts = sqlalchemy.select(
+            *post_table.columns,
+            likes,
+            comment_count,
+            sqlalchemy.literal(datetime.datetime.now(datetime.timezone.utc)),
+        ).where(post_table.c.id.in_(post_ids))
+        await database.execute(
+            upsert(database, archived_post_table)
+            .from_select(
+                [*POST_COLUMNS, "likes", "comment_count", "archived_at"], posts
+            )
+            .on_conflict_do_nothing()
+        )
+
+        comments = sqlalchemy.select(
+            comment_table.c.id,
+            comment_table.c.body,
+            comment_table.c.post_id,
+            comment_table.c.user_id,
+        ).where(comment_table.c.post_id.in_(post_ids))
+        await database.execute(
+            upsert(database, archived_comment_table)
+            .from_select(["id", "body", "post_id", "user_id"], comments)
+            .on_conflict_do_nothing()
+        )
+
+        for table in (
+            likes_table,
+            comment_table,
+            post_ranking_table,
+            timeline_table,
+            pulled_post_table,
+        ):
+            await database.execute(table.delete().where(table.c.post_id.in_(post_ids)))
+        await database.execute(post_table.delete().where(post_table.c.id.in_(post_ids)))
+    return len(post_ids)
+
+
+class Archiver:
+    def __init__(
+        self,
+        after: datetime.timedelta,
+        batch_size: int = 500,
+        interval: float = 3600.0,
+        pause: float = 0.1,
+    ) -> None:
+        self.after = after
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self, database: Database) -> int:
+        before = datetime.datetime.now(datetime.timezone.utc) - self.after
+        archived = 0
+        while True:
+            moved = await archive_batch(database, before, self.batch_size)
+            archived += moved
+            if moved < self.batch_size:
+                break
+            # Gives requests waiting on the hot tables a turn between batches
+            await asyncio.sleep(self.pause)
+        if archived:
+            logger.info(f"Archived {archived} posts created before {before}")
+        return archived
+
+    async def _archive_periodically(self, database: Database) -> None:
+        while True:
+            try:
+                await self.run(database)
+            except Exception:
+                logger.exception("Failed to archive old posts, retrying later")
+            await asyncio.sleep(self.interval)
+
+    def start(self, database: Database) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._archive_periodically(database))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+select_archived_posts = sqlalchemy.select(
+    *(archived_post_table.c[name] for name in POST_COLUMNS),
+    archived_post_table.c.likes,
+    archived_post_table.c.comment_count,
+)
+
+
+async def find_archived_posts(database: Database, post_ids: list[int]) -> list:
+    query = select_archived_posts.where(archived_post_table.c.id.in_(post_ids))
+    logger.debug(query)
+    return await database.fetch_all(query)
+
+
+async def find_archived_comments(database: Database, post_id: int) -> list:
+    query = (
+        archived_comment_table.select()
+        .where(archived_comment_table.c.post_id == post_id)
+        .order_by(archived_comment_table.c.id)
+    )
+    logger.debug(query)
+    return await database.fetch_all(query)
+
+
+async def is_archived(database: Database, post_id: int) -> bool:
+    query = sqlalchemy.select(archived_post_table.c.id).where(
+        archived_post_table.c.id == post_id
+    )
+    return await database.fetch_val(query) is not None
+
+
+archiver = Archiver(
+    datetime.timedelta(days=config.ARCHIVE_AFTER_DAYS),
+    config.ARCHIVE_BATCH_SIZE,
+    config.ARCHIVE_INTERVAL,
+    config.ARCHIVE_BATCH_PAUSE,
+)
@@ -0,0 +1,57 @@
+"""Fills in derived tables for rows written before they were maintained.
+
+    python -m socialink.backfill
+
+Runs once per deploy, gunicorn runs it in the master before forking, so
+workers never race each other over the same rows.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from databases import Database
+
+from socialink.config import config
+from socialink.database import create_tables
+from socialink.ranking import backfill_post_rankings
+from socialink.search import backfill_search_index
+
+logger = logging.getLogger(__name__)
+
+BACKFILLS = {
+    "rankings": backfill_post_rankings,
+    "search": backfill_search_index,
+}
+
+
+async def run_backfills(database_url: str, names: list[str]) -> dict[str, int]:
+    # A database of its own, nothing opened here is left over for the workers
+    database = Database(database_url)
+    await database.connect()
+    try:
+        return {name: await BACKFILLS[name](database) for name in names}
+    finally:
+        await database.disconnect()
+
+
+def backfill(names: list[str]) -> dict[str, int]:
+    create_tables()
+    filled = asyncio.run(run_backfills(config.DATABASE_URL, names))
+    for name, count in filled.items():
+        logger.info(f"Backfilled {count} {name}")
+    return filled
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "names", nargs="*", choices=list(BACKFILLS), default=list(BACKFILLS)
+    )
+    args = parser.parse_args()
+    for name, count in backfill(args.names).items():
+        print(f"{name}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import gzip
+import hashlib
+import logging
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "image/svg+xml")
+# Streams go out as they are produced, buffering them to compress would stall them
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def available_codecs(
+    gzip_level: int = 6, brotli_quality: int = 5, zstd_level: int = 3
+) -> dict[str, Callable[[bytes], bytes]]:
+    """The encodings this server can produce, most preferred first.
+
+    brotli and zstd are used when their packages are installed, gzip always is.
+    """
+    codecs = {}
+    if brotli is not None:
+        codecs["br"] = partial(brotli.compress, quality=brotli_quality)
+    if zstandard is not None:
+        codecs["zstd"] = zstandard.ZstdCompressor(level=zstd_level).compress
+    # mtime=0 keeps the output the same for the same body
+    codecs["gzip"] = partial(gzip.compress, compresslevel=gzip_level, mtime=0)
+    return codecs
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(header: str, encodings) -> Optional[str]:
+    # The client's highest q-value wins, ties go to the server's preference
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressedCache:
+    """LRU of compressed bodies keyed by a digest of the uncompressed body.
+
+    Identical responses, such as the same feed page served to many clients,
+    are compressed once. Entries never go stale, a changed body is a new key.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, bytes], bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(encoding: str, body: bytes) -> tuple[str, bytes]:
+        # sha256 is hardware accelerated on most CPUs, faster here than blake2b
+        return encoding, hashlib.sha256(body).digest()
+
+    def get(self, key: tuple[str, bytes]) -> Optional[bytes]:
+        compressed = self._entries.get(key)
+        if compressed is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return compressed
+
+    def put(self, key: tuple[str, bytes], compressed: bytes) -> None:
+        if len(compressed) > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = compressed
+        self.size += len(compressed)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+def compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return (
+        "content-encoding" not in headers
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+        and not content_type.startswith(UNCOMPRESSED_TYPES)
+    )
+
+
+class CompressionMiddleware:
+    """Compresses JSON and text responses in the best encoding the client accepts.
+
+    Bodies under `minimum_size` are sent as they are, since the encoding's
+    framing would outweigh the savings. Streamed responses are passed through.
+    """
+
+    def __init__(
+        self,
+        app,
+        codecs: dict[str, Callable[[bytes], bytes]],
+        minimum_size: int = 1024,
+        cache: Optional[CompressedCache] = None,
+    ) -> None:
+        self.app = app
+        self.codecs = codecs
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        if self.cache is None:
+            return self.codecs[encoding](body)
+        key = self.cache.key(encoding, body)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = self.codecs[encoding](body)
+            self.cache.put(key, compressed)
+        return compressed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), self.codecs
+        )
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                if not compressible(Headers(raw=message["headers"])):
+                    passthrough = True
+                    return await send(message)
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            if message.get("more_body", False):
+                # A streamed body, sent uncompressed as it comes
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            content = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(content) >= self.minimum_size:
+                compressed = self.compress(encoding, content)
+                if len(compressed) < len(content):
+                    content = compressed
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(content))
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": content})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,27 +1,144 @@
+import os
+import pathlib
+import tempfile
 from functools import lru_cache
-from typing import Optional
+from typing import Literal, Optional
 
-from dotenv import load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-load_dotenv()
+# Next to .env.example, found whichever directory the app is started from
+ENV_FILE = pathlib.Path(__file__).parent / ".env"
 
 
 class BaseConfig(BaseSettings):
     ENV_STATE: Optional[str] = None
 
-    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+    model_config = SettingsConfigDict(env_file=ENV_FILE, extra="ignore")
 
 
 class GlobalConfig(BaseConfig):
     DATABASE_URL: Optional[str] = None
     DB_FORCE_ROLL_BACK: bool = False
+    DB_MIN_SIZE: int = 1
+    DB_MAX_SIZE: int = 10
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    # Caps on what one GET /posts request may ask for
+    POSTS_BATCH_MAX_IDS: int = 100
+    POSTS_BATCH_MAX_COMMENTS: int = 50
+    READ_REPLICA_URLS: list[str] = []
+    # Replicas further behind the primary than this get no reads
+    REPLICA_MAX_LAG: float = 3.0
+    REPLICA_CHECK_INTERVAL: float = 1.0
+    # Reads go to the primary for this long after a client writes
+    READ_YOUR_WRITES_SECONDS: float = 5.0
     MAILGUN_API_KEY: Optional[str] = None
     MAILGUN_DOMAIN: Optional[str] = None
     B2_KEY_ID: Optional[str] = None
     B2_APPLICATION_KEY: Optional[str] = None
     B2_BUCKET_NAME: Optional[str] = None
+    B2_PUBLIC_URL: Optional[str] = None
+    # A key restricted to the "direct/" name prefix, enables direct uploads to B2
+    B2_DIRECT_KEY_ID: Optional[str] = None
+    B2_DIRECT_APPLICATION_KEY: Optional[str] = None
+    # The bucket's S3-compatible endpoint, e.g. https://s3.us-west-004.backblazeb2.com
+    B2_S3_ENDPOINT: Optional[str] = None
+    STORAGE_BACKEND: Literal["b2", "local"] = "b2"
+    LOCAL_STORAGE_DIR: str = os.path.join(tempfile.gettempdir(), "socialink-storage")
+    # Prefix of the URLs locally stored files are served from by /storage
+    LOCAL_STORAGE_URL: str = "/storage"
     DEEPAI_API_KEY: Optional[str] = None
+    LIKE_BUFFER_ENABLED: bool = False
+    LIKE_BUFFER_MAX_SIZE: int = 500
+    LIKE_BUFFER_FLUSH_INTERVAL: float = 1.0
+    LIKE_BUFFER_MAX_BACKOFF: float = 60.0
+    # Moves posts older than ARCHIVE_AFTER_DAYS to the archive tables, in
+    # batches of ARCHIVE_BATCH_SIZE every ARCHIVE_INTERVAL seconds
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_AFTER_DAYS: int = 365
+    ARCHIVE_BATCH_SIZE: int = 500
+    ARCHIVE_INTERVAL: float = 3600.0
+    ARCHIVE_BATCH_PAUSE: float = 0.1
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    # Compressed bodies kept per worker so repeated responses aren't recompressed
+    COMPRESSION_CACHE_BYTES: int = 32 * 1024 * 1024
+    # Open /events streams per worker, and events buffered per stream before
+    # a listener that can't keep up is dropped
+    EVENTS_MAX_SUBSCRIBERS: int = 10_000
+    EVENTS_BUFFER_SIZE: int = 100
+    EVENTS_KEEPALIVE: float = 15.0
+    TIMELINE_FANOUT_THRESHOLD: int = 1000
+    # Posts of an account copied into a new follower's timeline
+    TIMELINE_FOLLOW_BACKFILL: int = 50
+    DEBUG_TOKENS: list[str] = []
+    WARMUP_STEPS: list[str] = [
+        "database",
+        "storage",
+        "password_hashing",
+        "http_client",
+        "image_workers",
+        "routes",
+    ]
+    # /ready answers 503 until these steps succeeded
+    WARMUP_REQUIRED: list[str] = ["database"]
+    WARMUP_TIMEOUT: float = 30.0
+    # Hold back serving requests until warm-up is done
+    WARMUP_WAIT: bool = False
+    WARMUP_ROUTES: list[str] = ["/post?limit=1", "/post?sorting=trending&limit=1"]
+    PROFILING_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL: float = 0.005
+    PROFILING_MAX_PROFILES: int = 100
+    WATCHDOG_ENABLED: bool = False
+    WATCHDOG_THRESHOLD: float = 0.1
+    WATCHDOG_INTERVAL: float = 0.02
+    IMAGE_CACHE_TTL: float = 7 * 24 * 3600
+    GENERATION_CONCURRENCY: int = 4
+    GENERATION_TIMEOUT: float = 60.0
+    GENERATION_RETRIES: int = 2
+    GENERATION_BACKOFF: float = 1.0
+    GENERATION_BREAKER_THRESHOLD: int = 5
+    GENERATION_BREAKER_RESET: float = 30.0
+    GENERATION_SHUTDOWN_GRACE: float = 5.0
+    MIRROR_GENERATED_IMAGES: bool = True
+    GENERATED_IMAGE_MAX_BYTES: int = 20 * 1024 * 1024
+    IMAGE_WORKERS: int = 2
+    UPLOAD_MAX_BYTES: int = 10 * 1024 * 1024
+    UPLOAD_VARIANT_WIDTHS: list[int] = [320, 640, 1280]
+    UPLOAD_VARIANT_FORMATS: list[str] = ["WEBP", "JPEG"]
+    UPLOAD_SESSION_DIR: str = os.path.join(tempfile.gettempdir(), "socialink-uploads")
+    UPLOAD_SESSION_MAX_BYTES: int = 100 * 1024 * 1024
+    UPLOAD_SESSION_CHUNK_SIZE: int = 5 * 1024 * 1024
+    UPLOAD_SESSION_TTL: float = 24 * 3600
+    # Upload URLs are only good for DIRECT_UPLOAD_URL_EXPIRE_SECONDS, the token
+    # to complete the upload for DIRECT_UPLOAD_EXPIRE_MINUTES. Objects under
+    # direct/ still not completed after that are deleted every
+    # DIRECT_UPLOAD_SWEEP_INTERVAL seconds.
+    DIRECT_UPLOAD_URL_EXPIRE_SECONDS: int = 300
+    DIRECT_UPLOAD_EXPIRE_MINUTES: int = 60
+    DIRECT_UPLOAD_SWEEP_INTERVAL: float = 3600.0
+    RATE_LIMIT_ENABLED: bool = False
+    RATE_LIMIT_BACKEND: Literal["memory", "database"] = "memory"
+    RATE_LIMITS: dict[str, str] = {
+        "register": "5/minute",
+        "token": "10/minute",
+        "refresh": "60/minute",
+        "post": "30/minute",
+        "comment": "60/minute",
+        "like": "120/minute",
+        "upload": "10/minute",
+    }
+    CONCURRENCY_LIMITS: dict[str, int] = {
+        "register": 4,
+        "token": 8,
+        "post": 32,
+        "comment": 32,
+        "like": 64,
+        "upload": 4,
+    }
 
 
 class DevConfig(GlobalConfig):
@@ -35,6 +152,8 @@ class ProdConfig(GlobalConfig):
 class TestConfig(GlobalConfig):
     DATABASE_URL: Optional[str] = "sqlite:///test.db"
     DB_FORCE_ROLL_BACK: bool = True
+    MIRROR_GENERATED_IMAGES: bool = False
+    STORAGE_BACKEND: Literal["b2", "local"] = "local"
 
     model_config = SettingsConfigDict(env_prefix="TEST_", extra="ignore")
 
@@ -45,7 +164,6 @@ def get_config(env_state: str):
     return configs[env_state]()
 
 
-env_state = BaseConfig().ENV_STATE
-print(f"Loaded ENV_STATE: {env_state}")
-
+# Built once at import rather than on first access: socialink.database and the
+# other module level singletons read it as soon as they are imported anyway
 config = get_config(BaseConfig().ENV_STATE)
@@ -1,5 +1,9 @@
+import sqlite3
+from functools import lru_cache
+
 import databases
 import sqlalchemy
+from sqlalchemy.dialects import postgresql, sqlite
 
 from socialink.config import config
 
@@ -10,8 +14,19 @@ post_table = sqlalchemy.Table(
     metadata,
     sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
     sqlalchemy.Column("body", sqlalchemy.String),
-    sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), nullable=False),
+    sqlalchemy.Column(
+        "user_id", sqlalchemy.ForeignKey("users.id"), nullable=False, index=True
+    ),
     sqlalchemy.Column("image_url", sqlalchemy.String),
+    sqlalchemy.Column("thumbnail_url", sqlalchemy.String),
+    sqlalchemy.Column("medium_url", sqlalchemy.String),
+    # pending, ready or failed for posts created with a prompt, else null
+    sqlalchemy.Column("image_status", sqlalchemy.String),
+    sqlalchemy.Column(
+        "created_at",
+        sqlalchemy.DateTime(timezone=True),
+        server_default=sqlalchemy.func.now(),
+    ),
 )
 
 comment_table = sqlalchemy.Table(
@@ -30,6 +45,7 @@ users_table = sqlalchemy.Table(
     sqlalchemy.Column("email", sqlalchemy.String, unique=True),
     sqlalchemy.Column("password", sqlalchemy.String),
     sqlalchemy.Column("confirmed", sqlalchemy.Boolean, default=False),
+    sqlalchemy.Column("follower_count", sqlalchemy.Integer, server_default="0"),
 )
 
 likes_table = sqlalchemy.Table(
@@ -40,12 +56,228 @@ likes_table = sqlalchemy.Table(
     sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), nullable=False),
 )
 
-engine = sqlalchemy.create_engine(
-    config.DATABASE_URL, connect_args={"check_same_thread": False}
+post_ranking_table = sqlalchemy.Table(
+    "post_rankings",
+    metadata,
+    sqlalchemy.Column("post_id", sqlalchemy.ForeignKey("posts.id"), primary_key=True),
+    sqlalchemy.Column("likes", sqlalchemy.Integer, nullable=False, default=0),
+    sqlalchemy.Column("hot", sqlalchemy.Float, nullable=False, default=0),
+    sqlalchemy.Index("ix_post_rankings_likes", "likes", "post_id"),
+    sqlalchemy.Index("ix_post_rankings_hot", "hot", "post_id"),
+)
+
+follows_table = sqlalchemy.Table(
+    "follows",
+    metadata,
+    sqlalchemy.Column(
+        "follower_id", sqlalchemy.ForeignKey("users.id"), primary_key=True
+    ),
+    sqlalchemy.Column(
+        "followee_id", sqlalchemy.ForeignKey("users.id"), primary_key=True
+    ),
+    sqlalchemy.Index("ix_follows_followee_id", "followee_id", "follower_id"),
+)
+
+timeline_table = sqlalchemy.Table(
+    "timelines",
+    metadata,
+    sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), primary_key=True),
+    sqlalchemy.Column("post_id", sqlalchemy.ForeignKey("posts.id"), primary_key=True),
+)
+
+# Posts that were not fanned out because their author had too many followers,
+# followers pull them in when reading instead
+pulled_post_table = sqlalchemy.Table(
+    "pulled_posts",
+    metadata,
+    sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), primary_key=True),
+    sqlalchemy.Column("post_id", sqlalchemy.ForeignKey("posts.id"), primary_key=True),
+)
+
+generated_image_table = sqlalchemy.Table(
+    "generated_images",
+    metadata,
+    sqlalchemy.Column("prompt_hash", sqlalchemy.String(64), primary_key=True),
+    sqlalchemy.Column("prompt", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("output_url", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("thumbnail_url", sqlalchemy.String),
+    sqlalchemy.Column("medium_url", sqlalchemy.String),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+)
+
+# Uploads are stored under their content hash, so identical files are stored once
+upload_table = sqlalchemy.Table(
+    "uploads",
+    metadata,
+    sqlalchemy.Column("content_hash", sqlalchemy.String(64), primary_key=True),
+    sqlalchemy.Column("content_type", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("size", sqlalchemy.Integer, nullable=False),
+    # The original plus every variant
+    sqlalchemy.Column("stored_bytes", sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column("file_url", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("variants", sqlalchemy.JSON, nullable=False),
+    sqlalchemy.Column("duplicates", sqlalchemy.Integer, nullable=False, default=0),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+)
+
+# Objects clients uploaded straight to storage, which the API never saw the bytes of
+direct_upload_table = sqlalchemy.Table(
+    "direct_uploads",
+    metadata,
+    sqlalchemy.Column("file_name", sqlalchemy.String, primary_key=True),
+    sqlalchemy.Column("content_type", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("size", sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column("file_url", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+)
+
+rate_limit_table = sqlalchemy.Table(
+    "rate_limits",
+    metadata,
+    sqlalchemy.Column("key", sqlalchemy.String, primary_key=True),
+    sqlalchemy.Column("tokens", sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column("updated_at", sqlalchemy.Float, nullable=False),
+)
+
+# Only an HMAC of each refresh token is stored. Tokens from one login share a
+# family, so reusing a rotated token can revoke everything issued after it.
+refresh_token_table = sqlalchemy.Table(
+    "refresh_tokens",
+    metadata,
+    sqlalchemy.Column("token_hash", sqlalchemy.String(64), primary_key=True),
+    sqlalchemy.Column("family_id", sqlalchemy.String(32), nullable=False, index=True),
+    sqlalchemy.Column(
+        "user_id", sqlalchemy.ForeignKey("users.id"), nullable=False, index=True
+    ),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+    sqlalchemy.Column("expires_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+    # Set when the token is exchanged for a new one
+    sqlalchemy.Column("used_at", sqlalchemy.DateTime(timezone=True)),
+    sqlalchemy.Column("revoked_at", sqlalchemy.DateTime(timezone=True)),
+)
+
+# Posts past ARCHIVE_AFTER_DAYS move here, likes collapsed into a count, so the
+# hot tables and their indexes stop growing forever
+archived_post_table = sqlalchemy.Table(
+    "archived_posts",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("body", sqlalchemy.String),
+    sqlalchemy.Column(
+        "user_id", sqlalchemy.ForeignKey("users.id"), nullable=False, index=True
+    ),
+    sqlalchemy.Column("image_url", sqlalchemy.String),
+    sqlalchemy.Column("thumbnail_url", sqlalchemy.String),
+    sqlalchemy.Column("medium_url", sqlalchemy.String),
+    sqlalchemy.Column("image_status", sqlalchemy.String),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True)),
+    sqlalchemy.Column("likes", sqlalchemy.Integer, nullable=False, default=0),
+    sqlalchemy.Column("comment_count", sqlalchemy.Integer, nullable=False, default=0),
+    sqlalchemy.Column(
+        "archived_at", sqlalchemy.DateTime(timezone=True), nullable=False
+    ),
+)
+
+archived_comment_table = sqlalchemy.Table(
+    "archived_comments",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("body", sqlalchemy.String),
+    sqlalchemy.Column(
+        "post_id",
+        sqlalchemy.ForeignKey("archived_posts.id"),
+        nullable=False,
+        index=True,
+    ),
+    sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), nullable=False),
+)
+
+# Written to the primary and read back from each replica to measure their lag
+replication_heartbeat_table = sqlalchemy.Table(
+    "replication_heartbeat",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("written_at", sqlalchemy.Float, nullable=False),
+)
+
+# The search index is created with dialect specific DDL, FTS5 on SQLite and a
+# generated tsvector column with a GIN index on Postgres.
+search_table = sqlalchemy.table(
+    "search_index",
+    sqlalchemy.column("body"),
+    sqlalchemy.column("kind"),
+    sqlalchemy.column("ref_id"),
+    sqlalchemy.column("post_id"),
 )
 
-metadata.create_all(engine)
+sqlalchemy.event.listen(
+    metadata,
+    "after_create",
+    sqlalchemy.DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "body, kind UNINDEXED, ref_id UNINDEXED, post_id UNINDEXED)"
+    ).execute_if(dialect="sqlite"),
+)
+sqlalchemy.event.listen(
+    metadata,
+    "after_create",
+    sqlalchemy.DDL(
+        "CREATE TABLE IF NOT EXISTS search_index ("
+        "body TEXT, kind VARCHAR NOT NULL, ref_id INTEGER NOT NULL, "
+        "post_id INTEGER NOT NULL, "
+        "document TSVECTOR GENERATED ALWAYS AS "
+        "(to_tsvector('english', coalesce(body, ''))) STORED, "
+        "PRIMARY KEY (kind, ref_id))"
+    ).execute_if(dialect="postgresql"),
+)
+sqlalchemy.event.listen(
+    metadata,
+    "after_create",
+    sqlalchemy.DDL(
+        "CREATE INDEX IF NOT EXISTS ix_search_index_document "
+        "ON search_index USING GIN (document)"
+    ).execute_if(dialect="postgresql"),
+)
+
+
+@lru_cache
+def get_engine() -> sqlalchemy.Engine:
+    connect_args = {}
+    if config.DATABASE_URL.startswith("sqlite"):
+        connect_args["check_same_thread"] = False
+    return sqlalchemy.create_engine(config.DATABASE_URL, connect_args=connect_args)
+
+
+def create_tables() -> None:
+    # The sync engine is only used for DDL, queries go through `database`
+    engine = get_engine()
+    metadata.create_all(engine)
+    engine.dispose()
+
+
+def upsert(database: databases.Database, table: sqlalchemy.Table):
+    # INSERT ... ON CONFLICT, which only the dialect specific insert constructs have
+    dialect = postgresql if database.url.dialect == "postgresql" else sqlite
+    return dialect.insert(table)
+
+
+def is_integrity_error(err: Exception) -> bool:
+    # The drivers share no exception class, SQLSTATE class 23 is a constraint
+    # violation on Postgres
+    if isinstance(err, sqlite3.IntegrityError):
+        return True
+    return str(getattr(err, "sqlstate", "")).startswith("23")
+
+
+def pool_options(url: str) -> dict:
+    # Pool sizes are per worker process, SQLite uses a single connection
+    if url.startswith("sqlite"):
+        return {}
+    return {"min_size": config.DB_MIN_SIZE, "max_size": config.DB_MAX_SIZE}
+
 
 database = databases.Database(
-    config.DATABASE_URL, force_rollback=config.DB_FORCE_ROLL_BACK
+    config.DATABASE_URL,
+    force_rollback=config.DB_FORCE_ROLL_BACK,
+    **pool_options(config.DATABASE_URL),
 )
@@ -0,0 +1,87 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Optional
+
+import sqlalchemy
+from databases import Database
+
+from socialink import storage
+from socialink.config import config
+from socialink.database import direct_upload_table
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "direct/"
+
+
+async def sweep_direct_uploads(
+    database: Database, older_than: datetime.timedelta, batch_size: int = 500
+) -> int:
+    """Deletes objects under direct/ that were never completed.
+
+    Only objects older than `older_than`, the lifetime of the token that
+    completes them, are looked at, so uploads that can still be completed
+    are kept.
+    """
+    cutoff = time.time() - older_than.total_seconds()
+    expired = [
+        name
+        for name, uploaded_at in await storage.list_objects(PREFIX)
+        if uploaded_at < cutoff
+    ]
+
+    deleted = 0
+    for start in range(0, len(expired), batch_size):
+        batch = expired[start : start + batch_size]
+        query = sqlalchemy.select(direct_upload_table.c.file_name).where(
+            direct_upload_table.c.file_name.in_(batch)
+        )
+        completed = {row.file_name for row in await database.fetch_all(query)}
+        for name in batch:
+            if name in completed:
+                continue
+            try:
+                await storage.delete(name)
+            except Exception as err:
+                # Most likely another worker's sweep deleted it first
+                logger.warning(f"Could not delete direct upload {name}: {err!r}")
+            else:
+                logger.info(f"Deleted direct upload {name}, it was never completed")
+                deleted += 1
+    return deleted
+
+
+class DirectUploadSweeper:
+    def __init__(self, older_than: datetime.timedelta, interval: float = 3600.0):
+        self.older_than = older_than
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _sweep_periodically(self, database: Database) -> None:
+        while True:
+            try:
+                await sweep_direct_uploads(database, self.older_than)
+            except Exception:
+                logger.exception("Failed to sweep direct uploads, retrying later")
+            await asyncio.sleep(self.interval)
+
+    def start(self, database: Database) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep_periodically(database))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+direct_upload_sweeper = DirectUploadSweeper(
+    datetime.timedelta(minutes=config.DIRECT_UPLOAD_EXPIRE_MINUTES),
+    config.DIRECT_UPLOAD_SWEEP_INTERVAL,
+)
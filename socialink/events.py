@@ -0,0 +1,107 @@
+import asyncio
+import itertools
+import json
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from socialink.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    post_id: int
+    data: dict
+
+    def encode(self) -> bytes:
+        return (
+            f"id: {self.id}\nevent: {self.type}\n"
+            f"data: {json.dumps(self.data, default=str)}\n\n"
+        ).encode()
+
+
+class Subscription:
+    """One listener's buffer of encoded events.
+
+    A listener that falls `max_size` events behind is evicted rather than
+    letting its buffer grow, `None` in the buffer marks the end of the stream.
+    """
+
+    def __init__(self, max_size: int, post_id: Optional[int] = None) -> None:
+        self.post_id = post_id
+        self.evicted = False
+        self._queue: asyncio.Queue = asyncio.Queue(max_size + 1)
+        self._max_size = max_size
+
+    def wants(self, event: Event) -> bool:
+        return self.post_id is None or self.post_id == event.post_id
+
+    def push(self, message: bytes) -> bool:
+        if self._queue.qsize() >= self._max_size:
+            return False
+        self._queue.put_nowait(message)
+        return True
+
+    def end(self, evicted: bool = False) -> None:
+        self.evicted = evicted
+        # The extra slot keeps room for the end marker even when full
+        self._queue.put_nowait(None)
+
+    async def get(self) -> Optional[bytes]:
+        return await self._queue.get()
+
+
+class EventBroker:
+    """In-process pub/sub for new posts, comments, likes and generated images.
+
+    Events are encoded once when they are published and the same bytes are
+    handed to every subscription, so publishing never waits on listeners.
+    """
+
+    def __init__(self, max_subscribers: int = 10_000, buffer_size: int = 100) -> None:
+        self.max_subscribers = max_subscribers
+        self.buffer_size = buffer_size
+        self._subscriptions: set[Subscription] = set()
+        self._ids = itertools.count(1)
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, post_id: Optional[int] = None) -> Subscription:
+        if len(self._subscriptions) >= self.max_subscribers:
+            raise TooManySubscribers()
+        subscription = Subscription(self.buffer_size, post_id)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def publish(self, type: str, post_id: int, data: dict) -> Event:
+        event = Event(next(self._ids), type, post_id, data)
+        message = event.encode()
+        for subscription in list(self._subscriptions):
+            if subscription.wants(event) and not subscription.push(message):
+                logger.warning("Evicting an event listener that fell behind")
+                self.unsubscribe(subscription)
+                subscription.end(evicted=True)
+                self.evictions += 1
+        return event
+
+    def close(self) -> None:
+        # Ends every open stream, so shutdown doesn't wait on idle listeners
+        for subscription in self._subscriptions:
+            subscription.end()
+        self._subscriptions.clear()
+
+
+event_broker = EventBroker(config.EVENTS_MAX_SUBSCRIBERS, config.EVENTS_BUFFER_SIZE)
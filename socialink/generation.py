@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Coroutine, Optional
+
+from socialink.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationError(Exception):
+    pass
+
+
+class CircuitOpenError(GenerationError):
+    pass
+
+
+class CircuitBreaker:
+    """Stops calling the provider after `failure_threshold` failures in a row.
+
+    Once open, calls fail immediately for `reset_timeout` seconds. After that
+    a single trial call is let through, closing the circuit if it succeeds
+    and opening it again if it fails.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Image generation circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Image generation circuit opened")
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+
+class GenerationPipeline:
+    def __init__(
+        self,
+        concurrency: int = 4,
+        attempt_timeout: float = 60.0,
+        retries: int = 2,
+        backoff: float = 1.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.attempt_timeout = attempt_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+    def retry_delay(self, attempt: int) -> float:
+        # Full jitter keeps retries from many posts from arriving together
+        return random.uniform(0, self.backoff * 2**attempt)
+
+    async def run(self, call: Callable[[str], Awaitable[dict]], prompt: str) -> dict:
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError("Image generation is unavailable")
+            try:
+                async with self._semaphore:
+                    response = await asyncio.wait_for(
+                        call(prompt), self.attempt_timeout
+                    )
+            except Exception as err:
+                self.breaker.record_failure()
+                logger.warning(
+                    f"Image generation attempt {attempt + 1} failed: {err!r}"
+                )
+                error = err
+            else:
+                self.breaker.record_success()
+                return response
+
+            if attempt < self.retries:
+                await asyncio.sleep(self.retry_delay(attempt))
+
+        raise GenerationError("Image generation failed") from error
+
+    def submit(self, job: Coroutine) -> asyncio.Task:
+        # Jobs run detached from the request that started them, they are only
+        # tracked so shutdown can wait for or cancel them.
+        task = asyncio.create_task(job)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def join(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def stop(self, grace_period: float = 0) -> None:
+        pending = set(self._tasks)
+        if pending and grace_period > 0:
+            _, pending = await asyncio.wait(pending, timeout=grace_period)
+        if pending:
+            logger.info(f"Cancelling {len(pending)} image generations")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+generation_pipeline = GenerationPipeline(
+    config.GENERATION_CONCURRENCY,
+    config.GENERATION_TIMEOUT,
+    config.GENERATION_RETRIES,
+    config.GENERATION_BACKOFF,
+    CircuitBreaker(
+        config.GENERATION_BREAKER_THRESHOLD, config.GENERATION_BREAKER_RESET
+    ),
+)
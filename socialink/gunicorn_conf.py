@@ -0,0 +1,30 @@
+# Gunicorn settings for running SociaLink with one uvicorn worker per core:
+#
+#     gunicorn -c socialink/gunicorn_conf.py
+#
+# Each worker builds its own app with create_app() and opens its own database
+# pool in the lifespan, so DB_MAX_SIZE connections are opened per worker.
+import multiprocessing
+import os
+
+wsgi_app = "socialink.main:create_app()"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("TIMEOUT", 60))
+
+# Recycle workers now and then to bound memory growth, with jitter so they
+# don't all restart at once.
+max_requests = int(os.getenv("MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 1000))
+
+
+def on_starting(server):
+    # Create the tables and backfill rankings once in the master rather than
+    # racing in every worker. Their connections are closed before the fork.
+    from socialink.backfill import backfill
+
+    backfill(["rankings"])
@@ -0,0 +1,116 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+from collections import Counter
+from typing import Awaitable, Callable
+
+from databases import Database
+
+from socialink.config import config
+from socialink.database import generated_image_table, upsert
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = ["output_url", "thumbnail_url", "medium_url"]
+
+
+class Uncached(dict):
+    """A generated image to hand out but not cache, e.g. one not mirrored."""
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.casefold().split()).strip(".!?,;: ")
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()
+
+
+def is_fresh(created_at: datetime.datetime, ttl: float) -> bool:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=datetime.timezone.utc)
+    age = datetime.datetime.now(datetime.timezone.utc) - created_at
+    return age.total_seconds() < ttl
+
+
+class ImageCache:
+    """Caches generated images by prompt and shares in-flight generations.
+
+    Every caller asking for a prompt that is already being looked up or
+    generated waits on the same future instead of starting its own call.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.stats: Counter = Counter()
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    @property
+    def saved_calls(self) -> int:
+        return self.stats["hits"] + self.stats["coalesced"]
+
+    async def get(self, database: Database, key: str):
+        query = generated_image_table.select().where(
+            generated_image_table.c.prompt_hash == key
+        )
+        image = await database.fetch_one(query)
+        if image and is_fresh(image.created_at, self.ttl):
+            return {field: image[field] for field in IMAGE_FIELDS}
+        return None
+
+    async def store(self, database: Database, key: str, prompt: str, image: dict):
+        values = {
+            "prompt_hash": key,
+            "prompt": prompt,
+            **{field: image.get(field) for field in IMAGE_FIELDS},
+            "created_at": datetime.datetime.now(datetime.timezone.utc),
+        }
+        query = (
+            upsert(database, generated_image_table)
+            .values(values)
+            .on_conflict_do_update(index_elements=["prompt_hash"], set_=values)
+        )
+        logger.debug(query)
+        await database.execute(query)
+
+    async def get_or_generate(
+        self,
+        database: Database,
+        prompt: str,
+        generate: Callable[[str], Awaitable[dict]],
+    ) -> dict:
+        key = prompt_key(prompt)
+        if key in self._in_flight:
+            self.stats["coalesced"] += 1
+            logger.debug(f"Waiting for in-flight generation of {key}")
+            # Shielded so one waiter being cancelled doesn't cancel the others
+            return await asyncio.shield(self._in_flight[key])
+
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await self.get(database, key)
+            if response:
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                response = await generate(prompt)
+                if not isinstance(response, Uncached):
+                    await self.store(database, key, prompt, response)
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:
+            self.stats["errors"] += 1
+            future.set_exception(err)
+            # Marks the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+            logger.debug(f"Image cache stats {dict(self.stats)}")
+
+
+image_cache = ImageCache(config.IMAGE_CACHE_TTL)
@@ -1,25 +1,35 @@
+import datetime
+import hashlib
+import hmac
 import logging
 from functools import lru_cache
+from typing import Optional
+from urllib.parse import quote, urlsplit
 
-import b2sdk.v2 as b2
-from fastapi import UploadFile
 from socialink.config import config
 
 logger = logging.getLogger(__name__)
 
 
-@lru_cache
-def b2_api():
+def b2_authorize(key_id: str, application_key: str):
+    # b2sdk is slow to import, so it is only loaded once storage is used
+    import b2sdk.v2 as b2
+
     logger.debug("Creating and authorizing b2 api")
     info = b2.InMemoryAccountInfo()
     b2_api = b2.B2Api(info)
 
-    b2_api.authorize_account("production", config.B2_KEY_ID, config.B2_APPLICATION_KEY)
+    b2_api.authorize_account("production", key_id, application_key)
     return b2_api
 
 
 @lru_cache
-def b2_get_bucket(api: b2.B2Api):
+def b2_api():
+    return b2_authorize(config.B2_KEY_ID, config.B2_APPLICATION_KEY)
+
+
+@lru_cache
+def b2_get_bucket(api):
     return api.get_bucket_by_name(config.B2_BUCKET_NAME)
 
 
@@ -36,3 +46,116 @@ def b2_upload_file(local_file: str, file_name: str) -> str:
     )
 
     return download_url
+
+
+def b2_public_url(api, file_name: str) -> str:
+    # Name based URLs are stable, so a CDN in front of the bucket can cache them
+    if config.B2_PUBLIC_URL:
+        return f"{config.B2_PUBLIC_URL.rstrip('/')}/{file_name}"
+    return api.get_download_url_for_file_name(config.B2_BUCKET_NAME, file_name)
+
+
+def b2_upload_bytes(data: bytes, file_name: str, content_type: str) -> str:
+    api = b2_api()
+    logger.debug(f"Uploading {len(data)} bytes to B2 as {file_name}")
+
+    b2_get_bucket(api).upload_bytes(data, file_name, content_type=content_type)
+    return b2_public_url(api, file_name)
+
+
+def s3_presign_url(
+    method: str,
+    url: str,
+    headers: dict[str, str],
+    key_id: str,
+    secret: str,
+    region: str,
+    expires: int,
+    now: Optional[datetime.datetime] = None,
+) -> str:
+    """Signs `url` with AWS Signature Version 4 in its query string.
+
+    Every header in `headers` is signed, so the request has to send them with
+    exactly these values. The body isn't, it can't be known in advance.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    timestamp = now.strftime("%Y%m%dT%H%M%SZ")
+    scope = f"{now:%Y%m%d}/{region}/s3/aws4_request"
+    parts = urlsplit(url)
+    signed = {"host": parts.netloc, **{k.lower(): v for k, v in headers.items()}}
+    signed_headers = ";".join(sorted(signed))
+
+    params = {
+        "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+        "X-Amz-Credential": f"{key_id}/{scope}",
+        "X-Amz-Date": timestamp,
+        "X-Amz-Expires": str(expires),
+        "X-Amz-SignedHeaders": signed_headers,
+    }
+    query = "&".join(
+        f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+        for name, value in sorted(params.items())
+    )
+    canonical_request = "\n".join(
+        [
+            method,
+            quote(parts.path or "/", safe="/-_.~"),
+            query,
+            "".join(f"{name}:{signed[name].strip()}\n" for name in sorted(signed)),
+            signed_headers,
+            "UNSIGNED-PAYLOAD",
+        ]
+    )
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            timestamp,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+
+    key = f"AWS4{secret}".encode()
+    for part in (f"{now:%Y%m%d}", region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    return f"{parts.scheme}://{parts.netloc}{parts.path}?{query}&X-Amz-Signature={signature}"
+
+
+def b2_presigned_put_url(file_name: str, headers: dict[str, str], expires: int) -> str:
+    # Signed with the key restricted to the direct upload prefix, the URL only
+    # stores this one file name with the signed size and content type
+    endpoint = config.B2_S3_ENDPOINT.rstrip("/")
+    region = urlsplit(endpoint).hostname.split(".")[1]
+    return s3_presign_url(
+        "PUT",
+        f"{endpoint}/{config.B2_BUCKET_NAME}/{file_name}",
+        headers,
+        config.B2_DIRECT_KEY_ID,
+        config.B2_DIRECT_APPLICATION_KEY,
+        region,
+        expires,
+    )
+
+
+def b2_file_info_by_name(file_name: str):
+    return b2_get_bucket(b2_api()).get_file_info_by_name(file_name)
+
+
+def b2_file_url(file_name: str) -> str:
+    return b2_public_url(b2_api(), file_name)
+
+
+def b2_list_files(prefix: str) -> list[tuple[str, float]]:
+    """Returns the name and upload time, in seconds, of files under `prefix`."""
+    bucket = b2_get_bucket(b2_api())
+    return [
+        (version.file_name, version.upload_timestamp / 1000)
+        for version, _ in bucket.ls(prefix, recursive=True)
+    ]
+
+
+def b2_delete_file(file_name: str) -> None:
+    api = b2_api()
+    info = b2_get_bucket(api).get_file_info_by_name(file_name)
+    api.delete_file_version(info.id_, file_name)
@@ -0,0 +1,102 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Union
+
+from socialink.config import config
+
+logger = logging.getLogger(__name__)
+
+SNIFF_BYTES = 12
+SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"\xff\xd8\xff": "image/jpeg",
+    b"GIF87a": "image/gif",
+    b"GIF89a": "image/gif",
+}
+EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+FORMATS = {
+    "WEBP": ("image/webp", "webp", {"quality": 80, "method": 4}),
+    "JPEG": (
+        "image/jpeg",
+        "jpg",
+        {"quality": 85, "optimize": True, "progressive": True},
+    ),
+}
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    # Trust the file's magic bytes, not the name or content type the client sent
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in SIGNATURES.items():
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def variant_name(width: int, format: str) -> str:
+    return f"{width}w.{FORMATS[format][1]}"
+
+
+def encode_variants(
+    source: Union[str, bytes], widths: list[int], formats: list[str]
+) -> dict[str, bytes]:
+    """Encodes `source` at every width in every format, keyed by variant_name."""
+    from PIL import Image, ImageOps
+
+    variants = {}
+    with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as image:
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, far cheaper than
+        # decoding every pixel only to throw most of them away
+        scale = max(widths) / min(image.size)
+        if scale < 1:
+            image.draft("RGB", (int(image.width * scale), int(image.height * scale)))
+        current = ImageOps.exif_transpose(image).convert("RGB")
+
+        # Each width is resized from the next larger one instead of the original
+        for width in sorted(widths, reverse=True):
+            current = current.copy()
+            current.thumbnail((width, width * 4))
+            for format in formats:
+                buffer = io.BytesIO()
+                current.save(buffer, format, **FORMATS[format][2])
+                variants[variant_name(width, format)] = buffer.getvalue()
+    return variants
+
+
+def warm_image_worker() -> None:
+    # Pillow and its format plugins are imported lazily, do it before an upload
+    from PIL import Image
+
+    Image.init()
+
+
+@lru_cache
+def image_executor() -> ProcessPoolExecutor:
+    # Spawned rather than forked so workers don't inherit the event loop,
+    # database connections or threads of the process that started them
+    logger.debug(f"Starting {config.IMAGE_WORKERS} image workers")
+    return ProcessPoolExecutor(
+        config.IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+async def run_in_image_worker(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(
+        image_executor(), func, *args
+    )
+
+
+def shutdown_image_executor() -> None:
+    if image_executor.cache_info().currsize:
+        image_executor().shutdown(cancel_futures=True)
+        image_executor.cache_clear()
@@ -0,0 +1,91 @@
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+from typing import AsyncIterator, Optional, Union
+
+import aiofiles
+
+from socialink.config import config
+from socialink.libs.images import SNIFF_BYTES, sniff_image_type
+
+logger = logging.getLogger(__name__)
+
+
+class ObjectTooLarge(Exception):
+    pass
+
+
+def local_storage_path(file_name: str) -> pathlib.Path:
+    root = pathlib.Path(config.LOCAL_STORAGE_DIR).resolve()
+    path = (root / file_name).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError(f"{file_name} is outside the storage directory")
+    return path
+
+
+async def local_storage_write(
+    file_name: str, chunks: AsyncIterator[bytes], max_size: int
+) -> int:
+    path = local_storage_path(file_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    logger.debug(f"Writing {file_name} to local storage")
+
+    # Written aside and renamed, so a cut off upload never shows up as an object
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        size = 0
+        async with aiofiles.open(temp_name, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_size:
+                    raise ObjectTooLarge(file_name)
+                await f.write(chunk)
+        os.replace(temp_name, path)
+    finally:
+        pathlib.Path(temp_name).unlink(missing_ok=True)
+    return size
+
+
+def local_storage_put(file_name: str, source: Union[str, bytes]) -> None:
+    """Stores the file at path `source`, or the bytes `source`, as `file_name`."""
+    path = local_storage_path(file_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    logger.debug(f"Storing {file_name} in local storage")
+
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(source, bytes):
+                f.write(source)
+            else:
+                with open(source, "rb") as original:
+                    shutil.copyfileobj(original, f)
+        os.replace(temp_name, path)
+    finally:
+        pathlib.Path(temp_name).unlink(missing_ok=True)
+
+
+def local_storage_info(file_name: str) -> Optional[tuple[int, Optional[str]]]:
+    """Returns the size and sniffed image type of `file_name`, if it is stored."""
+    path = local_storage_path(file_name)
+    if not path.is_file():
+        return None
+    with open(path, "rb") as f:
+        return path.stat().st_size, sniff_image_type(f.read(SNIFF_BYTES))
+
+
+def local_storage_list(prefix: str) -> list[tuple[str, float]]:
+    """Returns the name and modification time of objects under `prefix`."""
+    root = pathlib.Path(config.LOCAL_STORAGE_DIR).resolve()
+    return [
+        (path.relative_to(root).as_posix(), path.stat().st_mtime)
+        for path in local_storage_path(prefix).rglob("*")
+        if path.is_file()
+    ]
+
+
+def local_storage_delete(file_name: str) -> None:
+    local_storage_path(file_name).unlink(missing_ok=True)
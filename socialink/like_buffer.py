@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Optional
+
+from databases import Database
+
+from socialink.config import config
+from socialink.database import is_integrity_error, likes_table
+from socialink.ranking import add_likes_to_ranking
+
+logger = logging.getLogger(__name__)
+
+
+class LikeBuffer:
+    """Accepts likes in memory and writes them to the database in batches."""
+
+    def __init__(
+        self,
+        max_size: int = 500,
+        flush_interval: float = 1.0,
+        max_backoff: float = 60.0,
+    ) -> None:
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        # Flushes that fail are retried after a delay doubling up to this
+        self.max_backoff = max_backoff
+        # dicts are used as ordered sets so batches keep arrival order
+        self._pending: dict[tuple[int, int], None] = {}
+        self._in_flight: dict[tuple[int, int], None] = {}
+        self._counts: Counter = Counter()
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending) + len(self._in_flight)
+
+    def pending_likes(self, post_id: int) -> int:
+        return self._counts[post_id]
+
+    @property
+    def backing_off(self) -> bool:
+        return time.monotonic() < self._retry_at
+
+    async def add(self, database: Database, post_id: int, user_id: int) -> bool:
+        key = (post_id, user_id)
+        if key in self._pending or key in self._in_flight:
+            return False
+
+        self._pending[key] = None
+        self._counts[post_id] += 1
+
+        # While the database is failing, requests don't each wait on a flush
+        if len(self._pending) >= self.max_size and not self.backing_off:
+            await self.flush(database)
+        return True
+
+    async def _write(self, database: Database, keys: list[tuple[int, int]]) -> None:
+        batch = [{"post_id": post_id, "user_id": user_id} for post_id, user_id in keys]
+        async with database.transaction():
+            await database.execute(likes_table.insert().values(batch))
+            likes_per_post = Counter(post_id for post_id, _ in keys)
+            for post_id, count in likes_per_post.items():
+                await add_likes_to_ranking(database, post_id, count)
+
+    def _done(self, keys: list[tuple[int, int]]) -> None:
+        for key in keys:
+            del self._in_flight[key]
+            post_id, _ = key
+            self._counts[post_id] -= 1
+            if not self._counts[post_id]:
+                del self._counts[post_id]
+
+    async def _write_each(self, database: Database) -> int:
+        """Writes the likes in flight one at a time, returns how many were.
+
+        Likes that break a constraint, e.g. of a post deleted or archived
+        since, can never be written and are dropped so they can't hold up the
+        rest. Any other error leaves the rest in flight.
+        """
+        written = dropped = 0
+        for key in list(self._in_flight):
+            try:
+                await self._write(database, [key])
+            except Exception as err:
+                if not is_integrity_error(err):
+                    # Most likely the database is unreachable, so the rest
+                    # would fail the same way
+                    break
+                logger.debug(f"Dropping buffered like {key}: {err!r}")
+                dropped += 1
+            else:
+                written += 1
+            self._done([key])
+        if dropped:
+            logger.warning(f"Dropped {dropped} buffered likes that can't be written")
+        return written
+
+    async def flush(self, database: Database) -> int:
+        async with self._lock:
+            if not self._pending:
+                return 0
+
+            self._in_flight, self._pending = self._pending, {}
+            logger.debug(f"Flushing {len(self._in_flight)} buffered likes")
+
+            written = 0
+            try:
+                try:
+                    await self._write(database, list(self._in_flight))
+                except Exception:
+                    logger.exception(
+                        "Failed to flush buffered likes, writing them singly"
+                    )
+                    written = await self._write_each(database)
+                else:
+                    written = len(self._in_flight)
+                    self._done(list(self._in_flight))
+            finally:
+                # Likes not written, because the database failed or the flush
+                # was cancelled on shutdown, go back to the front of the queue.
+                # They were acknowledged, so they are never given up on.
+                failed = len(self._in_flight)
+                self._pending = {**self._in_flight, **self._pending}
+                self._in_flight = {}
+
+            if failed:
+                self._backoff = min(
+                    self.max_backoff, self._backoff * 2 or self.flush_interval
+                )
+                self._retry_at = time.monotonic() + self._backoff
+                logger.warning(
+                    f"Keeping {failed} buffered likes, retrying in {self._backoff}s"
+                )
+            else:
+                self._backoff = self._retry_at = 0.0
+            return written
+
+    async def _flush_periodically(self, database: Database) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self.backing_off:
+                await self.flush(database)
+
+    def start(self, database: Database) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically(database))
+
+    async def stop(self, database: Database) -> None:
+        if self._task is not None:
+            # A flush cut off here puts its likes back, the last one writes them
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(database)
+
+
+like_buffer = LikeBuffer(
+    config.LIKE_BUFFER_MAX_SIZE,
+    config.LIKE_BUFFER_FLUSH_INTERVAL,
+    config.LIKE_BUFFER_MAX_BACKOFF,
+)
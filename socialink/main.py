@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -5,32 +6,147 @@ from asgi_correlation_id import CorrelationIdMiddleware
 from fastapi import FastAPI, HTTPException
 from fastapi.exception_handlers import http_exception_handler
 
-from socialink.database import database
+import socialink.config
+from socialink.archive import archiver
+from socialink.compression import (
+    CompressedCache,
+    CompressionMiddleware,
+    available_codecs,
+)
+from socialink.database import create_tables, database
+from socialink.direct_uploads import direct_upload_sweeper
+from socialink.events import event_broker
+from socialink.generation import generation_pipeline
+from socialink.libs.images import shutdown_image_executor
+from socialink.like_buffer import like_buffer
 from socialink.logging_conf import configure_logging
+from socialink.profiling import ProfileStore, ProfilingMiddleware
+from socialink.replicas import StickyPrimaryMiddleware, replica_router
+from socialink.routers.debug import router as debug_router
+from socialink.routers.direct_upload import router as direct_upload_router
+from socialink.routers.events import router as events_router
+from socialink.routers.health import router as health_router
 from socialink.routers.post import router as post_router
+from socialink.routers.search import router as search_router
+from socialink.routers.storage import router as storage_router
+from socialink.routers.timeline import router as timeline_router
 from socialink.routers.upload import router as upload_router
 from socialink.routers.user import router as user_router
+from socialink.warmup import Warmup, default_steps
+from socialink.watchdog import LoopWatchdog, StallTrackingMiddleware
 
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Everything that holds connections, tasks or file handles is set up here,
+    # after the server has forked its workers, so nothing is shared between them.
+    config = app.state.config
     configure_logging()
+    if app.state.watchdog:
+        app.state.watchdog.start()
+    await asyncio.to_thread(create_tables)
     await database.connect()
+    await replica_router.connect()
+    replica_router.start()
+    if config.LIKE_BUFFER_ENABLED:
+        like_buffer.start(database)
+    if config.ARCHIVE_ENABLED:
+        archiver.start(database)
+    if config.STORAGE_BACKEND == "local" or config.B2_DIRECT_KEY_ID:
+        direct_upload_sweeper.start(database)
+    app.state.warmup = Warmup(
+        default_steps(app, database, config),
+        config.WARMUP_REQUIRED,
+        config.WARMUP_TIMEOUT,
+    )
+    app.state.warmup.start()
+    if config.WARMUP_WAIT:
+        await app.state.warmup.done.wait()
     yield
+    await app.state.warmup.stop()
+    event_broker.close()
+    await generation_pipeline.stop(config.GENERATION_SHUTDOWN_GRACE)
+    shutdown_image_executor()
+    await archiver.stop()
+    await direct_upload_sweeper.stop()
+    await like_buffer.stop(database)
+    await replica_router.stop()
+    await replica_router.disconnect()
     await database.disconnect()
+    if app.state.watchdog:
+        await app.state.watchdog.stop()
 
 
-app = FastAPI(lifespan=lifespan)
+async def http_exception_handle_logging(request, exc):
+    logger.error(f"HTTP Exception: {exc.status_code} - {exc.detail}")
+    return await http_exception_handler(request, exc)
 
-app.add_middleware(CorrelationIdMiddleware)
-app.include_router(post_router)
-app.include_router(upload_router)
-app.include_router(user_router)
 
+def create_app() -> FastAPI:
+    # Takes no config of its own: the database, like buffer and other
+    # resources the routes use are module globals built from the environment
+    app = FastAPI(lifespan=lifespan)
+    app.state.config = config = socialink.config.config
+    app.state.profiles = None
+    app.state.watchdog = None
+    app.state.warmup = None
+    app.state.compression_cache = None
 
-@app.exception_handler
-async def http_exception_handle_logging(request, exc):
-    logger.error(f"HTPP Exception: {exc.status_code} - {exc.detail}")
-    return await http_exception_handler(request, exc)
+    # Middleware added first runs innermost, these need to run inside
+    # CorrelationIdMiddleware to see the correlation id
+    if config.PROFILING_ENABLED:
+        app.state.profiles = ProfileStore(config.PROFILING_MAX_PROFILES)
+        app.add_middleware(
+            ProfilingMiddleware,
+            store=app.state.profiles,
+            tokens=config.DEBUG_TOKENS,
+            sample_rate=config.PROFILING_SAMPLE_RATE,
+            interval=config.PROFILING_INTERVAL,
+        )
+    if config.WATCHDOG_ENABLED:
+        app.state.watchdog = LoopWatchdog(
+            config.WATCHDOG_THRESHOLD, config.WATCHDOG_INTERVAL
+        )
+        app.add_middleware(StallTrackingMiddleware, watchdog=app.state.watchdog)
+    if config.READ_REPLICA_URLS:
+        app.add_middleware(
+            StickyPrimaryMiddleware, sticky_seconds=config.READ_YOUR_WRITES_SECONDS
+        )
+    if config.DEBUG_TOKENS:
+        app.include_router(debug_router)
+
+    app.add_middleware(CorrelationIdMiddleware)
+    if config.COMPRESSION_ENABLED:
+        if config.COMPRESSION_CACHE_BYTES:
+            app.state.compression_cache = CompressedCache(
+                config.COMPRESSION_CACHE_BYTES
+            )
+        app.add_middleware(
+            CompressionMiddleware,
+            codecs=available_codecs(
+                config.COMPRESSION_GZIP_LEVEL,
+                config.COMPRESSION_BROTLI_QUALITY,
+                config.COMPRESSION_ZSTD_LEVEL,
+            ),
+            minimum_size=config.COMPRESSION_MINIMUM_SIZE,
+            cache=app.state.compression_cache,
+        )
+    app.include_router(health_router)
+    app.include_router(events_router)
+    app.include_router(post_router)
+    app.include_router(search_router)
+    app.include_router(timeline_router)
+    # Before the upload router, whose /uploads/{session_id} would match these
+    app.include_router(direct_upload_router)
+    app.include_router(upload_router)
+    if config.STORAGE_BACKEND == "local":
+        app.include_router(storage_router)
+    app.include_router(user_router)
+
+    app.add_exception_handler(HTTPException, http_exception_handle_logging)
+    return app
+
+
+app = create_app()
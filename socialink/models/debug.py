@@ -0,0 +1,40 @@
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class ProfileSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    correlation_id: str
+    method: str
+    path: str
+    started: float
+    duration: float
+
+
+class Stall(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    route: str
+    correlation_id: Optional[str]
+    duration: float
+    stack: str
+
+
+class StallReport(BaseModel):
+    counts: dict[str, int]
+    recent: list[Stall]
+
+
+class ImageCacheStats(BaseModel):
+    hits: int
+    misses: int
+    coalesced: int
+    errors: int
+    saved_calls: int
+
+
+class UploadStats(BaseModel):
+    objects: int
+    stored_bytes: int
+    duplicates: int
+    bytes_saved: int
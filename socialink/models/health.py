@@ -0,0 +1,16 @@
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class WarmupStep(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    ok: bool
+    duration: float
+    error: Optional[str] = None
+
+
+class Readiness(BaseModel):
+    ready: bool
+    steps: dict[str, WarmupStep]
+    pending: list[str]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import Literal, Optional
 
 
 class UserPostIn(BaseModel):
@@ -11,6 +11,9 @@ class UserPost(UserPostIn):
     id: int
     user_id: int
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    medium_url: Optional[str] = None
+    image_status: Optional[Literal["pending", "ready", "failed"]] = None
 
 
 class CommentIn(BaseModel):
@@ -34,10 +37,24 @@ class UserPostsWithComments(BaseModel):
     comments: list[Comment]
 
 
+class UserPostWithCommentPreview(UserPostsWithComments):
+    # All of the post's comments, `comments` only holds the first few
+    comment_count: int
+
+
 class PostLikeIn(BaseModel):
     post_id: int
 
 
 class PostLike(PostLikeIn):
-    id: int
+    id: Optional[int] = None
     user_id: int
+
+
+class SearchResult(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    kind: Literal["post", "comment"]
+    id: int
+    post_id: int
+    body: str
+    score: float
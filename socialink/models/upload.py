@@ -0,0 +1,32 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class UploadSessionIn(BaseModel):
+    size: int = Field(gt=0)
+    file_name: str
+
+
+class UploadSessionState(UploadSessionIn):
+    id: str
+    chunk_size: int
+    received: list[tuple[int, int]]
+    missing: list[tuple[int, int]]
+
+
+class DirectUploadIn(BaseModel):
+    content_type: Literal["image/png", "image/jpeg", "image/gif", "image/webp"]
+    size: int = Field(gt=0)
+
+
+class DirectUploadAuthorization(BaseModel):
+    file_name: str
+    upload_url: str
+    method: Literal["PUT"]
+    headers: dict[str, str]
+    token: str
+
+
+class DirectUploadComplete(BaseModel):
+    token: str
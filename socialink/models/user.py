@@ -10,3 +10,7 @@ class User(BaseModel):
 
 class UserIn(User):
     password: str
+
+
+class RefreshTokenIn(BaseModel):
+    refresh_token: str
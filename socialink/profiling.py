@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Optional
+
+from asgi_correlation_id import correlation_id
+
+logger = logging.getLogger(__name__)
+
+DEBUG_TOKEN_HEADER = "X-Debug-Token"
+
+
+def frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame: Optional[FrameType]) -> str:
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+@dataclass
+class Profile:
+    correlation_id: str
+    method: str
+    path: str
+    started: float
+    duration: float = 0.0
+    samples: Counter = field(default_factory=Counter)
+
+    def collapsed(self) -> str:
+        # One "frame;frame;frame count" line per stack, the format read by
+        # flamegraph.pl, speedscope and inferno
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+
+
+class ProfileStore:
+    def __init__(self, max_profiles: int = 100) -> None:
+        self.max_profiles = max_profiles
+        self._profiles: OrderedDict[str, Profile] = OrderedDict()
+
+    def add(self, profile: Profile) -> None:
+        self._profiles[profile.correlation_id] = profile
+        self._profiles.move_to_end(profile.correlation_id)
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+
+    def get(self, correlation_id: str) -> Optional[Profile]:
+        return self._profiles.get(correlation_id)
+
+    def all(self) -> list[Profile]:
+        return list(reversed(self._profiles.values()))
+
+
+class Sampler:
+    """Samples the event loop thread's stack while profiled requests run.
+
+    cProfile can't tell concurrent requests apart on one loop, so a thread
+    looks at whichever task the loop is running at each tick and only keeps
+    the sample when that task belongs to a profiled request. Time spent
+    awaiting I/O doesn't show up, only time spent holding the loop.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self._tasks: dict[asyncio.Task, Counter] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, task: asyncio.Task) -> Counter:
+        self._loop = task.get_loop()
+        self._loop_thread_id = threading.get_ident()
+        samples = self._tasks[task] = Counter()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="profiling-sampler", daemon=True
+            )
+            self._thread.start()
+        self._wake.set()
+        return samples
+
+    def unregister(self, task: asyncio.Task) -> None:
+        self._tasks.pop(task, None)
+        if not self._tasks:
+            self._wake.clear()
+
+    def sample(self) -> None:
+        task = asyncio.current_task(self._loop)
+        samples = self._tasks.get(task)
+        if samples is None:
+            return
+        frame = sys._current_frames().get(self._loop_thread_id)
+        samples[collapse_stack(frame)] += 1
+
+    def _run(self) -> None:
+        while True:
+            # Sleeps without waking up at all while nothing is being profiled
+            self._wake.wait()
+            time.sleep(self.interval)
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Failed to sample the event loop")
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        tokens: list[str],
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+    ) -> None:
+        self.app = app
+        self.store = store
+        self.tokens = {token.encode() for token in tokens}
+        self.sample_rate = sample_rate
+        self.sampler = Sampler(interval)
+
+    def should_profile(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == DEBUG_TOKEN_HEADER.lower().encode():
+                return value in self.tokens
+        return random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        profile = Profile(
+            correlation_id=correlation_id.get() or str(id(task)),
+            method=scope["method"],
+            path=scope["path"],
+            started=time.time(),
+        )
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile.correlation_id.encode()),
+                ]
+            await send(message)
+
+        started = time.perf_counter()
+        profile.samples = self.sampler.register(task)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            self.sampler.unregister(task)
+            profile.duration = time.perf_counter() - started
+            self.store.add(profile)
+            logger.info(
+                f"Profiled {profile.method} {profile.path} in "
+                f"{profile.duration * 1000:.1f}ms, {profile.samples.total()} samples"
+            )
@@ -0,0 +1,104 @@
+import datetime
+import logging
+import math
+from typing import Optional
+
+import sqlalchemy
+from databases import Database
+
+from socialink.database import likes_table, post_ranking_table, post_table, upsert
+
+logger = logging.getLogger(__name__)
+
+# Seconds of age that are worth a 10x increase in likes in the trending score
+TRENDING_DECAY_SECONDS = 45000
+BACKFILL_BATCH_SIZE = 500
+
+select_ranked_posts = sqlalchemy.select(
+    post_table, post_ranking_table.c.likes
+).select_from(post_ranking_table.join(post_table))
+
+
+def hot_score(likes: int, created_at: Optional[datetime.datetime]) -> float:
+    # Newer posts get a higher base score instead of older posts decaying, so
+    # the score never changes unless the post is liked and can be indexed.
+    if created_at is None:
+        # Posts stored before created_at was kept rank as the oldest
+        return math.log10(likes + 1)
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=datetime.timezone.utc)
+    return math.log10(likes + 1) + created_at.timestamp() / TRENDING_DECAY_SECONDS
+
+
+async def add_post_ranking(
+    database: Database, post_id: int, created_at: datetime.datetime
+) -> None:
+    query = post_ranking_table.insert().values(
+        post_id=post_id, likes=0, hot=hot_score(0, created_at)
+    )
+    logger.debug(query)
+    await database.execute(query)
+
+
+async def add_likes_to_ranking(database: Database, post_id: int, count: int = 1):
+    logger.debug(f"Adding {count} likes to ranking of post {post_id}")
+
+    async with database.transaction():
+        query = (
+            post_ranking_table.update()
+            .where(post_ranking_table.c.post_id == post_id)
+            .values(likes=post_ranking_table.c.likes + count)
+        )
+        await database.execute(query)
+
+        query = (
+            sqlalchemy.select(post_ranking_table.c.likes, post_table.c.created_at)
+            .select_from(post_ranking_table.join(post_table))
+            .where(post_ranking_table.c.post_id == post_id)
+        )
+        ranking = await database.fetch_one(query)
+        if ranking is None:
+            return
+
+        query = (
+            post_ranking_table.update()
+            .where(post_ranking_table.c.post_id == post_id)
+            .values(hot=hot_score(ranking.likes, ranking.created_at))
+        )
+        await database.execute(query)
+
+
+async def backfill_post_rankings(database: Database) -> int:
+    """Create ranking rows for posts stored before rankings were maintained."""
+    query = (
+        sqlalchemy.select(
+            post_table.c.id,
+            post_table.c.created_at,
+            sqlalchemy.func.count(likes_table.c.id).label("likes"),
+        )
+        .select_from(post_table.outerjoin(likes_table))
+        .where(
+            ~sqlalchemy.exists().where(post_ranking_table.c.post_id == post_table.c.id)
+        )
+        .group_by(post_table.c.id)
+    )
+    posts = await database.fetch_all(query)
+    if not posts:
+        return 0
+
+    rankings = [
+        {
+            "post_id": post.id,
+            "likes": post.likes,
+            "hot": hot_score(post.likes, post.created_at),
+        }
+        for post in posts
+    ]
+    logger.info(f"Backfilling rankings for {len(rankings)} posts")
+    for start in range(0, len(rankings), BACKFILL_BATCH_SIZE):
+        batch = rankings[start : start + BACKFILL_BATCH_SIZE]
+        # Skips posts that were ranked since they were read, e.g. by another run
+        await database.execute(
+            upsert(database, post_ranking_table).values(batch).on_conflict_do_nothing()
+        )
+    return len(rankings)
@@ -0,0 +1,162 @@
+import logging
+import math
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from typing import Annotated, NamedTuple
+
+from databases import Database
+from fastapi import Depends, HTTPException, Request, status
+
+from socialink.config import config
+from socialink.database import database, rate_limit_table, upsert
+from socialink.models.user import User
+from socialink.security import get_current_user
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Rate(NamedTuple):
+    capacity: int
+    per_second: float
+
+
+def parse_rate(rate: str) -> Rate:
+    # "10/minute" allows bursts of 10 requests, refilled at 10 per minute
+    count, period = rate.split("/")
+    return Rate(int(count), int(count) / PERIODS[period])
+
+
+def take_token(tokens: float, elapsed: float, rate: Rate) -> tuple[float, float]:
+    tokens = min(rate.capacity, tokens + elapsed * rate.per_second)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate.per_second
+
+
+class MemoryBackend:
+    """Token buckets kept in this process, each worker limits on its own."""
+
+    def __init__(self, max_keys: int = 100000) -> None:
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: Rate) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (rate.capacity, now))
+        tokens, retry_after = take_token(tokens, now - updated_at, rate)
+        self._buckets[key] = (tokens, now)
+        # Least recently used buckets go first, they are the most likely to be full
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class DatabaseBackend:
+    """Token buckets in the rate_limits table, shared by every worker."""
+
+    def __init__(self, database: Database) -> None:
+        self.database = database
+
+    async def take(self, key: str, rate: Rate) -> float:
+        now = time.time()
+        async with self.database.transaction():
+            await self.database.execute(
+                upsert(self.database, rate_limit_table)
+                .values(key=key, tokens=rate.capacity, updated_at=now)
+                .on_conflict_do_nothing()
+            )
+            query = (
+                rate_limit_table.select()
+                .where(rate_limit_table.c.key == key)
+                .with_for_update()
+            )
+            bucket = await self.database.fetch_one(query)
+            tokens, retry_after = take_token(
+                bucket.tokens, max(now - bucket.updated_at, 0), rate
+            )
+            await self.database.execute(
+                rate_limit_table.update()
+                .where(rate_limit_table.c.key == key)
+                .values(tokens=tokens, updated_at=max(now, bucket.updated_at))
+            )
+        return retry_after
+
+
+class RateLimiter:
+    def __init__(
+        self, backend, rates: dict[str, str], concurrency: dict[str, int]
+    ) -> None:
+        self.backend = backend
+        self.rates = {name: parse_rate(rate) for name, rate in rates.items()}
+        self.concurrency = concurrency
+        self._active: defaultdict[str, int] = defaultdict(int)
+
+    async def check_rate(self, name: str, key: str) -> None:
+        if name not in self.rates:
+            return
+        retry_after = await self.backend.take(f"{name}:{key}", self.rates[name])
+        if retry_after:
+            logger.warning(f"Rate limit for {name} exceeded by {key}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    @asynccontextmanager
+    async def admit(self, name: str, key: str):
+        if not config.RATE_LIMIT_ENABLED:
+            yield
+            return
+
+        await self.check_rate(name, key)
+
+        # Over the cap new requests fail fast rather than queue behind the others
+        if self._active[name] >= self.concurrency.get(name, math.inf):
+            logger.warning(f"Concurrency limit for {name} reached")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self._active[name] += 1
+        try:
+            yield
+        finally:
+            self._active[name] -= 1
+
+
+def create_backend(name: str):
+    if name == "database":
+        return DatabaseBackend(database)
+    return MemoryBackend()
+
+
+rate_limiter = RateLimiter(
+    create_backend(config.RATE_LIMIT_BACKEND),
+    config.RATE_LIMITS,
+    config.CONCURRENCY_LIMITS,
+)
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def limit_by_user(name: str):
+    async def dependency(current_user: Annotated[User, Depends(get_current_user)]):
+        async with rate_limiter.admit(name, f"user:{current_user.id}"):
+            yield
+
+    return dependency
+
+
+def limit_by_ip(name: str):
+    async def dependency(request: Request):
+        async with rate_limiter.admit(name, f"ip:{client_ip(request)}"):
+            yield
+
+    return dependency
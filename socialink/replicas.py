@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from typing import Optional
+
+import sqlalchemy
+from databases import Database
+from fastapi import Request
+
+from socialink.config import config
+from socialink.database import (
+    database,
+    pool_options,
+    replication_heartbeat_table,
+    upsert,
+)
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = "socialink_primary_until"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+HEARTBEAT_ID = 1
+
+
+class ReplicaRouter:
+    """Picks the database a read goes to.
+
+    Every `check_interval` the primary's heartbeat row is bumped and read back
+    from each replica, how old the replica's copy is is how far behind it is.
+    Reads are spread over the replicas that are less than `max_lag` behind and
+    go to the primary when there are none, or when the client wrote something
+    recently enough that a replica might not have it yet.
+    """
+
+    def __init__(
+        self,
+        primary: Database,
+        replicas: list[Database],
+        max_lag: float = 3.0,
+        check_interval: float = 1.0,
+    ) -> None:
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        # Replicas get no reads until they have been checked
+        self.lags = [math.inf] * len(replicas)
+        self._next = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def healthy(self) -> list[Database]:
+        return [
+            replica
+            for replica, lag in zip(self.replicas, self.lags)
+            if lag <= self.max_lag
+        ]
+
+    def choose(self, primary_until: Optional[float] = None) -> Database:
+        if primary_until is not None and primary_until > time.time():
+            return self.primary
+        replicas = self.healthy()
+        if not replicas:
+            return self.primary
+        return replicas[next(self._next) % len(replicas)]
+
+    async def write_heartbeat(self) -> None:
+        query = upsert(self.primary, replication_heartbeat_table).values(
+            id=HEARTBEAT_ID, written_at=time.time()
+        )
+        query = query.on_conflict_do_update(
+            index_elements=["id"], set_={"written_at": query.excluded.written_at}
+        )
+        await self.primary.execute(query)
+
+    async def measure_lag(self, replica: Database) -> float:
+        query = sqlalchemy.select(replication_heartbeat_table.c.written_at).where(
+            replication_heartbeat_table.c.id == HEARTBEAT_ID
+        )
+        try:
+            written_at = await replica.fetch_val(query)
+        except Exception as err:
+            logger.warning(f"Replica {replica.url!r} is unreachable: {err!r}")
+            return math.inf
+        if written_at is None:
+            return math.inf
+        return max(0.0, time.time() - written_at)
+
+    async def check(self) -> None:
+        try:
+            await self.write_heartbeat()
+        except Exception:
+            # Without a fresh heartbeat every replica looks more and more behind
+            logger.exception("Failed to write the replication heartbeat")
+        self.lags = list(
+            await asyncio.gather(
+                *(self.measure_lag(replica) for replica in self.replicas)
+            )
+        )
+        for replica, lag in zip(self.replicas, self.lags):
+            if lag > self.max_lag:
+                logger.warning(f"Replica {replica.url!r} is {lag:.1f}s behind")
+
+    async def _check_periodically(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+    async def connect(self) -> None:
+        await asyncio.gather(*(replica.connect() for replica in self.replicas))
+
+    async def disconnect(self) -> None:
+        await asyncio.gather(*(replica.disconnect() for replica in self.replicas))
+
+    def start(self) -> None:
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._check_periodically())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class StickyPrimaryMiddleware:
+    """Pins a client's reads to the primary for a while after it writes.
+
+    Successful non-GET responses set a cookie holding the time the pin runs
+    out, so the client reads its own writes whichever worker it talks to.
+    """
+
+    def __init__(self, app, sticky_seconds: float) -> None:
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.sticky_seconds
+                cookie = (
+                    f"{STICKY_COOKIE}={until:.3f}; "
+                    f"Max-Age={math.ceil(self.sticky_seconds)}; Path=/; "
+                    "HttpOnly; SameSite=Lax"
+                )
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"set-cookie", cookie.encode()),
+                    ],
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+def get_read_database(request: Request) -> Database:
+    try:
+        primary_until = float(request.cookies[STICKY_COOKIE])
+    except (KeyError, ValueError):
+        primary_until = None
+    return replica_router.choose(primary_until)
+
+
+replica_router = ReplicaRouter(
+    database,
+    [Database(url, **pool_options(url)) for url in config.READ_REPLICA_URLS],
+    config.REPLICA_MAX_LAG,
+    config.REPLICA_CHECK_INTERVAL,
+)
@@ -0,0 +1,116 @@
+import logging
+from typing import Annotated, Optional
+
+import sqlalchemy
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+
+from socialink.database import database, upload_table
+from socialink.image_cache import image_cache
+from socialink.models.debug import (
+    ImageCacheStats,
+    ProfileSummary,
+    StallReport,
+    UploadStats,
+)
+
+router = APIRouter(prefix="/debug")
+
+logger = logging.getLogger(__name__)
+
+
+def require_debug_token(
+    request: Request, x_debug_token: Annotated[Optional[str], Header()] = None
+):
+    if x_debug_token not in request.app.state.config.DEBUG_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid debug token"
+        )
+
+
+def profile_store(request: Request):
+    if request.app.state.profiles is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled"
+        )
+    return request.app.state.profiles
+
+
+@router.get(
+    "/profiles",
+    response_model=list[ProfileSummary],
+    dependencies=[Depends(require_debug_token)],
+)
+async def get_profiles(request: Request):
+    logger.info("Listing request profiles")
+    return profile_store(request).all()
+
+
+@router.get(
+    "/profiles/{correlation_id}",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_debug_token)],
+)
+async def get_profile(correlation_id: str, request: Request):
+    logger.info(f"Getting profile {correlation_id}")
+    profile = profile_store(request).get(correlation_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+        )
+    return profile.collapsed()
+
+
+@router.get(
+    "/stalls",
+    response_model=StallReport,
+    dependencies=[Depends(require_debug_token)],
+)
+async def get_stalls(request: Request):
+    logger.info("Getting event loop stalls")
+    watchdog = request.app.state.watchdog
+    if watchdog is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Watchdog is disabled"
+        )
+    return {
+        "counts": dict(watchdog.stalls.most_common()),
+        "recent": list(reversed(watchdog.recent)),
+    }
+
+
+@router.get(
+    "/image-cache",
+    response_model=ImageCacheStats,
+    dependencies=[Depends(require_debug_token)],
+)
+async def get_image_cache_stats():
+    logger.info("Getting image cache stats")
+    return {
+        **{name: image_cache.stats[name] for name in ImageCacheStats.model_fields},
+        "saved_calls": image_cache.saved_calls,
+    }
+
+
+def total(column):
+    return sqlalchemy.func.coalesce(sqlalchemy.func.sum(column), 0)
+
+
+@router.get(
+    "/uploads",
+    response_model=UploadStats,
+    dependencies=[Depends(require_debug_token)],
+)
+async def get_upload_stats():
+    logger.info("Getting upload deduplication stats")
+    query = sqlalchemy.select(
+        sqlalchemy.func.count().label("objects"),
+        total(upload_table.c.stored_bytes).label("stored_bytes"),
+        total(upload_table.c.duplicates).label("duplicates"),
+        # Every duplicate would otherwise have stored the original and variants
+        total(upload_table.c.duplicates * upload_table.c.stored_bytes).label(
+            "bytes_saved"
+        ),
+    ).select_from(upload_table)
+    logger.debug(query)
+    return await database.fetch_one(query)
@@ -0,0 +1,125 @@
+import datetime
+import logging
+import uuid
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from socialink import storage
+from socialink.config import config
+from socialink.database import database, direct_upload_table, upsert
+from socialink.libs.b2 import b2_presigned_put_url
+from socialink.libs.images import EXTENSIONS
+from socialink.models.upload import (
+    DirectUploadAuthorization,
+    DirectUploadComplete,
+    DirectUploadIn,
+)
+from socialink.models.user import User
+from socialink.rate_limit import limit_by_ip
+from socialink.security import (
+    create_upload_token,
+    get_current_user,
+    get_upload_token_claims,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def object_mismatch(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+async def find_object(file_name: str):
+    """Returns the size, content type and URL of what was actually stored."""
+    stored = await storage.find(file_name)
+    if stored is None:
+        raise object_mismatch("The file has not been uploaded")
+    return stored.size, stored.content_type, await storage.public_url(file_name)
+
+
+@router.post(
+    "/uploads/direct",
+    status_code=201,
+    response_model=DirectUploadAuthorization,
+    dependencies=[Depends(limit_by_ip("upload"))],
+)
+async def authorize_direct_upload(
+    upload: DirectUploadIn,
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    if upload.size > config.UPLOAD_SESSION_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Uploads are limited to {config.UPLOAD_SESSION_MAX_BYTES} bytes",
+        )
+
+    file_name = f"direct/{uuid.uuid4().hex}/original{EXTENSIONS[upload.content_type]}"
+    token = create_upload_token(file_name, upload.size, upload.content_type)
+    logger.info(
+        f"Authorizing direct upload of {upload.size} bytes to {file_name}",
+        extra={"user_id": current_user.id},
+    )
+    headers = {
+        "Content-Length": str(upload.size),
+        "Content-Type": upload.content_type,
+    }
+
+    if config.STORAGE_BACKEND == "local":
+        storage_token = create_upload_token(
+            file_name, upload.size, upload.content_type, "storage"
+        )
+        upload_url = request.url_for("put_object", file_name=file_name)
+        return {
+            "file_name": file_name,
+            "upload_url": str(upload_url.include_query_params(token=storage_token)),
+            "method": "PUT",
+            "headers": headers,
+            "token": token,
+        }
+
+    if not config.B2_DIRECT_KEY_ID or not config.B2_S3_ENDPOINT:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Direct uploads are disabled",
+        )
+    # The size and content type are signed, B2 rejects a PUT with any others
+    upload_url = b2_presigned_put_url(
+        file_name, headers, config.DIRECT_UPLOAD_URL_EXPIRE_SECONDS
+    )
+    return {
+        "file_name": file_name,
+        "upload_url": upload_url,
+        "method": "PUT",
+        "headers": headers,
+        "token": token,
+    }
+
+
+@router.post("/uploads/direct/complete", status_code=201)
+async def complete_direct_upload(upload: DirectUploadComplete):
+    claims = get_upload_token_claims(upload.token)
+    file_name = claims["sub"]
+
+    size, content_type, file_url = await find_object(file_name)
+    if size > claims["size"] or content_type != claims["content_type"]:
+        logger.warning(f"Direct upload {file_name} does not match its authorization")
+        raise object_mismatch("The file does not match the upload authorization")
+
+    # Completing the same upload twice records it once
+    query = (
+        upsert(database, direct_upload_table)
+        .values(
+            file_name=file_name,
+            content_type=content_type,
+            size=size,
+            file_url=file_url,
+            created_at=datetime.datetime.now(datetime.timezone.utc),
+        )
+        .on_conflict_do_nothing(index_elements=["file_name"])
+    )
+    logger.debug(query)
+    await database.execute(query)
+    return {"detail": f"Successfully uploaded {file_name}", "file_url": file_url}
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from socialink.config import config
+from socialink.events import Subscription, TooManySubscribers, event_broker
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# How long browsers wait before reconnecting when the stream ends
+RETRY = b"retry: 3000\n\n"
+KEEPALIVE = b": keepalive\n\n"
+EVICTED = b"event: evicted\ndata: {}\n\n"
+
+
+async def event_stream(subscription: Subscription):
+    try:
+        yield RETRY
+        while True:
+            try:
+                # Comments keep proxies from closing connections that go quiet
+                async with asyncio.timeout(config.EVENTS_KEEPALIVE):
+                    message = await subscription.get()
+            except TimeoutError:
+                yield KEEPALIVE
+                continue
+            if message is None:
+                if subscription.evicted:
+                    yield EVICTED
+                return
+            yield message
+    finally:
+        event_broker.unsubscribe(subscription)
+
+
+@router.get("/events")
+async def stream_events(post_id: Optional[int] = None):
+    # Server-Sent Events for new posts, comments, likes and generated images,
+    # of one post if `post_id` is given
+    try:
+        subscription = event_broker.subscribe(post_id)
+    except TooManySubscribers:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many event listeners",
+        )
+    return StreamingResponse(
+        event_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,25 @@
+import logging
+
+from fastapi import APIRouter, Request, Response, status
+from socialink.models.health import Readiness
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/ready", response_model=Readiness)
+async def ready(request: Request, response: Response):
+    # For load balancer and orchestrator probes, 503 until warm-up is done
+    warmup = request.app.state.warmup
+    if warmup is None:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"ready": False, "steps": {}, "pending": []}
+
+    if not warmup.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "ready": warmup.ready,
+        "steps": warmup.results,
+        "pending": [name for name in warmup.steps if name not in warmup.results],
+    }
@@ -1,15 +1,39 @@
+import datetime
 import logging
 import sqlalchemy
 from enum import Enum
 
-from typing import Annotated
-
-from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
+from typing import Annotated, Optional
+
+from databases import Database
+from fastapi import APIRouter, Depends, HTTPException, Query
+from socialink.archive import find_archived_comments, find_archived_posts, is_archived
+from socialink.config import config
+from socialink.events import event_broker
+from socialink.generation import generation_pipeline
+from socialink.like_buffer import like_buffer
+from socialink.rate_limit import limit_by_user
+from socialink.replicas import get_read_database
+from socialink.ranking import (
+    add_likes_to_ranking,
+    add_post_ranking,
+    hot_score,
+    select_ranked_posts,
+)
+from socialink.search import index_document
 from socialink.tasks import generate_and_add_to_post
+from socialink.timeline import fan_out_post
 from socialink.models.user import User
 from socialink.security import get_current_user
 
-from socialink.database import comment_table, database, post_table, likes_table
+from socialink.database import (
+    archived_comment_table,
+    comment_table,
+    database,
+    post_table,
+    likes_table,
+    post_ranking_table,
+)
 from socialink.models.post import (
     Comment,
     CommentIn,
@@ -18,6 +42,7 @@ from socialink.models.post import (
     UserPost,
     UserPostIn,
     UserPostsWithComments,
+    UserPostWithCommentPreview,
     UserPostWithLikes,
 )
 
@@ -34,46 +59,72 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+def merge_buffered_likes(post):
+    return {**post, "likes": post["likes"] + like_buffer.pending_likes(post["id"])}
+
+
+def raise_missing_post(archived: bool):
+    if archived:
+        raise HTTPException(status_code=409, detail="Post is archived")
+    raise HTTPException(status_code=404, detail="Post not found")
+
+
 async def find_post(post_id: int):
     logger.info(f"Finding post with id {post_id}")
     query = post_table.select().where(post_table.c.id == post_id)
     return await database.fetch_one(query)
 
 
-@router.post("/post", response_model=UserPost, status_code=201)
+@router.post(
+    "/post",
+    response_model=UserPost,
+    status_code=201,
+    dependencies=[Depends(limit_by_user("post"))],
+)
 async def create_post(
     post: UserPostIn,
     current_user: Annotated[User, Depends(get_current_user)],
-    background_task: BackgroundTasks,
-    request: Request,
     prompt: str = None,
 ):
     logger.info("Creating Post")
-    data = {**post.model_dump(), "user_id": current_user.id}
-    query = post_table.insert().values(data)
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    data = {
+        **post.model_dump(),
+        "user_id": current_user.id,
+        "image_status": "pending" if prompt else None,
+    }
+    query = post_table.insert().values({**data, "created_at": created_at})
     logger.debug(query)
-    last_record_id = await database.execute(query)
+    async with database.transaction():
+        last_record_id = await database.execute(query)
+        await add_post_ranking(database, last_record_id, created_at)
+        await fan_out_post(database, last_record_id, current_user.id)
+        await index_document(
+            database, "post", last_record_id, last_record_id, post.body
+        )
 
     if prompt:
-        background_task.add_task(
-            generate_and_add_to_post,
-            current_user.email,
-            last_record_id,
-            request.url_for("get_comments_with_post", post_id=last_record_id),
-            database,
-            prompt,
+        generation_pipeline.submit(
+            generate_and_add_to_post(last_record_id, database, prompt)
         )
-    return {**data, "id": last_record_id}
+    created = {**data, "id": last_record_id}
+    event_broker.publish("post", last_record_id, created)
+    return created
 
 
 class PostSorting(str, Enum):
     new = "new"
     old = "old"
     most_likes = "most_likes"
+    trending = "trending"
 
 
 @router.get("/post", response_model=list[UserPostWithLikes])
-async def get_all_posts(sorting: PostSorting = PostSorting.new):
+async def get_all_posts(
+    read_database: Annotated[Database, Depends(get_read_database)],
+    sorting: PostSorting = PostSorting.new,
+    limit: Annotated[Optional[int], Query(ge=1, le=1000)] = None,
+):
     logger.info("Getting all posts")
 
     if sorting == PostSorting.old:
@@ -81,14 +132,41 @@ async def get_all_posts(sorting: PostSorting = PostSorting.new):
     elif sorting == PostSorting.new:
         query = select_post_and_likes.order_by(post_table.c.id.asc())
     elif sorting == PostSorting.most_likes:
-        query = select_post_and_likes.order_by(sqlalchemy.desc("likes"))
+        query = select_ranked_posts.order_by(
+            post_ranking_table.c.likes.desc(), post_ranking_table.c.post_id.desc()
+        )
+    elif sorting == PostSorting.trending:
+        query = select_ranked_posts.order_by(
+            post_ranking_table.c.hot.desc(), post_ranking_table.c.post_id.desc()
+        )
+
+    if limit is not None:
+        query = query.limit(limit)
 
     logger.debug(query)
 
-    return await database.fetch_all(query)
+    posts = await read_database.fetch_all(query)
+    if not len(like_buffer):
+        return posts
+
+    posts = [merge_buffered_likes(post) for post in posts]
+    if sorting == PostSorting.most_likes:
+        posts.sort(key=lambda post: (post["likes"], post["id"]), reverse=True)
+    elif sorting == PostSorting.trending:
+        # The score the ranking table would hold once the buffer is flushed
+        posts.sort(
+            key=lambda post: (hot_score(post["likes"], post["created_at"]), post["id"]),
+            reverse=True,
+        )
+    return posts
 
 
-@router.post("/comment", response_model=Comment, status_code=201)
+@router.post(
+    "/comment",
+    response_model=Comment,
+    status_code=201,
+    dependencies=[Depends(limit_by_user("comment"))],
+)
 async def create_comment(
     comment: CommentIn, current_user: Annotated[User, Depends(get_current_user)]
 ):
@@ -96,41 +174,186 @@ async def create_comment(
 
     post = await find_post(comment.post_id)
     if not post:
-        raise HTTPException(status_code=404, detail="Post not Found")
+        raise_missing_post(await is_archived(database, comment.post_id))
     data = {**comment.model_dump(), "user_id": current_user.id}
     query = comment_table.insert().values(data)
     logger.debug(query)
-    last_record_id = await database.execute(query)
-    return {**data, "id": last_record_id}
+    async with database.transaction():
+        last_record_id = await database.execute(query)
+        await index_document(
+            database, "comment", last_record_id, comment.post_id, comment.body
+        )
+    created = {**data, "id": last_record_id}
+    event_broker.publish("comment", comment.post_id, created)
+    return created
 
 
-@router.get("/post/{post_id}/comments", response_model=list[Comment])
-async def get_comments_on_posts(post_id: int):
-    logger.info("Getting comments on a post")
+async def find_comments(database: Database, post_id: int) -> list:
     query = comment_table.select().where(comment_table.c.post_id == post_id)
     logger.debug(query)
     return await database.fetch_all(query)
 
 
+@router.get("/post/{post_id}/comments", response_model=list[Comment])
+async def get_comments_on_posts(
+    post_id: int, read_database: Annotated[Database, Depends(get_read_database)]
+):
+    logger.info("Getting comments on a post")
+    comments = await find_comments(read_database, post_id)
+    if comments:
+        return comments
+
+    # Only a post missing from posts can have been archived
+    query = sqlalchemy.select(post_table.c.id).where(post_table.c.id == post_id)
+    if await read_database.fetch_val(query) is not None:
+        return []
+    return await find_archived_comments(read_database, post_id)
+
+
 @router.get("/post/{post_id}", response_model=UserPostsWithComments)
-async def get_comments_with_post(post_id: int):
+async def get_comments_with_post(
+    post_id: int, read_database: Annotated[Database, Depends(get_read_database)]
+):
     logger.info("Getting all posts with comments")
 
     query = select_post_and_likes.where(post_table.c.id == post_id)
 
     logger.debug(query)
 
-    post = await database.fetch_one(query)
+    post = await read_database.fetch_one(query)
 
     if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+        archived = await find_archived_posts(read_database, [post_id])
+        if not archived:
+            raise HTTPException(status_code=404, detail="Post not found")
+        return {
+            "post": archived[0],
+            "comments": await find_archived_comments(read_database, post_id),
+        }
     return {
-        "post": post,
-        "comments": await get_comments_on_posts(post_id),
+        "post": merge_buffered_likes(post),
+        "comments": await find_comments(read_database, post_id),
     }
 
 
-@router.post("/like", response_model=PostLike, status_code=201)
+def parse_post_ids(ids: str) -> list[int]:
+    try:
+        # dict.fromkeys drops repeats and keeps the order they were asked in
+        post_ids = list(dict.fromkeys(int(id) for id in ids.split(",") if id.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=422, detail="ids must be comma separated post ids"
+        )
+    if len(post_ids) > config.POSTS_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {config.POSTS_BATCH_MAX_IDS} ids can be asked for at once",
+        )
+    return post_ids
+
+
+def select_first_comments(table: sqlalchemy.Table, post_ids: list[int], limit: int):
+    numbered = (
+        sqlalchemy.select(
+            table,
+            sqlalchemy.func.row_number()
+            .over(partition_by=table.c.post_id, order_by=table.c.id)
+            .label("position"),
+            sqlalchemy.func.count()
+            .over(partition_by=table.c.post_id)
+            .label("comment_count"),
+        )
+        .where(table.c.post_id.in_(post_ids))
+        .subquery()
+    )
+    # Every post with comments gets at least one row, which carries the count
+    return (
+        sqlalchemy.select(numbered)
+        .where(numbered.c.position <= max(limit, 1))
+        .order_by(numbered.c.post_id, numbered.c.position)
+    )
+
+
+async def add_first_comments(
+    read_database: Database,
+    table: sqlalchemy.Table,
+    posts: dict,
+    limit: int,
+    comments_by_post: dict,
+    comment_counts: dict,
+) -> None:
+    if not posts:
+        return
+    query = select_first_comments(table, list(posts), limit)
+    logger.debug(query)
+    for comment in await read_database.fetch_all(query):
+        comment_counts[comment["post_id"]] = comment["comment_count"]
+        if comment["position"] <= limit:
+            comments_by_post[comment["post_id"]].append(comment)
+
+
+@router.get("/posts", response_model=list[UserPostWithCommentPreview])
+async def get_posts(
+    read_database: Annotated[Database, Depends(get_read_database)],
+    ids: str,
+    comments: Annotated[int, Query(ge=0)] = 10,
+):
+    # One query for the posts and one for all of their comments, however many
+    # posts are asked for, instead of a request per post to /post/{post_id}.
+    # Ids that aren't hot cost two more, for the archive.
+    logger.info("Getting posts by id")
+    post_ids = parse_post_ids(ids)
+    if comments > config.POSTS_BATCH_MAX_COMMENTS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {config.POSTS_BATCH_MAX_COMMENTS} comments per post",
+        )
+    if not post_ids:
+        return []
+
+    query = select_post_and_likes.where(post_table.c.id.in_(post_ids))
+    logger.debug(query)
+    posts = {post["id"]: post for post in await read_database.fetch_all(query)}
+    missing = [post_id for post_id in post_ids if post_id not in posts]
+    archived = {}
+    if missing:
+        archived = {
+            post["id"]: post
+            for post in await find_archived_posts(read_database, missing)
+        }
+
+    comments_by_post = {post_id: [] for post_id in [*posts, *archived]}
+    comment_counts = dict.fromkeys(comments_by_post, 0)
+    await add_first_comments(
+        read_database, comment_table, posts, comments, comments_by_post, comment_counts
+    )
+    await add_first_comments(
+        read_database,
+        archived_comment_table,
+        archived,
+        comments,
+        comments_by_post,
+        comment_counts,
+    )
+
+    posts.update(archived)
+    return [
+        {
+            "post": merge_buffered_likes(posts[post_id]),
+            "comments": comments_by_post[post_id],
+            "comment_count": comment_counts[post_id],
+        }
+        for post_id in post_ids
+        if post_id in posts
+    ]
+
+
+@router.post(
+    "/like",
+    response_model=PostLike,
+    status_code=201,
+    dependencies=[Depends(limit_by_user("like"))],
+)
 async def like_post(
     like: PostLikeIn, current_user: Annotated[User, Depends(get_current_user)]
 ):
@@ -138,12 +361,22 @@ async def like_post(
 
     post = await find_post(like.post_id)
     if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+        raise_missing_post(await is_archived(database, like.post_id))
 
     data = {**like.model_dump(), "user_id": current_user.id}
+
+    if config.LIKE_BUFFER_ENABLED:
+        if await like_buffer.add(database, like.post_id, current_user.id):
+            event_broker.publish("like", like.post_id, data)
+        return data
+
     query = likes_table.insert().values(data)
 
     logger.debug(query)
 
-    last_record_id = await database.execute(query)
-    return {**data, "id": last_record_id}
+    async with database.transaction():
+        last_record_id = await database.execute(query)
+        await add_likes_to_ranking(database, like.post_id)
+    created = {**data, "id": last_record_id}
+    event_broker.publish("like", like.post_id, created)
+    return created
@@ -0,0 +1,22 @@
+import logging
+from typing import Annotated
+
+from fastapi import APIRouter, Query
+
+from socialink.database import database
+from socialink.models.post import SearchResult
+from socialink.search import search
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+
+@router.get("/search", response_model=list[SearchResult])
+async def search_posts_and_comments(
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    offset: Annotated[int, Query(ge=0)] = 0,
+):
+    logger.info("Searching posts and comments")
+    return await search(database, q, limit, offset)
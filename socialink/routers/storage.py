@@ -0,0 +1,47 @@
+import logging
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import FileResponse
+from socialink.libs.local_storage import (
+    ObjectTooLarge,
+    local_storage_path,
+    local_storage_write,
+)
+from socialink.security import get_upload_token_claims
+
+logger = logging.getLogger(__name__)
+
+# Stands in for B2 when STORAGE_BACKEND is "local", uploads need a signed token
+router = APIRouter(prefix="/storage")
+
+
+@router.put("/{file_name:path}", status_code=201)
+async def put_object(file_name: str, token: str, request: Request):
+    claims = get_upload_token_claims(token, "storage")
+    if claims["sub"] != file_name:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="The token is for another file",
+        )
+
+    try:
+        size = await local_storage_write(file_name, request.stream(), claims["size"])
+    except ObjectTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"The upload was authorized for {claims['size']} bytes",
+        )
+    return {"file_name": file_name, "size": size}
+
+
+@router.get("/{file_name:path}")
+async def get_object(file_name: str):
+    try:
+        path = local_storage_path(file_name)
+    except ValueError:
+        path = None
+    if path is None or not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="File not found"
+        )
+    return FileResponse(path)
@@ -0,0 +1,24 @@
+import logging
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from socialink.database import database
+from socialink.models.post import UserPostWithLikes
+from socialink.models.user import User
+from socialink.security import get_current_user
+from socialink.timeline import get_timeline
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+
+@router.get("/timeline", response_model=list[UserPostWithLikes])
+async def get_home_timeline(
+    current_user: Annotated[User, Depends(get_current_user)],
+    before: Optional[int] = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    logger.info("Getting home timeline")
+    return await get_timeline(database, current_user.id, before, limit)
@@ -1,33 +1,309 @@
-from fileinput import filename
+import asyncio
+import datetime
+import hashlib
 import logging
+import pathlib
 import tempfile
+from dataclasses import asdict, dataclass
 
 import aiofiles
-from fastapi import APIRouter, HTTPException, UploadFile, status
-from socialink.libs.b2 import b2_upload_file
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, status
+from fastapi.routing import APIRoute
+from socialink import storage
+from socialink.config import config
+from socialink.database import database, upload_table, upsert
+from socialink.libs.images import (
+    EXTENSIONS,
+    FORMATS,
+    SNIFF_BYTES,
+    encode_variants,
+    run_in_image_worker,
+    sniff_image_type,
+    variant_name,
+)
+from socialink.models.upload import UploadSessionIn, UploadSessionState
+from socialink.rate_limit import limit_by_ip
+from socialink.upload_sessions import (
+    ChunkOutOfRange,
+    UploadSession,
+    UploadSessionNotFound,
+    upload_sessions,
+)
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
-
 CHUNK_SIZE = 1024 * 1024
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
 
 
-@router.post("/upload", status_code=201)
-async def upload_file(file: UploadFile):
+def request_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Uploads are limited to {config.UPLOAD_MAX_BYTES} bytes",
+    )
+
+
+class SizeLimitedRequest(Request):
+    async def stream(self):
+        limit = config.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD
+        received = 0
+        async for chunk in super().stream():
+            received += len(chunk)
+            if received > limit:
+                raise request_too_large()
+            yield chunk
+
+
+class UploadRoute(APIRoute):
+    """Rejects oversized bodies while they are read, before the form is parsed.
+
+    FastAPI parses the multipart body before the endpoint or its dependencies
+    run, so without this a huge upload is spooled to disk in full first.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def size_limited_handler(request: Request):
+            limit = config.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD
+            if int(request.headers.get("content-length") or 0) > limit:
+                raise request_too_large()
+            return await handler(SizeLimitedRequest(request.scope, request.receive))
+
+        return size_limited_handler
+
+
+router = APIRouter(route_class=UploadRoute)
+
+
+@dataclass
+class SavedUpload:
+    content_type: str
+    content_hash: str
+    size: int
+
+
+async def save_upload(file: UploadFile, path: str) -> SavedUpload:
+    head = await file.read(SNIFF_BYTES)
+    content_type = sniff_image_type(head)
+    if content_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Only PNG, JPEG, GIF and WebP images can be uploaded",
+        )
+
+    # Hashed as it is written so the file is only read once
+    digest = hashlib.sha256(head)
+    size = len(head)
+    logger.info(f"Saving Uploaded file to {path}")
+    async with aiofiles.open(path, "wb") as f:
+        await f.write(head)
+        while chunck := await file.read(CHUNK_SIZE):
+            size += len(chunck)
+            if size > config.UPLOAD_MAX_BYTES:
+                raise request_too_large()
+            digest.update(chunck)
+            await f.write(chunck)
+    return SavedUpload(content_type, digest.hexdigest(), size)
+
+
+async def find_upload(content_hash: str):
+    query = upload_table.select().where(upload_table.c.content_hash == content_hash)
+    logger.debug(query)
+    return await database.fetch_one(query)
+
+
+async def record_duplicate(content_hash: str) -> None:
+    query = (
+        upload_table.update()
+        .where(upload_table.c.content_hash == content_hash)
+        .values(duplicates=upload_table.c.duplicates + 1)
+    )
+    logger.debug(query)
+    await database.execute(query)
+
+
+async def record_upload(saved: SavedUpload, stored_bytes: int, urls: dict) -> None:
+    # Two identical uploads racing each other write the same objects, the
+    # second row is simply dropped
+    query = (
+        upsert(database, upload_table)
+        .values(
+            content_hash=saved.content_hash,
+            content_type=saved.content_type,
+            size=saved.size,
+            stored_bytes=stored_bytes,
+            file_url=urls["file_url"],
+            variants=urls["variants"],
+            duplicates=0,
+            created_at=datetime.datetime.now(datetime.timezone.utc),
+        )
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+    )
+    logger.debug(query)
+    await database.execute(query)
+
+
+async def store_upload(
+    path: str, saved: SavedUpload, encoded: dict[str, bytes]
+) -> dict:
+    prefix = f"uploads/{saved.content_hash}"
+    extension = EXTENSIONS[saved.content_type]
+    variants = {
+        name: (encoded[name], FORMATS[format][0])
+        for width in config.UPLOAD_VARIANT_WIDTHS
+        for format in config.UPLOAD_VARIANT_FORMATS
+        if (name := variant_name(width, format)) in encoded
+    }
+    original, *variant_urls = await asyncio.gather(
+        storage.put_file(path, f"{prefix}/original{extension}"),
+        *(
+            storage.put_bytes(data, f"{prefix}/{name}", content_type)
+            for name, (data, content_type) in variants.items()
+        ),
+    )
+    return {"file_url": original, "variants": dict(zip(variants, variant_urls))}
+
+
+def inspect_file(path: str) -> SavedUpload:
+    with open(path, "rb") as f:
+        content_type = sniff_image_type(f.read(SNIFF_BYTES))
+        if content_type is None:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Only PNG, JPEG, GIF and WebP images can be uploaded",
+            )
+        f.seek(0)
+        digest = hashlib.file_digest(f, "sha256")
+        return SavedUpload(content_type, digest.hexdigest(), f.tell())
+
+
+async def process_upload(path: str, saved: SavedUpload, file_name: str) -> dict:
+    if existing := await find_upload(saved.content_hash):
+        logger.info(f"{file_name} was already uploaded as {saved.content_hash}")
+        await record_duplicate(saved.content_hash)
+        return {
+            "detail": f"Successfully uploaded {file_name}",
+            "file_url": existing.file_url,
+            "variants": existing.variants,
+        }
+
+    try:
+        # Decoding and encoding images is CPU bound, so it runs in the
+        # worker processes and the event loop keeps serving requests
+        encoded = await run_in_image_worker(
+            encode_variants,
+            path,
+            config.UPLOAD_VARIANT_WIDTHS,
+            config.UPLOAD_VARIANT_FORMATS,
+        )
+    except Exception:
+        logger.exception(f"Could not process uploaded image {file_name}")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="The uploaded image could not be processed",
+        )
+
     try:
-        with tempfile.NamedTemporaryFile() as temp_file:
-            file_name = temp_file.name
-            logger.info(f"Saving Uploaded file to {file_name}")
-            async with aiofiles.open(file_name, "wb") as f:
-                while chunck := await file.read(CHUNK_SIZE):
-                    await f.write(chunck)
-
-            file_url = b2_upload_file(local_file=filename, file_name=file.filename)
+        urls = await store_upload(path, saved, encoded)
     except Exception:
+        logger.exception(f"Failed to store uploaded image {file_name}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="There wan error uploading the file",
+            detail="There was an error uploading the file",
+        )
+
+    stored_bytes = saved.size + sum(len(data) for data in encoded.values())
+    await record_upload(saved, stored_bytes, urls)
+    return {"detail": f"Successfully uploaded {file_name}", **urls}
+
+
+@router.post("/upload", status_code=201, dependencies=[Depends(limit_by_ip("upload"))])
+async def upload_file(file: UploadFile):
+    file_name = pathlib.PurePath(file.filename or "upload").name
+    with tempfile.NamedTemporaryFile() as temp_file:
+        saved = await save_upload(file, temp_file.name)
+        return await process_upload(temp_file.name, saved, file_name)
+
+
+def session_response(session: UploadSession) -> dict:
+    return {
+        **asdict(session),
+        "chunk_size": config.UPLOAD_SESSION_CHUNK_SIZE,
+        "missing": session.missing,
+    }
+
+
+async def get_session(session_id: str) -> UploadSession:
+    try:
+        return await upload_sessions.get(session_id)
+    except UploadSessionNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found"
+        )
+
+
+@router.post(
+    "/uploads",
+    status_code=201,
+    response_model=UploadSessionState,
+    dependencies=[Depends(limit_by_ip("upload"))],
+)
+async def create_upload_session(upload: UploadSessionIn):
+    if upload.size > config.UPLOAD_SESSION_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Uploads are limited to {config.UPLOAD_SESSION_MAX_BYTES} bytes",
         )
+    file_name = pathlib.PurePath(upload.file_name).name or "upload"
+    session = await upload_sessions.create(upload.size, file_name)
+    return session_response(session)
+
+
+@router.get("/uploads/{session_id}", response_model=UploadSessionState)
+async def get_upload_session(session_id: str):
+    return session_response(await get_session(session_id))
 
-    return {"detail": f"Successfully uploaded {file.filename}", "file_url": file_url}
+
+@router.put("/uploads/{session_id}", response_model=UploadSessionState)
+async def upload_chunk(session_id: str, offset: int, request: Request):
+    # The body is written to disk as it arrives, not read into memory first
+    try:
+        session = await upload_sessions.write(session_id, offset, request.stream())
+    except UploadSessionNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found"
+        )
+    except ChunkOutOfRange as err:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail=str(err),
+        )
+    return session_response(session)
+
+
+@router.post("/uploads/{session_id}/complete", status_code=201)
+async def complete_upload_session(session_id: str):
+    session = await get_session(session_id)
+    if not session.complete:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Upload is incomplete", "missing": session.missing},
+        )
+
+    # The chunks were written in place, so the session's file is handed to
+    # storage as it is, without being assembled or copied
+    path = str(upload_sessions.data_path(session_id))
+    try:
+        saved = await asyncio.to_thread(inspect_file, path)
+        response = await process_upload(path, saved, session.file_name)
+    except HTTPException as err:
+        # A file that isn't an image, or can't be processed, never will be.
+        # When storage failed the session is kept so completing can be retried
+        # without sending the chunks again.
+        if err.status_code < 500:
+            await upload_sessions.delete(session_id)
+        raise
+    await upload_sessions.delete(session_id)
+    return response
@@ -1,26 +1,36 @@
 import logging
+from typing import Annotated
 
-from fastapi import APIRouter, HTTPException, status, Request, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Request, BackgroundTasks
 
 from socialink import tasks
 
 from socialink.database import database, users_table
-from socialink.models.user import UserIn
+from socialink.models.user import RefreshTokenIn, User, UserIn
+from socialink.rate_limit import limit_by_ip
 from socialink.security import (
     authenticate_user,
     create_access_token,
+    get_current_user,
     get_password_hash,
     create_confirmation_token,
+    create_refresh_token,
+    delete_expired_refresh_tokens,
     get_user,
     get_subject_for_token_type,
+    revoke_refresh_token,
+    rotate_refresh_token,
 )
+from socialink.timeline import follow_user, unfollow_user
 
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
 
-@router.post("/register", status_code=201)
+@router.post(
+    "/register", status_code=201, dependencies=[Depends(limit_by_ip("register"))]
+)
 async def register(user: UserIn, background_tasks: BackgroundTasks, request: Request):
     if await get_user(user.email):
         raise HTTPException(
@@ -47,17 +57,37 @@ async def register(user: UserIn, background_tasks: BackgroundTasks, request: Req
     }
 
 
-@router.post("/token")
+@router.post("/token", dependencies=[Depends(limit_by_ip("token"))])
 async def login(user: UserIn):
     user = await authenticate_user(user.email, user.password)
     access_token = create_access_token(user.email)
     logger.info(f"Access Token {access_token}")
+    await delete_expired_refresh_tokens(user.id)
     return {
         "access_token": access_token,
+        "refresh_token": await create_refresh_token(user.id),
         "token_type": "bearer",
     }
 
 
+@router.post("/token/refresh", dependencies=[Depends(limit_by_ip("refresh"))])
+async def refresh(token: RefreshTokenIn):
+    # Swaps a refresh token for a new pair, without the password or bcrypt
+    user, refresh_token = await rotate_refresh_token(token.refresh_token)
+    return {
+        "access_token": create_access_token(user.email),
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+    }
+
+
+@router.post("/token/revoke")
+async def revoke(token: RefreshTokenIn):
+    # Logs out every token from the same login, unknown tokens are ignored
+    await revoke_refresh_token(token.refresh_token)
+    return {"detail": "Token revoked"}
+
+
 @router.get("/confirm/{token}")
 async def confirm_email(token: str):
     email = get_subject_for_token_type(token, "confirmation")
@@ -69,3 +99,30 @@ async def confirm_email(token: str):
 
     await database.execute(query)
     return {"detail": "User confirmed"}
+
+
+@router.post("/follow/{user_id}", status_code=201)
+async def follow(
+    user_id: int, current_user: Annotated[User, Depends(get_current_user)]
+):
+    if user_id == current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You cannot follow yourself",
+        )
+
+    query = users_table.select().where(users_table.c.id == user_id)
+    if not await database.fetch_one(query):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    await follow_user(database, current_user.id, user_id)
+    return {"detail": "User followed"}
+
+
+@router.delete("/follow/{user_id}")
+async def unfollow(
+    user_id: int, current_user: Annotated[User, Depends(get_current_user)]
+):
+    if not await unfollow_user(database, current_user.id, user_id):
+        raise HTTPException(status_code=404, detail="Not following this user")
+    return {"detail": "User unfollowed"}
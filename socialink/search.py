@@ -0,0 +1,114 @@
+import logging
+import re
+from typing import Literal
+
+import sqlalchemy
+from databases import Database
+
+from socialink.database import comment_table, post_table, search_table
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+# FTS5's rank column defaults to bm25() and is cheaper to sort on
+SQLITE_SEARCH_QUERY = sqlalchemy.text(
+    "SELECT kind, ref_id AS id, post_id, body, -rank AS score "
+    "FROM search_index WHERE search_index MATCH :terms "
+    "ORDER BY rank LIMIT :limit OFFSET :offset"
+)
+
+POSTGRES_SEARCH_QUERY = sqlalchemy.text(
+    "SELECT kind, ref_id AS id, post_id, body, "
+    "ts_rank(document, plainto_tsquery('english', :terms)) AS score "
+    "FROM search_index WHERE document @@ plainto_tsquery('english', :terms) "
+    "ORDER BY score DESC, ref_id DESC LIMIT :limit OFFSET :offset"
+)
+
+
+def search_terms(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def build_search_query(dialect: str, text: str, limit: int, offset: int):
+    terms = search_terms(text)
+    if dialect == "postgresql":
+        query = POSTGRES_SEARCH_QUERY
+        terms = " ".join(terms)
+    else:
+        # Quote every term so user input can't use FTS5 query syntax
+        query = SQLITE_SEARCH_QUERY
+        terms = " ".join(f'"{term}"' for term in terms)
+    return query.bindparams(terms=terms, limit=limit, offset=offset)
+
+
+async def index_document(
+    database: Database,
+    kind: Literal["post", "comment"],
+    ref_id: int,
+    post_id: int,
+    body: str,
+) -> None:
+    query = search_table.insert().values(
+        kind=kind, ref_id=ref_id, post_id=post_id, body=body
+    )
+    logger.debug(query)
+    await database.execute(query)
+
+
+async def search(database: Database, text: str, limit: int, offset: int) -> list:
+    if not search_terms(text):
+        return []
+
+    query = build_search_query(database.url.dialect, text, limit, offset)
+    logger.debug(query)
+    return await database.fetch_all(query)
+
+
+async def backfill_search_index(
+    database: Database, batch_size: int = BACKFILL_BATCH_SIZE
+) -> int:
+    """Index posts and comments stored before search was added."""
+    sources = {
+        "post": (post_table, post_table.c.id),
+        "comment": (comment_table, comment_table.c.post_id),
+    }
+    indexed = 0
+    for kind, (table, post_id) in sources.items():
+        # Rows are indexed in the transaction that creates them, so a row up to
+        # the current last id that isn't in the index read next never will be
+        last_id = await database.fetch_val(
+            sqlalchemy.select(sqlalchemy.func.max(table.c.id))
+        )
+        query = sqlalchemy.select(search_table.c.ref_id).where(
+            search_table.c.kind == kind
+        )
+        # The FTS5 table can't look up ref_id, so it is read once instead
+        done = {row.ref_id async for row in database.iterate(query)}
+
+        after = 0
+        while last_id is not None and after < last_id:
+            query = (
+                sqlalchemy.select(table.c.id, post_id.label("post_id"), table.c.body)
+                .where(table.c.id > after, table.c.id <= last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            )
+            rows = await database.fetch_all(query)
+            if not rows:
+                break
+            after = rows[-1].id
+            missing = [
+                {
+                    "kind": kind,
+                    "ref_id": row.id,
+                    "post_id": row.post_id,
+                    "body": row.body,
+                }
+                for row in rows
+                if row.id not in done
+            ]
+            if missing:
+                await database.execute(search_table.insert().values(missing))
+                indexed += len(missing)
+    return indexed
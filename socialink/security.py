@@ -1,15 +1,20 @@
 import datetime
+import hashlib
+import hmac
 import logging
+import secrets
 
-from typing import Annotated, Literal
+from typing import Annotated, Literal, Optional
 
 
+import sqlalchemy
 from fastapi import Depends, HTTPException, status
 from jose import jwt, JWTError, ExpiredSignatureError
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 
-from socialink.database import database, users_table
+from socialink.config import config
+from socialink.database import database, refresh_token_table, users_table
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +62,48 @@ def create_confirmation_token(email: str):
     return encoded_jwt
 
 
+def create_upload_token(
+    file_name: str,
+    size: int,
+    content_type: str,
+    type: Literal["upload", "storage"] = "upload",
+):
+    logger.debug(f"Creating {type} token", extra={"file_name": file_name})
+    # "storage" tokens sign the local storage upload URL, "upload" ones let the
+    # client complete the upload once the file is stored
+    if type == "storage":
+        expires_in = datetime.timedelta(seconds=config.DIRECT_UPLOAD_URL_EXPIRE_SECONDS)
+    else:
+        expires_in = datetime.timedelta(minutes=config.DIRECT_UPLOAD_EXPIRE_MINUTES)
+    expire = datetime.datetime.now(datetime.timezone.utc) + expires_in
+
+    jwt_data = {
+        "sub": file_name,
+        "exp": expire,
+        "type": type,
+        "size": size,
+        "content_type": content_type,
+    }
+    return jwt.encode(jwt_data, key=SECRET_KEY, algorithm=ALGORITHM)
+
+
+def get_upload_token_claims(
+    token: str, type: Literal["upload", "storage"] = "upload"
+) -> dict:
+    try:
+        payload = jwt.decode(token, key=SECRET_KEY, algorithms=[ALGORITHM])
+    except ExpiredSignatureError:
+        raise create_credentials_exception("Token has expired")
+    except JWTError:
+        raise create_credentials_exception("Invalid token")
+
+    if payload.get("type") != type:
+        raise create_credentials_exception(
+            f"Token has incorrect type, expected '{type}'"
+        )
+    return payload
+
+
 def get_subject_for_token_type(
     token: str, type: Literal["access", "confirmation"]
 ) -> str:
@@ -111,6 +158,99 @@ async def authenticate_user(email: str, password: str):
     return user
 
 
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens are random, unlike passwords, so an HMAC is as safe to
+    # store as a bcrypt hash and costs microseconds to check
+    return hmac.new(SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
+async def create_refresh_token(user_id: int, family_id: Optional[str] = None) -> str:
+    logger.debug("Creating refresh token", extra={"user_id": user_id})
+    token = secrets.token_urlsafe(32)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    query = refresh_token_table.insert().values(
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        user_id=user_id,
+        created_at=now,
+        expires_at=now + datetime.timedelta(days=config.REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    await database.execute(query)
+    return token
+
+
+async def delete_expired_refresh_tokens(user_id: int) -> None:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    query = refresh_token_table.delete().where(
+        refresh_token_table.c.user_id == user_id,
+        refresh_token_table.c.expires_at < now,
+    )
+    await database.execute(query)
+
+
+async def revoke_refresh_token_family(family_id: str) -> None:
+    query = (
+        refresh_token_table.update()
+        .where(
+            refresh_token_table.c.family_id == family_id,
+            refresh_token_table.c.revoked_at.is_(None),
+        )
+        .values(revoked_at=datetime.datetime.now(datetime.timezone.utc))
+    )
+    await database.execute(query)
+
+
+async def revoke_refresh_token(token: str) -> None:
+    query = sqlalchemy.select(refresh_token_table.c.family_id).where(
+        refresh_token_table.c.token_hash == hash_refresh_token(token)
+    )
+    family_id = await database.fetch_val(query)
+    if family_id is not None:
+        await revoke_refresh_token_family(family_id)
+
+
+async def rotate_refresh_token(token: str):
+    """Exchanges a refresh token for its user and a new refresh token.
+
+    Each token can be used once. Claiming it is a single conditional UPDATE,
+    so two requests racing with the same token can't both succeed. A token
+    that was already used means it leaked or was replayed, so every token
+    from the same login is revoked.
+    """
+    token_hash = hash_refresh_token(token)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    query = (
+        refresh_token_table.update()
+        .where(
+            refresh_token_table.c.token_hash == token_hash,
+            refresh_token_table.c.used_at.is_(None),
+            refresh_token_table.c.revoked_at.is_(None),
+            refresh_token_table.c.expires_at > now,
+        )
+        .values(used_at=now)
+        .returning(refresh_token_table.c.user_id, refresh_token_table.c.family_id)
+    )
+    claimed = await database.fetch_one(query)
+    if claimed is None:
+        query = refresh_token_table.select().where(
+            refresh_token_table.c.token_hash == token_hash
+        )
+        stored = await database.fetch_one(query)
+        if stored and stored.used_at is not None and stored.revoked_at is None:
+            logger.warning(
+                "Refresh token reused, revoking its family",
+                extra={"user_id": stored.user_id},
+            )
+            await revoke_refresh_token_family(stored.family_id)
+        raise create_credentials_exception("Invalid refresh token")
+
+    query = users_table.select().where(users_table.c.id == claimed.user_id)
+    user = await database.fetch_one(query)
+    if user is None:
+        raise create_credentials_exception("Could not find user for this token")
+    return user, await create_refresh_token(user.id, claimed.family_id)
+
+
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     email = get_subject_for_token_type(token, "access")
     user = await get_user(email)
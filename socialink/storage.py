@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from socialink.config import config
+from socialink.libs.b2 import (
+    b2_delete_file,
+    b2_file_info_by_name,
+    b2_file_url,
+    b2_list_files,
+    b2_upload_bytes,
+    b2_upload_file,
+)
+from socialink.libs.local_storage import (
+    local_storage_delete,
+    local_storage_info,
+    local_storage_list,
+    local_storage_put,
+)
+
+logger = logging.getLogger(__name__)
+
+# Where files are stored is picked by STORAGE_BACKEND: B2, or LOCAL_STORAGE_DIR
+# served from /storage. The B2 SDK and the file system are blocking, so every
+# call runs in a thread.
+
+
+@dataclass
+class StoredObject:
+    size: int
+    content_type: Optional[str]
+
+
+async def public_url(file_name: str) -> str:
+    if config.STORAGE_BACKEND == "local":
+        return f"{config.LOCAL_STORAGE_URL.rstrip('/')}/{file_name}"
+    return await asyncio.to_thread(b2_file_url, file_name)
+
+
+async def put_file(local_file: str, file_name: str) -> str:
+    """Stores the file at `local_file` as `file_name` and returns its URL."""
+    if config.STORAGE_BACKEND == "local":
+        await asyncio.to_thread(local_storage_put, file_name, local_file)
+        return await public_url(file_name)
+    return await asyncio.to_thread(
+        b2_upload_file, local_file=local_file, file_name=file_name
+    )
+
+
+async def put_bytes(data: bytes, file_name: str, content_type: str) -> str:
+    """Stores `data` as `file_name` and returns its URL."""
+    if config.STORAGE_BACKEND == "local":
+        await asyncio.to_thread(local_storage_put, file_name, data)
+        return await public_url(file_name)
+    return await asyncio.to_thread(b2_upload_bytes, data, file_name, content_type)
+
+
+async def find(file_name: str) -> Optional[StoredObject]:
+    """Returns the size and content type of `file_name`, None if not stored.
+
+    Local storage doesn't keep content types, so they are sniffed from the
+    file and are None for anything but an image.
+    """
+    if config.STORAGE_BACKEND == "local":
+        info = await asyncio.to_thread(local_storage_info, file_name)
+        return StoredObject(*info) if info else None
+    try:
+        info = await asyncio.to_thread(b2_file_info_by_name, file_name)
+    except Exception:
+        logger.exception(f"Could not find B2 file {file_name}")
+        return None
+    return StoredObject(info.size, info.content_type)
+
+
+async def list_objects(prefix: str) -> list[tuple[str, float]]:
+    """Returns the name and upload time, in seconds, of files under `prefix`."""
+    if config.STORAGE_BACKEND == "local":
+        return await asyncio.to_thread(local_storage_list, prefix)
+    return await asyncio.to_thread(b2_list_files, prefix)
+
+
+async def delete(file_name: str) -> None:
+    if config.STORAGE_BACKEND == "local":
+        await asyncio.to_thread(local_storage_delete, file_name)
+    else:
+        await asyncio.to_thread(b2_delete_file, file_name)
@@ -1,14 +1,27 @@
+import asyncio
+import hashlib
 from json import JSONDecodeError
 import logging
 
-from h11 import Data
 import httpx
 from databases import Database
+from socialink import storage
 from socialink.config import config
 from socialink.database import post_table
+from socialink.events import event_broker
+from socialink.generation import GenerationError, generation_pipeline
+from socialink.image_cache import Uncached, image_cache
+from socialink.libs.images import (
+    EXTENSIONS,
+    encode_variants,
+    run_in_image_worker,
+    variant_name,
+)
 
 logger = logging.getLogger(__name__)
 
+GENERATED_VARIANTS = {"thumbnail": 320, "medium": 1024}
+
 
 class APIResponseError(Exception):
     pass
@@ -78,43 +91,96 @@ async def _generate_cute_creature_api(prompt: str):
             raise APIResponseError("API response parsing failed") from err
 
 
-async def generate_and_add_to_post(
-    email: str,
-    post_id: int,
-    post_url: str,
-    database: Database,
-    prompt: str = "A blue british shorthair cat is sitting on a couch",
-):
+async def _download_image(url: str) -> tuple[bytes, str]:
+    # Streamed so an oversized image is cut off at the limit, not read in full
+    data = bytearray()
+    async with httpx.AsyncClient() as client:
+        async with client.stream(
+            "GET", url, timeout=30, follow_redirects=True
+        ) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                data += chunk
+                if len(data) > config.GENERATED_IMAGE_MAX_BYTES:
+                    raise APIResponseError("Generated image is too large")
+    content_type = response.headers.get("content-type", "").split(";")[0]
+    return bytes(data), content_type
+
+
+async def mirror_image(url: str) -> dict:
+    data, content_type = await _download_image(url)
+    # Named after the content so the same image is only ever stored once
+    name = f"generated/{hashlib.sha256(data).hexdigest()}"
+    encoded = await run_in_image_worker(
+        encode_variants, data, list(GENERATED_VARIANTS.values()), ["JPEG"]
+    )
+    variants = {
+        label: encoded[variant_name(width, "JPEG")]
+        for label, width in GENERATED_VARIANTS.items()
+    }
+
+    original, *variant_urls = await asyncio.gather(
+        storage.put_bytes(
+            data,
+            f"{name}{EXTENSIONS.get(content_type, '')}",
+            content_type or "application/octet-stream",
+        ),
+        *(
+            storage.put_bytes(variant, f"{name}-{variant_name}.jpg", "image/jpeg")
+            for variant_name, variant in variants.items()
+        ),
+    )
+    logger.debug(f"Mirrored {url} to {original}")
+    return {
+        "output_url": original,
+        **{f"{variant}_url": url for variant, url in zip(variants, variant_urls)},
+    }
+
+
+async def _generate_and_mirror(prompt: str) -> dict:
+    response = await generation_pipeline.run(_generate_cute_creature_api, prompt)
+    if not config.MIRROR_GENERATED_IMAGES:
+        return response
     try:
-        response = await _generate_cute_creature_api(prompt)
-    except APIResponseError:
-        return await send_simple_email(
-            email,
-            "Error generating image",
-            (
-                f"Hi {email}! Unfortunately there wan an error generating an image for your post"
-            ),
-        )
-    logger.debug("connecting to database to update post")
+        return await mirror_image(response["output_url"])
+    except Exception:
+        logger.exception("Failed to mirror generated image, linking to the original")
+        # Not cached, the next post with this prompt tries to mirror it again
+        return Uncached(response)
 
-    query = (
-        post_table.update()
-        .where(post_table.c.id == post_id)
-        .values(image_url=response["output_url"])
-    )
 
+async def set_image(database: Database, post_id: int, **values) -> None:
+    query = post_table.update().where(post_table.c.id == post_id).values(**values)
     logger.debug(query)
-
     await database.execute(query)
+    event_broker.publish("post_image", post_id, {"post_id": post_id, **values})
 
-    logger.debug("Database connection in background task closed")
 
-    await send_simple_email(
-        email,
-        "Image generation completed",
-        (
-            f"Hi {email}! , your image has been generated and added to your post succesfully",
-            f"Please click on the following link to view it {post_url}",
-        ),
+async def generate_and_add_to_post(
+    post_id: int,
+    database: Database,
+    prompt: str = "A blue british shorthair cat is sitting on a couch",
+):
+    # Clients poll the post's image_status instead of being emailed the outcome
+    try:
+        response = await image_cache.get_or_generate(
+            database, prompt, _generate_and_mirror
+        )
+    except (APIResponseError, GenerationError):
+        logger.exception(f"Failed to generate an image for post {post_id}")
+        await set_image(database, post_id, image_status="failed")
+        return None
+    except asyncio.CancelledError:
+        await set_image(database, post_id, image_status="failed")
+        raise
+
+    await set_image(
+        database,
+        post_id,
+        image_url=response["output_url"],
+        thumbnail_url=response.get("thumbnail_url"),
+        medium_url=response.get("medium_url"),
+        image_status="ready",
     )
+    logger.info(f"Added generated image to post {post_id}")
     return response
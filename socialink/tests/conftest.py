@@ -1,18 +1,19 @@
 import os
 from unittest.mock import AsyncMock, Mock
 from typing import AsyncGenerator, Generator
-from socialink.tests.helpers import create_comment, create_post, like_post
 
+os.environ["ENV_STATE"] = "test"
 
-import pytest
-from fastapi.testclient import TestClient
-from httpx import AsyncClient, Request, Response
+from socialink.tests.helpers import create_comment, create_post, like_post  # noqa: E402
 
-import socialink.tasks
 
-os.environ["ENV_STATE"] = "test"
-import socialink
-from socialink.database import database, users_table  # noqa E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from httpx import AsyncClient, Request, Response  # noqa: E402
+
+import socialink.tasks  # noqa: E402
+import socialink  # noqa: E402
+from socialink.database import create_tables, database, users_table  # noqa: E402
 from socialink.main import app  # noqa: E402
 
 
@@ -21,6 +22,11 @@ def anyio_backend():
     return "asyncio"
 
 
+@pytest.fixture(scope="session", autouse=True)
+def tables() -> None:
+    create_tables()
+
+
 @pytest.fixture
 def client() -> Generator:
     yield TestClient(app)
@@ -1,4 +1,7 @@
+import io
+
 from httpx import AsyncClient
+from PIL import Image
 
 
 async def create_post(
@@ -33,3 +36,9 @@ async def like_post(
     )
 
     return response.json()
+
+
+def png_bytes(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 120, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
@@ -0,0 +1,185 @@
+import asyncio
+import datetime
+import time
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from socialink.config import config
+from socialink.database import upload_table
+from socialink.main import create_app
+
+
+@pytest.fixture()
+def profiled_app(mocker) -> FastAPI:
+    mocker.patch.multiple(config, PROFILING_ENABLED=True, DEBUG_TOKENS=["secret"])
+    return create_app()
+
+
+@pytest.fixture()
+async def profiled_client(profiled_app: FastAPI):
+    async with AsyncClient(app=profiled_app, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.anyio
+async def test_request_with_token_is_profiled(profiled_client: AsyncClient):
+    response = await profiled_client.get("/post", headers={"X-Debug-Token": "secret"})
+    profile_id = response.headers["X-Profile-Id"]
+
+    response = await profiled_client.get(
+        f"/debug/profiles/{profile_id}", headers={"X-Debug-Token": "secret"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+
+@pytest.mark.anyio
+async def test_list_profiles(profiled_client: AsyncClient):
+    await profiled_client.get("/post", headers={"X-Debug-Token": "secret"})
+
+    response = await profiled_client.get(
+        "/debug/profiles", headers={"X-Debug-Token": "secret"}
+    )
+
+    assert response.status_code == 200
+    assert [profile["path"] for profile in response.json()] == ["/post"]
+
+
+@pytest.mark.anyio
+async def test_request_without_token_is_not_profiled(profiled_client: AsyncClient):
+    response = await profiled_client.get("/post")
+
+    assert "X-Profile-Id" not in response.headers
+
+
+@pytest.mark.anyio
+async def test_request_with_unknown_token_is_not_profiled(
+    profiled_client: AsyncClient,
+):
+    response = await profiled_client.get("/post", headers={"X-Debug-Token": "wrong"})
+
+    assert "X-Profile-Id" not in response.headers
+
+
+@pytest.mark.anyio
+async def test_sample_rate_profiles_without_token(mocker):
+    mocker.patch.multiple(config, PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0)
+    app = create_app()
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/post")
+
+    assert "X-Profile-Id" in response.headers
+
+
+@pytest.mark.anyio
+async def test_profiles_require_token(profiled_client: AsyncClient):
+    response = await profiled_client.get(
+        "/debug/profiles", headers={"X-Debug-Token": "wrong"}
+    )
+
+    assert response.status_code == 403
+
+
+@pytest.mark.anyio
+async def test_get_missing_profile(profiled_client: AsyncClient):
+    response = await profiled_client.get(
+        "/debug/profiles/missing", headers={"X-Debug-Token": "secret"}
+    )
+
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_debug_routes_missing_when_disabled(async_client: AsyncClient):
+    response = await async_client.get(
+        "/debug/profiles", headers={"X-Debug-Token": "secret"}
+    )
+
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_stalls_are_reported_per_route(mocker):
+    mocker.patch.multiple(
+        config, WATCHDOG_ENABLED=True, WATCHDOG_THRESHOLD=0.05, DEBUG_TOKENS=["secret"]
+    )
+    app = create_app()
+
+    async def blocking_search(*args):
+        time.sleep(0.2)
+        return []
+
+    mocker.patch("socialink.routers.search.search", blocking_search)
+
+    app.state.watchdog.start()
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            search = await client.get("/search", params={"q": "cats"})
+            await asyncio.sleep(0.05)
+            response = await client.get(
+                "/debug/stalls", headers={"X-Debug-Token": "secret"}
+            )
+    finally:
+        await app.state.watchdog.stop()
+
+    assert response.status_code == 200
+    assert response.json()["counts"] == {"GET /search": 1}
+    stall = response.json()["recent"][0]
+    assert "blocking_search" in stall["stack"]
+    assert stall["correlation_id"] == search.headers["X-Request-ID"]
+
+
+@pytest.mark.anyio
+async def test_stalls_missing_when_watchdog_disabled(profiled_client: AsyncClient):
+    response = await profiled_client.get(
+        "/debug/stalls", headers={"X-Debug-Token": "secret"}
+    )
+
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_image_cache_stats(profiled_client: AsyncClient):
+    response = await profiled_client.get(
+        "/debug/image-cache", headers={"X-Debug-Token": "secret"}
+    )
+
+    assert response.status_code == 200
+    assert set(response.json()) == {
+        "hits",
+        "misses",
+        "coalesced",
+        "errors",
+        "saved_calls",
+    }
+
+
+@pytest.mark.anyio
+async def test_upload_stats(profiled_client: AsyncClient, db):
+    await db.execute(
+        upload_table.insert().values(
+            content_hash="a" * 64,
+            content_type="image/png",
+            size=100,
+            stored_bytes=250,
+            file_url="https://fakeurl.com",
+            variants={},
+            duplicates=3,
+            created_at=datetime.datetime.now(datetime.timezone.utc),
+        )
+    )
+
+    response = await profiled_client.get(
+        "/debug/uploads", headers={"X-Debug-Token": "secret"}
+    )
+
+    assert response.json() == {
+        "objects": 1,
+        "stored_bytes": 250,
+        "duplicates": 3,
+        "bytes_saved": 750,
+    }
@@ -0,0 +1,256 @@
+import pathlib
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from httpx import AsyncClient
+
+from socialink.config import config
+from socialink.database import direct_upload_table
+from socialink.tests.helpers import png_bytes
+
+IMAGE = png_bytes(64, 64)
+
+
+@pytest.fixture(autouse=True)
+def storage_dir(mocker, tmp_path: pathlib.Path) -> pathlib.Path:
+    mocker.patch.object(config, "LOCAL_STORAGE_DIR", str(tmp_path))
+    return tmp_path
+
+
+async def authorize(
+    async_client: AsyncClient, token: str, size: int = len(IMAGE)
+) -> dict:
+    response = await async_client.post(
+        "/uploads/direct",
+        json={"content_type": "image/png", "size": size},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+async def send_to_storage(
+    async_client: AsyncClient, authorization: dict, data: bytes = IMAGE
+):
+    return await async_client.request(
+        authorization["method"],
+        authorization["upload_url"],
+        content=data,
+        # Local storage doesn't hold clients to the signed length, B2 does
+        headers={**authorization["headers"], "Content-Length": str(len(data))},
+    )
+
+
+@pytest.mark.anyio
+async def test_direct_upload_to_local_storage(
+    async_client: AsyncClient, logged_in_token: str, db
+):
+    authorization = await authorize(async_client, logged_in_token)
+
+    stored = await send_to_storage(async_client, authorization)
+    response = await async_client.post(
+        "/uploads/direct/complete", json={"token": authorization["token"]}
+    )
+
+    assert stored.status_code == 201
+    assert response.status_code == 201
+    download = await async_client.get(response.json()["file_url"])
+    assert download.content == IMAGE
+    upload = await db.fetch_one(direct_upload_table.select())
+    assert upload.file_name == authorization["file_name"]
+    assert upload.size == len(IMAGE)
+
+
+@pytest.mark.anyio
+async def test_complete_direct_upload_twice_records_once(
+    async_client: AsyncClient, logged_in_token: str, db
+):
+    authorization = await authorize(async_client, logged_in_token)
+    await send_to_storage(async_client, authorization)
+
+    for _ in range(2):
+        response = await async_client.post(
+            "/uploads/direct/complete", json={"token": authorization["token"]}
+        )
+        assert response.status_code == 201
+
+    assert len(await db.fetch_all(direct_upload_table.select())) == 1
+
+
+@pytest.mark.anyio
+async def test_complete_direct_upload_before_uploading(
+    async_client: AsyncClient, logged_in_token: str
+):
+    authorization = await authorize(async_client, logged_in_token)
+
+    response = await async_client.post(
+        "/uploads/direct/complete", json={"token": authorization["token"]}
+    )
+
+    assert response.status_code == 409
+
+
+@pytest.mark.anyio
+async def test_complete_direct_upload_that_is_not_an_image(
+    async_client: AsyncClient, logged_in_token: str
+):
+    authorization = await authorize(async_client, logged_in_token)
+    await send_to_storage(async_client, authorization, b"<html></html>")
+
+    response = await async_client.post(
+        "/uploads/direct/complete", json={"token": authorization["token"]}
+    )
+
+    assert response.status_code == 409
+
+
+@pytest.mark.anyio
+async def test_local_storage_rejects_more_than_authorized(
+    async_client: AsyncClient, logged_in_token: str, storage_dir
+):
+    authorization = await authorize(async_client, logged_in_token, size=10)
+
+    response = await send_to_storage(async_client, authorization)
+
+    assert response.status_code == 413
+    assert not any(path.is_file() for path in storage_dir.rglob("*"))
+
+
+@pytest.mark.anyio
+async def test_local_storage_rejects_token_for_another_file(
+    async_client: AsyncClient, logged_in_token: str
+):
+    authorization = await authorize(async_client, logged_in_token)
+    other = await authorize(async_client, logged_in_token)
+
+    storage_token = parse_qs(urlsplit(authorization["upload_url"]).query)["token"]
+
+    response = await async_client.put(
+        f"/storage/{other['file_name']}",
+        params={"token": storage_token[0]},
+        content=IMAGE,
+    )
+
+    assert response.status_code == 403
+
+
+@pytest.mark.anyio
+async def test_local_storage_rejects_invalid_token(async_client: AsyncClient):
+    response = await async_client.put(
+        "/storage/direct/abc/original.png", params={"token": "nope"}, content=IMAGE
+    )
+
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_local_storage_rejects_completion_token(
+    async_client: AsyncClient, logged_in_token: str
+):
+    authorization = await authorize(async_client, logged_in_token)
+
+    response = await async_client.put(
+        f"/storage/{authorization['file_name']}",
+        params={"token": authorization["token"]},
+        content=IMAGE,
+    )
+
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_local_storage_rejects_expired_upload_url(
+    async_client: AsyncClient, logged_in_token: str, mocker
+):
+    mocker.patch.object(config, "DIRECT_UPLOAD_URL_EXPIRE_SECONDS", -1)
+    authorization = await authorize(async_client, logged_in_token)
+
+    response = await send_to_storage(async_client, authorization)
+
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_authorize_direct_upload_requires_login(async_client: AsyncClient):
+    response = await async_client.post(
+        "/uploads/direct", json={"content_type": "image/png", "size": 10}
+    )
+
+    assert response.status_code == 401
+
+
+@pytest.fixture()
+def b2_storage(mocker):
+    mocker.patch.multiple(
+        config,
+        STORAGE_BACKEND="b2",
+        B2_BUCKET_NAME="bucket",
+        B2_DIRECT_KEY_ID="direct-key",
+        B2_DIRECT_APPLICATION_KEY="direct-secret",
+        B2_S3_ENDPOINT="https://s3.us-west-004.backblazeb2.com",
+    )
+    mocker.patch(
+        "socialink.storage.b2_file_url",
+        side_effect=lambda name: f"https://cdn.example.com/{name}",
+    )
+    return mocker.patch("socialink.storage.b2_file_info_by_name")
+
+
+@pytest.mark.anyio
+async def test_direct_upload_to_b2(
+    async_client: AsyncClient, logged_in_token: str, b2_storage
+):
+    authorization = await authorize(async_client, logged_in_token)
+    b2_storage.return_value = SimpleNamespace(size=len(IMAGE), content_type="image/png")
+
+    response = await async_client.post(
+        "/uploads/direct/complete", json={"token": authorization["token"]}
+    )
+
+    upload_url = urlsplit(authorization["upload_url"])
+    params = parse_qs(upload_url.query)
+    assert authorization["method"] == "PUT"
+    assert upload_url.netloc == "s3.us-west-004.backblazeb2.com"
+    assert upload_url.path == f"/bucket/{authorization['file_name']}"
+    assert params["X-Amz-Credential"][0].startswith("direct-key/")
+    assert params["X-Amz-SignedHeaders"] == ["content-length;content-type;host"]
+    assert params["X-Amz-Expires"] == [str(config.DIRECT_UPLOAD_URL_EXPIRE_SECONDS)]
+    assert authorization["headers"] == {
+        "Content-Length": str(len(IMAGE)),
+        "Content-Type": "image/png",
+    }
+    assert response.status_code == 201
+    assert response.json()["file_url"] == (
+        f"https://cdn.example.com/{authorization['file_name']}"
+    )
+    b2_storage.assert_called_once_with(authorization["file_name"])
+
+
+@pytest.mark.anyio
+async def test_complete_direct_upload_to_b2_before_uploading(
+    async_client: AsyncClient, logged_in_token: str, b2_storage
+):
+    authorization = await authorize(async_client, logged_in_token)
+    b2_storage.side_effect = FileNotFoundError(authorization["file_name"])
+
+    response = await async_client.post(
+        "/uploads/direct/complete", json={"token": authorization["token"]}
+    )
+
+    assert response.status_code == 409
+
+
+@pytest.mark.anyio
+async def test_direct_upload_to_b2_disabled_without_direct_key(
+    async_client: AsyncClient, logged_in_token: str, b2_storage, mocker
+):
+    mocker.patch.object(config, "B2_DIRECT_KEY_ID", None)
+
+    response = await async_client.post(
+        "/uploads/direct",
+        json={"content_type": "image/png", "size": 10},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+
+    assert response.status_code == 404
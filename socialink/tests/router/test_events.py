@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from socialink.events import EventBroker, event_broker
+from socialink.tests.helpers import create_comment, create_post, like_post
+
+
+@pytest.fixture()
+def broker(mocker) -> EventBroker:
+    broker = EventBroker(max_subscribers=1, buffer_size=10)
+    mocker.patch("socialink.routers.events.event_broker", broker)
+    return broker
+
+
+async def until_subscribed(broker: EventBroker) -> None:
+    while not len(broker):
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.anyio
+async def test_stream_events(async_client: AsyncClient, broker: EventBroker):
+    # The test client only returns once the stream ends, closing the broker ends it
+    request = asyncio.create_task(async_client.get("/events"))
+    await until_subscribed(broker)
+    broker.publish("post", 1, {"id": 1})
+    broker.close()
+
+    response = await request
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == ('retry: 3000\n\nid: 1\nevent: post\ndata: {"id": 1}\n\n')
+
+
+@pytest.mark.anyio
+async def test_stream_sends_keepalives(
+    async_client: AsyncClient, broker: EventBroker, mocker
+):
+    mocker.patch("socialink.routers.events.config.EVENTS_KEEPALIVE", 0.01)
+    request = asyncio.create_task(async_client.get("/events"))
+    await until_subscribed(broker)
+    await asyncio.sleep(0.05)
+    broker.close()
+
+    response = await request
+
+    assert ": keepalive\n\n" in response.text
+
+
+@pytest.mark.anyio
+async def test_evicted_stream_is_told(async_client: AsyncClient, broker: EventBroker):
+    request = asyncio.create_task(async_client.get("/events"))
+    await until_subscribed(broker)
+    for post_id in range(11):
+        broker.publish("post", post_id, {})
+
+    response = await request
+
+    assert response.text.endswith("event: evicted\ndata: {}\n\n")
+    assert len(broker) == 0
+
+
+@pytest.mark.anyio
+async def test_too_many_listeners(async_client: AsyncClient, broker: EventBroker):
+    broker.subscribe()
+
+    response = await async_client.get("/events")
+
+    assert response.status_code == 503
+
+
+@pytest.mark.anyio
+async def test_create_post_publishes_event(
+    async_client: AsyncClient, logged_in_token: str
+):
+    subscription = event_broker.subscribe()
+    try:
+        await create_post("Test body", async_client, logged_in_token)
+    finally:
+        event_broker.unsubscribe(subscription)
+
+    message = await subscription.get()
+
+    assert message.startswith(b"id: ")
+    assert b"event: post\n" in message
+    assert b'"body": "Test body"' in message
+
+
+@pytest.mark.anyio
+async def test_comment_and_like_publish_events(
+    async_client: AsyncClient, created_post: dict, logged_in_token: str
+):
+    subscription = event_broker.subscribe(post_id=created_post["id"])
+    try:
+        await create_comment(
+            "A comment", created_post["id"], async_client, logged_in_token
+        )
+        await like_post(created_post["id"], async_client, logged_in_token)
+    finally:
+        event_broker.unsubscribe(subscription)
+
+    assert b"event: comment\n" in await subscription.get()
+    assert b"event: like\n" in await subscription.get()
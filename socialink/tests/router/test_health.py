@@ -0,0 +1,48 @@
+import pytest
+from httpx import AsyncClient
+
+from socialink.main import app
+from socialink.warmup import Warmup
+
+
+async def succeed():
+    pass
+
+
+async def fail():
+    raise RuntimeError("Database is down")
+
+
+@pytest.mark.anyio
+async def test_not_ready_before_warmup(async_client: AsyncClient):
+    response = await async_client.get("/ready")
+
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+
+
+@pytest.mark.anyio
+async def test_ready_after_warmup(async_client: AsyncClient, mocker):
+    warmup = Warmup({"database": succeed}, required=["database"])
+    mocker.patch.object(app.state, "warmup", warmup)
+    await warmup.run()
+
+    response = await async_client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+    assert response.json()["steps"]["database"]["ok"] is True
+
+
+@pytest.mark.anyio
+async def test_not_ready_when_required_step_failed(async_client: AsyncClient, mocker):
+    warmup = Warmup({"database": fail}, required=["database"])
+    mocker.patch.object(app.state, "warmup", warmup)
+    await warmup.run()
+
+    response = await async_client.get("/ready")
+
+    assert response.status_code == 503
+    assert response.json()["steps"]["database"]["error"] == (
+        "RuntimeError('Database is down')"
+    )
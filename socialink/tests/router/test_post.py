@@ -1,5 +1,8 @@
 import pytest
 from httpx import AsyncClient
+from socialink.config import config
+from socialink.generation import generation_pipeline
+from socialink.rate_limit import MemoryBackend, RateLimiter
 from socialink.security import create_access_token
 
 
@@ -104,6 +107,52 @@ async def test_get_all_posts_sort_by_likes(
     assert expected_order == posts_ids
 
 
+@pytest.mark.anyio
+async def test_get_all_posts_sort_by_likes_with_limit(
+    async_client: AsyncClient,
+    logged_in_token: str,
+):
+    for i in range(3):
+        await create_post(f"Test Post {i}", async_client, logged_in_token)
+
+    await like_post(2, async_client, logged_in_token)
+    await like_post(2, async_client, logged_in_token)
+    await like_post(3, async_client, logged_in_token)
+
+    response = await async_client.get(
+        "/post", params={"sorting": "most_likes", "limit": 2}
+    )
+    assert response.status_code == 200
+
+    data = response.json()
+    assert [post["id"] for post in data] == [2, 3]
+    assert [post["likes"] for post in data] == [2, 1]
+
+
+@pytest.mark.anyio
+async def test_get_all_posts_sort_by_trending(
+    async_client: AsyncClient,
+    logged_in_token: str,
+):
+    await create_post("Test Post 1", async_client, logged_in_token)
+    await create_post("Test Post 2", async_client, logged_in_token)
+
+    await like_post(1, async_client, logged_in_token)
+
+    response = await async_client.get("/post", params={"sorting": "trending"})
+    assert response.status_code == 200
+
+    assert [post["id"] for post in response.json()] == [1, 2]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("limit", [0, -1, 1001])
+async def test_get_all_posts_rejects_invalid_limit(async_client: AsyncClient, limit):
+    response = await async_client.get("/post", params={"limit": limit})
+
+    assert response.status_code == 422
+
+
 @pytest.mark.anyio
 async def test_create_post_with_prompt(
     async_client: AsyncClient, logged_in_token: str, mock_generate_cute_creature_api
@@ -115,16 +164,35 @@ async def test_create_post_with_prompt(
         json={"body": body},
         headers={"Authorization": f"Bearer {logged_in_token}"},
     )
+    await generation_pipeline.join()
 
     assert response.status_code == 201
     assert {
         "id": 1,
         "body": body,
         "image_url": None,
+        "image_status": "pending",
     }.items() <= response.json().items()
     mock_generate_cute_creature_api.assert_called()
 
 
+@pytest.mark.anyio
+async def test_poll_generated_image(
+    async_client: AsyncClient, logged_in_token: str, mock_generate_cute_creature_api
+):
+    response = await async_client.post(
+        "/post?prompt=A cat",
+        json={"body": "Test Body"},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+    await generation_pipeline.join()
+
+    response = await async_client.get(f"/post/{response.json()['id']}")
+
+    assert response.json()["post"]["image_status"] == "ready"
+    assert response.json()["post"]["image_url"] == "https://example.net/image.jpg"
+
+
 @pytest.mark.anyio
 async def test_get_all_posts_wrong_sorting(async_client: AsyncClient):
     response = await async_client.get("/post", params={"sorting": "tinubu"})
@@ -227,3 +295,88 @@ async def test_get_missing_posts_with_comment(
     response = await async_client.get("/post/2")
 
     assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_get_posts_by_ids(
+    async_client: AsyncClient, logged_in_token: str, db, mocker
+):
+    posts = [
+        await create_post(f"Post {i}", async_client, logged_in_token) for i in range(3)
+    ]
+    for i in range(3):
+        await create_comment(
+            f"Comment {i}", posts[0]["id"], async_client, logged_in_token
+        )
+    await like_post(posts[1]["id"], async_client, logged_in_token)
+    fetch_all = mocker.spy(db, "fetch_all")
+
+    ids = [posts[1]["id"], posts[0]["id"], 999, posts[1]["id"]]
+    response = await async_client.get(
+        "/posts", params={"ids": ",".join(map(str, ids)), "comments": 2}
+    )
+
+    assert response.status_code == 200
+    # Posts, the archive for the missing id, then comments
+    assert fetch_all.call_count == 3
+    first, second = response.json()
+    assert (first["post"]["id"], first["post"]["likes"]) == (posts[1]["id"], 1)
+    assert first["comments"] == []
+    assert first["comment_count"] == 0
+    assert second["post"]["id"] == posts[0]["id"]
+    assert [c["body"] for c in second["comments"]] == ["Comment 0", "Comment 1"]
+    assert second["comment_count"] == 3
+
+
+@pytest.mark.anyio
+async def test_get_posts_without_comments(
+    async_client: AsyncClient, created_post: dict, created_comment: dict
+):
+    response = await async_client.get(
+        "/posts", params={"ids": str(created_post["id"]), "comments": 0}
+    )
+
+    assert response.json() == [
+        {
+            "post": {**created_post, "likes": 0},
+            "comments": [],
+            "comment_count": 1,
+        }
+    ]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "params",
+    [{"ids": "1,two"}, {"ids": "1,2,3,4"}, {"ids": "1", "comments": 6}],
+)
+async def test_get_posts_rejects_large_or_bad_requests(
+    async_client: AsyncClient, mocker, params: dict
+):
+    mocker.patch.object(config, "POSTS_BATCH_MAX_IDS", 3)
+    mocker.patch.object(config, "POSTS_BATCH_MAX_COMMENTS", 5)
+
+    response = await async_client.get("/posts", params=params)
+
+    assert response.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_create_post_rate_limited_per_user(
+    async_client: AsyncClient, logged_in_token: str, mocker
+):
+    mocker.patch.object(config, "RATE_LIMIT_ENABLED", True)
+    mocker.patch(
+        "socialink.rate_limit.rate_limiter",
+        RateLimiter(MemoryBackend(), {"post": "1/minute"}, {}),
+    )
+
+    first = await create_post("First post", async_client, logged_in_token)
+    response = await async_client.post(
+        "/post",
+        json={"body": "Second post"},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+
+    assert first["id"]
+    assert response.status_code == 429
@@ -0,0 +1,83 @@
+import pytest
+from httpx import AsyncClient
+
+from socialink.search import build_search_query
+from socialink.tests.helpers import create_comment, create_post
+
+
+async def search(async_client: AsyncClient, q: str, **params):
+    return await async_client.get("/search", params={"q": q, **params})
+
+
+def test_build_search_query_quotes_sqlite_terms():
+    query = build_search_query("sqlite", 'cat" OR dog*', 10, 0)
+
+    assert query.compile().params["terms"] == '"cat" "or" "dog"'
+
+
+def test_build_search_query_postgres():
+    query = build_search_query("postgresql", "Cute CATS", 10, 0)
+
+    assert "plainto_tsquery" in str(query)
+    assert query.compile().params["terms"] == "cute cats"
+
+
+@pytest.mark.anyio
+async def test_search_posts(async_client: AsyncClient, logged_in_token: str):
+    await create_post("A blue cat on a couch", async_client, logged_in_token)
+    await create_post("A dog in the park", async_client, logged_in_token)
+
+    response = await search(async_client, "cat")
+
+    assert response.status_code == 200
+    assert [(r["kind"], r["id"]) for r in response.json()] == [("post", 1)]
+
+
+@pytest.mark.anyio
+async def test_search_comments(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict
+):
+    await create_comment(
+        "What a lovely cat", created_post["id"], async_client, logged_in_token
+    )
+
+    response = await search(async_client, "lovely")
+
+    assert response.status_code == 200
+    assert response.json()[0]["kind"] == "comment"
+    assert response.json()[0]["post_id"] == created_post["id"]
+
+
+@pytest.mark.anyio
+async def test_search_ranks_better_matches_first(
+    async_client: AsyncClient, logged_in_token: str
+):
+    await create_post(
+        "cat and some other words about things", async_client, logged_in_token
+    )
+    await create_post("cat cat cat", async_client, logged_in_token)
+
+    response = await search(async_client, "cat")
+
+    assert [r["id"] for r in response.json()] == [2, 1]
+
+
+@pytest.mark.anyio
+async def test_search_pagination(async_client: AsyncClient, logged_in_token: str):
+    for i in range(3):
+        await create_post(f"cat number {i}", async_client, logged_in_token)
+
+    first_page = (await search(async_client, "cat", limit=2)).json()
+    second_page = (await search(async_client, "cat", limit=2, offset=2)).json()
+
+    assert len(first_page) == 2
+    assert len(second_page) == 1
+    assert {r["id"] for r in first_page + second_page} == {1, 2, 3}
+
+
+@pytest.mark.anyio
+async def test_search_without_terms(async_client: AsyncClient):
+    response = await search(async_client, "***")
+
+    assert response.status_code == 200
+    assert response.json() == []
@@ -0,0 +1,205 @@
+import pytest
+from httpx import AsyncClient
+
+from socialink.database import database, follows_table, timeline_table, users_table
+from socialink.tests.helpers import create_post
+from socialink.timeline import follow_user
+
+
+@pytest.fixture()
+async def other_user_token(async_client: AsyncClient) -> str:
+    user_details = {"email": "other@example.com", "password": "1234"}
+    await async_client.post("/register", json=user_details)
+
+    query = (
+        users_table.update()
+        .where(users_table.c.email == user_details["email"])
+        .values(confirmed=True)
+    )
+    await database.execute(query)
+
+    response = await async_client.post("/token", json=user_details)
+    return response.json()["access_token"]
+
+
+async def get_timeline(async_client: AsyncClient, token: str, **params) -> list:
+    response = await async_client.get(
+        "/timeline", params=params, headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+async def follow(async_client: AsyncClient, token: str, user_id: int):
+    return await async_client.post(
+        f"/follow/{user_id}", headers={"Authorization": f"Bearer {token}"}
+    )
+
+
+@pytest.mark.anyio
+async def test_timeline_contains_own_posts(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict
+):
+    timeline = await get_timeline(async_client, logged_in_token)
+
+    assert [post["id"] for post in timeline] == [created_post["id"]]
+    assert timeline[0]["likes"] == 0
+
+
+@pytest.mark.anyio
+async def test_timeline_contains_followed_posts(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    other_user_token: str,
+    confirmed_user: dict,
+):
+    response = await follow(async_client, other_user_token, confirmed_user["id"])
+    assert response.status_code == 201
+
+    post = await create_post("Followed post", async_client, logged_in_token)
+
+    timeline = await get_timeline(async_client, other_user_token)
+    assert [p["id"] for p in timeline] == [post["id"]]
+
+
+@pytest.mark.anyio
+async def test_timeline_pulls_posts_above_fanout_threshold(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    other_user_token: str,
+    confirmed_user: dict,
+    mocker,
+):
+    mocker.patch("socialink.timeline.config.TIMELINE_FANOUT_THRESHOLD", 0)
+    await follow(async_client, other_user_token, confirmed_user["id"])
+
+    post = await create_post("Celebrity post", async_client, logged_in_token)
+
+    timeline = await get_timeline(async_client, other_user_token)
+    assert [p["id"] for p in timeline] == [post["id"]]
+
+
+@pytest.mark.anyio
+async def test_timeline_keeps_pulled_posts_below_fanout_threshold(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    other_user_token: str,
+    confirmed_user: dict,
+    mocker,
+):
+    await follow(async_client, other_user_token, confirmed_user["id"])
+    mocker.patch("socialink.timeline.config.TIMELINE_FANOUT_THRESHOLD", 0)
+    pulled = await create_post("Celebrity post", async_client, logged_in_token)
+    # The follower count drops back under the threshold
+    mocker.patch("socialink.timeline.config.TIMELINE_FANOUT_THRESHOLD", 1000)
+    pushed = await create_post("Ordinary post", async_client, logged_in_token)
+
+    timeline = await get_timeline(async_client, other_user_token)
+    assert [p["id"] for p in timeline] == [pushed["id"], pulled["id"]]
+
+
+@pytest.mark.anyio
+async def test_follow_adds_recent_posts_to_timeline(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    other_user_token: str,
+    confirmed_user: dict,
+    mocker,
+):
+    mocker.patch("socialink.timeline.config.TIMELINE_FOLLOW_BACKFILL", 2)
+    posts = [
+        await create_post(f"Earlier post {i}", async_client, logged_in_token)
+        for i in range(3)
+    ]
+
+    await follow(async_client, other_user_token, confirmed_user["id"])
+
+    timeline = await get_timeline(async_client, other_user_token)
+    assert [p["id"] for p in timeline] == [posts[2]["id"], posts[1]["id"]]
+
+
+@pytest.mark.anyio
+async def test_timeline_pagination(async_client: AsyncClient, logged_in_token: str):
+    for i in range(5):
+        await create_post(f"Post {i}", async_client, logged_in_token)
+
+    first_page = await get_timeline(async_client, logged_in_token, limit=2)
+    assert [post["id"] for post in first_page] == [5, 4]
+
+    second_page = await get_timeline(
+        async_client, logged_in_token, limit=2, before=first_page[-1]["id"]
+    )
+    assert [post["id"] for post in second_page] == [3, 2]
+
+
+@pytest.mark.anyio
+async def test_unfollow_removes_posts_from_timeline(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    other_user_token: str,
+    confirmed_user: dict,
+):
+    await follow(async_client, other_user_token, confirmed_user["id"])
+    await create_post("Followed post", async_client, logged_in_token)
+
+    response = await async_client.delete(
+        f"/follow/{confirmed_user['id']}",
+        headers={"Authorization": f"Bearer {other_user_token}"},
+    )
+    assert response.status_code == 200
+
+    assert await get_timeline(async_client, other_user_token) == []
+
+
+@pytest.mark.anyio
+async def test_follow_lost_to_a_concurrent_follow(
+    created_post: dict, confirmed_user: dict, other_user_token: str, db
+):
+    # The row another request inserted between this one starting and writing
+    other = await db.fetch_one(
+        users_table.select().where(users_table.c.email == "other@example.com")
+    )
+    await db.execute(
+        follows_table.insert().values(
+            follower_id=other.id, followee_id=confirmed_user["id"]
+        )
+    )
+
+    assert not await follow_user(db, other.id, confirmed_user["id"])
+
+    query = users_table.select().where(users_table.c.id == confirmed_user["id"])
+    assert (await db.fetch_one(query)).follower_count == 0
+    assert (
+        await db.fetch_all(
+            timeline_table.select().where(timeline_table.c.user_id == other.id)
+        )
+        == []
+    )
+
+
+@pytest.mark.anyio
+async def test_follow_twice_counts_once(
+    async_client: AsyncClient, confirmed_user: dict, other_user_token: str
+):
+    for _ in range(2):
+        response = await follow(async_client, other_user_token, confirmed_user["id"])
+        assert response.status_code == 201
+
+    query = users_table.select().where(users_table.c.id == confirmed_user["id"])
+    assert (await database.fetch_one(query)).follower_count == 1
+
+
+@pytest.mark.anyio
+async def test_follow_missing_user(async_client: AsyncClient, logged_in_token: str):
+    response = await follow(async_client, logged_in_token, 42)
+
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_follow_self(
+    async_client: AsyncClient, logged_in_token: str, confirmed_user: dict
+):
+    response = await follow(async_client, logged_in_token, confirmed_user["id"])
+
+    assert response.status_code == 400
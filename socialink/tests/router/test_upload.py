@@ -1,26 +1,48 @@
 import contextlib
+import hashlib
 import os
 import pathlib
 import tempfile
 
 import pytest
+from fastapi import UploadFile
 from httpx import AsyncClient, head
+from socialink.config import config
+from socialink.database import upload_table
+from socialink.tests.helpers import png_bytes
 
 
 @pytest.fixture()
 def sample_image(fs) -> pathlib.Path:
     path = (pathlib.Path(__file__).parent / "assets" / "myfile.png").resolve()
-    fs.create_file(path)
+    fs.create_file(path, contents=png_bytes(800, 600))
     return path
 
 
 @pytest.fixture(autouse=True)
-def mock_b2_upload_file(mocker):
+def mock_put_file(mocker):
     return mocker.patch(
-        "socialink.routers.upload.b2_upload_file", return_value="https://fakeurl.com"
+        "socialink.storage.put_file", return_value="https://fakeurl.com"
     )
 
 
+@pytest.fixture(autouse=True)
+def mock_put_bytes(mocker):
+    return mocker.patch(
+        "socialink.storage.put_bytes",
+        side_effect=lambda data, name, content_type: f"https://fakeurl.com/{name}",
+    )
+
+
+@pytest.fixture(autouse=True)
+def inline_image_worker(mocker):
+    # Worker processes can't see the fake filesystem
+    async def run_inline(func, *args):
+        return func(*args)
+
+    return mocker.patch("socialink.routers.upload.run_in_image_worker", run_inline)
+
+
 @pytest.fixture(autouse=True)
 def aiofiles_mock_open(mocker, fs):
     mock_open = mocker.patch("aiofiles.open")
@@ -59,6 +81,127 @@ async def test_upload_file(
     assert response.json()["file_url"] == "https://fakeurl.com"
 
 
+@pytest.mark.anyio
+async def test_upload_file_returns_variants(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    sample_image: pathlib.Path,
+    mock_put_bytes,
+):
+    response = await call_upload_endpoint(async_client, logged_in_token, sample_image)
+
+    variants = response.json()["variants"]
+    assert sorted(variants) == [
+        "1280w.jpg",
+        "1280w.webp",
+        "320w.jpg",
+        "320w.webp",
+        "640w.jpg",
+        "640w.webp",
+    ]
+    assert all(url.endswith(name) for name, url in variants.items())
+    uploaded = {
+        call.args[1].rsplit("/", 1)[1]: call.args[2]
+        for call in mock_put_bytes.call_args_list
+    }
+    assert uploaded["640w.webp"] == "image/webp"
+    assert uploaded["640w.jpg"] == "image/jpeg"
+
+
+@pytest.mark.anyio
+async def test_duplicate_upload_is_not_stored_again(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    sample_image: pathlib.Path,
+    mock_put_file,
+    mock_put_bytes,
+    db,
+):
+    first = await call_upload_endpoint(async_client, logged_in_token, sample_image)
+    second = await call_upload_endpoint(async_client, logged_in_token, sample_image)
+
+    assert second.status_code == 201
+    assert second.json()["file_url"] == first.json()["file_url"]
+    assert second.json()["variants"] == first.json()["variants"]
+    mock_put_file.assert_called_once()
+    assert mock_put_bytes.call_count == 6
+
+    upload = await db.fetch_one(upload_table.select())
+    assert upload.duplicates == 1
+    assert upload.content_hash == hashlib.sha256(sample_image.read_bytes()).hexdigest()
+
+
+@pytest.mark.anyio
+async def test_upload_is_stored_under_its_content_hash(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    sample_image: pathlib.Path,
+    mock_put_file,
+):
+    await call_upload_endpoint(async_client, logged_in_token, sample_image)
+
+    content_hash = hashlib.sha256(sample_image.read_bytes()).hexdigest()
+    assert mock_put_file.call_args.args[1] == (f"uploads/{content_hash}/original.png")
+
+
+@pytest.mark.anyio
+async def test_upload_rejects_files_that_are_not_images(
+    async_client: AsyncClient, logged_in_token: str, fs, mock_put_file
+):
+    path = fs.create_file("/tmp/page.png", contents=b"<html></html>").path
+
+    response = await call_upload_endpoint(async_client, logged_in_token, path)
+
+    assert response.status_code == 415
+    mock_put_file.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_upload_rejects_files_over_the_size_limit(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    sample_image: pathlib.Path,
+    mocker,
+    mock_put_file,
+):
+    mocker.patch.object(config, "UPLOAD_MAX_BYTES", 100)
+
+    response = await call_upload_endpoint(async_client, logged_in_token, sample_image)
+
+    assert response.status_code == 413
+    mock_put_file.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_upload_rejects_oversized_body_before_parsing(
+    async_client: AsyncClient, logged_in_token: str, mocker
+):
+    mocker.patch.object(config, "UPLOAD_MAX_BYTES", 100)
+    spy = mocker.spy(UploadFile, "read")
+
+    response = await async_client.post(
+        "/upload",
+        files={"file": ("big.png", b"\x89PNG\r\n\x1a\n" + b"0" * 200_000)},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+
+    assert response.status_code == 413
+    spy.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_upload_rejects_corrupt_images(
+    async_client: AsyncClient, logged_in_token: str, fs
+):
+    path = fs.create_file(
+        "/tmp/broken.png", contents=b"\x89PNG\r\n\x1a\n" + b"0" * 100
+    ).path
+
+    response = await call_upload_endpoint(async_client, logged_in_token, path)
+
+    assert response.status_code == 422
+
+
 @pytest.mark.anyio
 async def test_temp_file_removed_after_uplaod(
     async_client: AsyncClient, mocker, logged_in_token: str, sample_image: pathlib.Path
@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import pathlib
+
+import pytest
+from httpx import AsyncClient
+
+import socialink.storage
+from socialink.config import config
+from socialink.tests.helpers import png_bytes
+from socialink.upload_sessions import upload_sessions
+
+IMAGE = png_bytes(640, 480)
+
+
+@pytest.fixture(autouse=True)
+def session_dir(mocker, tmp_path: pathlib.Path) -> pathlib.Path:
+    mocker.patch.object(upload_sessions, "directory", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def mock_put_file(mocker):
+    uploaded = {}
+
+    def upload(local_file: str, file_name: str) -> str:
+        # The session file is gone once the request returns, keep its bytes
+        uploaded[file_name] = pathlib.Path(local_file).read_bytes()
+        return f"https://fakeurl.com/{file_name}"
+
+    mocker.patch("socialink.storage.put_file", side_effect=upload)
+    return uploaded
+
+
+@pytest.fixture(autouse=True)
+def mock_storage(mocker):
+    async def run_inline(func, *args):
+        return func(*args)
+
+    mocker.patch("socialink.routers.upload.run_in_image_worker", run_inline)
+    mocker.patch(
+        "socialink.storage.put_bytes",
+        side_effect=lambda data, name, content_type: f"https://fakeurl.com/{name}",
+    )
+
+
+async def create_session(async_client: AsyncClient, data: bytes = IMAGE) -> dict:
+    response = await async_client.post(
+        "/uploads", json={"size": len(data), "file_name": "photo.png"}
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+async def put_chunk(
+    async_client: AsyncClient, session_id: str, offset: int, chunk: bytes
+):
+    return await async_client.put(
+        f"/uploads/{session_id}", params={"offset": offset}, content=chunk
+    )
+
+
+@pytest.mark.anyio
+async def test_create_upload_session(async_client: AsyncClient, session_dir):
+    session = await create_session(async_client)
+
+    assert session["size"] == len(IMAGE)
+    assert session["received"] == []
+    assert session["missing"] == [[0, len(IMAGE)]]
+    # Nothing is reserved up front, the file grows as chunks arrive
+    assert (session_dir / f"{session['id']}.part").stat().st_size == 0
+
+
+@pytest.mark.anyio
+async def test_create_upload_session_too_large(async_client: AsyncClient, mocker):
+    mocker.patch.object(config, "UPLOAD_SESSION_MAX_BYTES", 100)
+
+    response = await async_client.post(
+        "/uploads", json={"size": 101, "file_name": "photo.png"}
+    )
+
+    assert response.status_code == 413
+
+
+@pytest.mark.anyio
+async def test_upload_chunks_out_of_order(
+    async_client: AsyncClient, mock_put_file, session_dir
+):
+    session = await create_session(async_client)
+    middle = len(IMAGE) // 2
+
+    response = await put_chunk(async_client, session["id"], middle, IMAGE[middle:])
+    assert response.json()["missing"] == [[0, middle]]
+    response = await put_chunk(async_client, session["id"], 0, IMAGE[:middle])
+    assert response.json()["missing"] == []
+
+    response = await async_client.post(f"/uploads/{session['id']}/complete")
+
+    content_hash = hashlib.sha256(IMAGE).hexdigest()
+    assert response.status_code == 201
+    assert response.json()["file_url"] == (
+        f"https://fakeurl.com/uploads/{content_hash}/original.png"
+    )
+    assert mock_put_file[f"uploads/{content_hash}/original.png"] == IMAGE
+    assert list(session_dir.iterdir()) == []
+
+
+@pytest.mark.anyio
+async def test_upload_chunks_concurrently(async_client: AsyncClient, mock_put_file):
+    session = await create_session(async_client)
+    size = 1000
+
+    await asyncio.gather(
+        *(
+            put_chunk(
+                async_client, session["id"], offset, IMAGE[offset : offset + size]
+            )
+            for offset in range(0, len(IMAGE), size)
+        )
+    )
+    response = await async_client.post(f"/uploads/{session['id']}/complete")
+
+    assert response.status_code == 201
+    assert list(mock_put_file.values()) == [IMAGE]
+
+
+@pytest.mark.anyio
+async def test_resume_after_interrupted_chunk(async_client: AsyncClient, mock_put_file):
+    session = await create_session(async_client)
+    middle = len(IMAGE) // 2
+
+    async def dropped_connection():
+        yield IMAGE[:100]
+        raise ConnectionResetError
+
+    await put_chunk(async_client, session["id"], 0, IMAGE[:middle])
+    with pytest.raises(ConnectionResetError):
+        await async_client.put(
+            f"/uploads/{session['id']}",
+            params={"offset": middle},
+            content=dropped_connection(),
+        )
+
+    # The cut off chunk isn't recorded, the client sends it again from the start
+    response = await async_client.get(f"/uploads/{session['id']}")
+    assert response.json()["missing"] == [[middle, len(IMAGE)]]
+
+    await put_chunk(async_client, session["id"], middle, IMAGE[middle:])
+    response = await async_client.post(f"/uploads/{session['id']}/complete")
+
+    assert response.status_code == 201
+    assert list(mock_put_file.values()) == [IMAGE]
+
+
+@pytest.mark.anyio
+async def test_complete_incomplete_upload(async_client: AsyncClient):
+    session = await create_session(async_client)
+    await put_chunk(async_client, session["id"], 0, IMAGE[:100])
+
+    response = await async_client.post(f"/uploads/{session['id']}/complete")
+
+    assert response.status_code == 409
+    assert response.json()["detail"]["missing"] == [[100, len(IMAGE)]]
+
+
+@pytest.mark.anyio
+async def test_complete_upload_that_is_not_an_image(
+    async_client: AsyncClient, session_dir
+):
+    data = b"<html></html>"
+    session = await create_session(async_client, data)
+    await put_chunk(async_client, session["id"], 0, data)
+
+    response = await async_client.post(f"/uploads/{session['id']}/complete")
+
+    assert response.status_code == 415
+    assert list(session_dir.iterdir()) == []
+
+
+@pytest.mark.anyio
+async def test_retry_completion_after_storage_failure(
+    async_client: AsyncClient, mock_put_file, session_dir
+):
+    store = socialink.storage.put_file.side_effect
+    failures = [RuntimeError("B2 down")]
+
+    def flaky_store(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return store(*args, **kwargs)
+
+    socialink.storage.put_file.side_effect = flaky_store
+    session = await create_session(async_client)
+    await put_chunk(async_client, session["id"], 0, IMAGE)
+
+    failed = await async_client.post(f"/uploads/{session['id']}/complete")
+
+    assert failed.status_code == 500
+    response = await async_client.get(f"/uploads/{session['id']}")
+    assert response.json()["missing"] == []
+
+    retried = await async_client.post(f"/uploads/{session['id']}/complete")
+
+    assert retried.status_code == 201
+    assert list(mock_put_file.values()) == [IMAGE]
+    assert list(session_dir.iterdir()) == []
+
+
+@pytest.mark.anyio
+async def test_chunk_past_end_of_upload(async_client: AsyncClient):
+    session = await create_session(async_client)
+
+    response = await put_chunk(async_client, session["id"], len(IMAGE) - 10, IMAGE)
+
+    assert response.status_code == 416
+
+
+@pytest.mark.anyio
+async def test_missing_upload_session(async_client: AsyncClient):
+    response = await put_chunk(async_client, "not-a-session", 0, b"data")
+
+    assert response.status_code == 404
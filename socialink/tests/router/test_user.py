@@ -2,6 +2,20 @@ import pytest
 from fastapi import BackgroundTasks
 from httpx import AsyncClient
 
+from socialink.config import config
+from socialink.rate_limit import MemoryBackend, RateLimiter
+
+
+async def login(async_client: AsyncClient, user: dict) -> dict:
+    response = await async_client.post("/token", json=user)
+    return response.json()
+
+
+async def refresh(async_client: AsyncClient, refresh_token: str):
+    return await async_client.post(
+        "/token/refresh", json={"refresh_token": refresh_token}
+    )
+
 
 async def register_user(async_client: AsyncClient, email: str, password: str):
     return await async_client.post(
@@ -94,3 +108,77 @@ async def test_login_user_not_confirmed(
     )
 
     assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_login_rate_limited_per_ip(
+    async_client: AsyncClient, confirmed_user: dict, mocker
+):
+    mocker.patch.object(config, "RATE_LIMIT_ENABLED", True)
+    mocker.patch(
+        "socialink.rate_limit.rate_limiter",
+        RateLimiter(MemoryBackend(), {"token": "2/minute"}, {}),
+    )
+
+    responses = [
+        await async_client.post("/token", json=confirmed_user) for _ in range(3)
+    ]
+
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert responses[-1].headers["Retry-After"] == "30"
+
+
+@pytest.mark.anyio
+async def test_refresh_token(async_client: AsyncClient, confirmed_user: dict, mocker):
+    tokens = await login(async_client, confirmed_user)
+    verify_password = mocker.patch("socialink.security.verify_password")
+
+    response = await refresh(async_client, tokens["refresh_token"])
+
+    assert response.status_code == 200
+    refreshed = response.json()
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+    created = await async_client.post(
+        "/post",
+        json={"body": "Still logged in"},
+        headers={"Authorization": f"Bearer {refreshed['access_token']}"},
+    )
+    assert created.status_code == 201
+    verify_password.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_reused_refresh_token_revokes_family(
+    async_client: AsyncClient, confirmed_user: dict
+):
+    tokens = await login(async_client, confirmed_user)
+    rotated = (await refresh(async_client, tokens["refresh_token"])).json()
+
+    reused = await refresh(async_client, tokens["refresh_token"])
+    after_reuse = await refresh(async_client, rotated["refresh_token"])
+
+    assert reused.status_code == 401
+    assert after_reuse.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_revoke_refresh_token(async_client: AsyncClient, confirmed_user: dict):
+    tokens = await login(async_client, confirmed_user)
+    other_login = await login(async_client, confirmed_user)
+
+    response = await async_client.post(
+        "/token/revoke", json={"refresh_token": tokens["refresh_token"]}
+    )
+
+    assert response.status_code == 200
+    assert (await refresh(async_client, tokens["refresh_token"])).status_code == 401
+    assert (
+        await refresh(async_client, other_login["refresh_token"])
+    ).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_refresh_with_invalid_token(async_client: AsyncClient):
+    response = await refresh(async_client, "not-a-token")
+
+    assert response.status_code == 401
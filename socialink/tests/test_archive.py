@@ -0,0 +1,140 @@
+import datetime
+
+import pytest
+from httpx import AsyncClient
+
+from socialink.archive import Archiver, archive_batch
+from socialink.database import (
+    archived_comment_table,
+    archived_post_table,
+    comment_table,
+    likes_table,
+    post_ranking_table,
+    post_table,
+)
+from socialink.tests.helpers import create_comment, create_post, like_post
+
+NOW = datetime.datetime.now(datetime.timezone.utc)
+
+
+async def backdate(db, post_id: int, days: int) -> None:
+    await db.execute(
+        post_table.update()
+        .where(post_table.c.id == post_id)
+        .values(created_at=NOW - datetime.timedelta(days=days))
+    )
+
+
+@pytest.fixture()
+async def old_post(async_client: AsyncClient, logged_in_token: str, db) -> dict:
+    post = await create_post("Old post", async_client, logged_in_token)
+    await create_comment("Old comment", post["id"], async_client, logged_in_token)
+    await like_post(post["id"], async_client, logged_in_token)
+    await backdate(db, post["id"], 400)
+    return post
+
+
+@pytest.fixture()
+async def new_post(
+    async_client: AsyncClient, logged_in_token: str, old_post: dict
+) -> dict:
+    return await create_post("New post", async_client, logged_in_token)
+
+
+@pytest.mark.anyio
+async def test_archive_moves_old_posts(db, old_post: dict, new_post: dict):
+    before = NOW - datetime.timedelta(days=365)
+
+    archived = await archive_batch(db, before, 100)
+
+    assert archived == 1
+    post = await db.fetch_one(archived_post_table.select())
+    assert (post.id, post.body, post.likes, post.comment_count) == (
+        old_post["id"],
+        "Old post",
+        1,
+        1,
+    )
+    comment = await db.fetch_one(archived_comment_table.select())
+    assert comment.body == "Old comment"
+    hot_posts = await db.fetch_all(post_table.select())
+    assert [p.id for p in hot_posts] == [new_post["id"]]
+    for table in (comment_table, likes_table):
+        assert await db.fetch_all(table.select()) == []
+    rankings = await db.fetch_all(post_ranking_table.select())
+    assert [r.post_id for r in rankings] == [new_post["id"]]
+
+
+@pytest.mark.anyio
+async def test_archive_nothing_old(db, new_post: dict, old_post: dict):
+    archived = await archive_batch(db, NOW - datetime.timedelta(days=500), 100)
+
+    assert archived == 0
+    assert len(await db.fetch_all(post_table.select())) == 2
+
+
+@pytest.mark.anyio
+async def test_archiver_runs_in_batches(
+    async_client: AsyncClient, logged_in_token: str, db, mocker
+):
+    for i in range(5):
+        post = await create_post(f"Post {i}", async_client, logged_in_token)
+        await backdate(db, post["id"], 30)
+    batches = mocker.patch("socialink.archive.archive_batch", wraps=archive_batch)
+    archiver = Archiver(datetime.timedelta(days=7), batch_size=2, pause=0)
+
+    archived = await archiver.run(db)
+
+    assert archived == 5
+    assert batches.call_count == 3
+    assert len(await db.fetch_all(archived_post_table.select())) == 5
+    assert await db.fetch_all(post_table.select()) == []
+
+
+@pytest.mark.anyio
+async def test_archived_post_is_served(
+    async_client: AsyncClient, db, old_post: dict, new_post: dict
+):
+    await archive_batch(db, NOW - datetime.timedelta(days=365), 100)
+
+    post = await async_client.get(f"/post/{old_post['id']}")
+    comments = await async_client.get(f"/post/{old_post['id']}/comments")
+    posts = await async_client.get(
+        "/posts", params={"ids": f"{new_post['id']},{old_post['id']}"}
+    )
+
+    assert post.status_code == 200
+    assert post.json()["post"]["likes"] == 1
+    assert [c["body"] for c in post.json()["comments"]] == ["Old comment"]
+    assert [c["body"] for c in comments.json()] == ["Old comment"]
+    assert [p["post"]["body"] for p in posts.json()] == ["New post", "Old post"]
+    assert posts.json()[1]["comment_count"] == 1
+
+
+@pytest.mark.anyio
+async def test_hot_post_without_comments_skips_archive(
+    async_client: AsyncClient, new_post: dict, mocker
+):
+    find_archived_comments = mocker.patch(
+        "socialink.routers.post.find_archived_comments"
+    )
+
+    response = await async_client.get(f"/post/{new_post['id']}/comments")
+
+    assert response.json() == []
+    find_archived_comments.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_comment_on_archived_post(
+    async_client: AsyncClient, db, old_post: dict, logged_in_token: str
+):
+    await archive_batch(db, NOW - datetime.timedelta(days=365), 100)
+
+    response = await async_client.post(
+        "/comment",
+        json={"body": "Too late", "post_id": old_post["id"]},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+
+    assert response.status_code == 409
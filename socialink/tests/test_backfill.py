@@ -0,0 +1,66 @@
+import pathlib
+
+import pytest
+import sqlalchemy
+from databases import Database
+
+from socialink.backfill import run_backfills
+from socialink.database import (
+    comment_table,
+    metadata,
+    post_ranking_table,
+    post_table,
+    search_table,
+    users_table,
+)
+from socialink.search import search
+
+
+@pytest.mark.anyio
+async def test_run_backfills_ranks_legacy_posts(tmp_path: pathlib.Path):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = sqlalchemy.create_engine(url)
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(users_table.insert().values(id=1, email="a@b"))
+        connection.execute(post_table.insert().values(body="Legacy", user_id=1))
+
+    assert await run_backfills(url, ["rankings"]) == {"rankings": 1}
+    assert await run_backfills(url, ["rankings"]) == {"rankings": 0}
+    with engine.connect() as connection:
+        assert len(connection.execute(post_ranking_table.select()).all()) == 1
+    engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_run_backfills_indexes_legacy_posts_and_comments(
+    tmp_path: pathlib.Path,
+):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = sqlalchemy.create_engine(url)
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(users_table.insert().values(id=1, email="a@b"))
+        connection.execute(post_table.insert().values(body="Old cat", user_id=1))
+        connection.execute(post_table.insert().values(body="New cat", user_id=1))
+        connection.execute(
+            comment_table.insert().values(body="Old dog", post_id=1, user_id=1)
+        )
+        # Created after search was added, so already indexed
+        connection.execute(
+            search_table.insert().values(
+                kind="post", ref_id=2, post_id=2, body="New cat"
+            )
+        )
+
+    assert await run_backfills(url, ["search"]) == {"search": 2}
+    assert await run_backfills(url, ["search"]) == {"search": 0}
+
+    database = Database(url)
+    await database.connect()
+    cats = await search(database, "cat", 10, 0)
+    dogs = await search(database, "dog", 10, 0)
+    await database.disconnect()
+    engine.dispose()
+    assert sorted(row.id for row in cats) == [1, 2]
+    assert [(row.kind, row.post_id) for row in dogs] == [("comment", 1)]
@@ -0,0 +1,135 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from httpx import AsyncClient
+
+from socialink.compression import (
+    CompressedCache,
+    CompressionMiddleware,
+    available_codecs,
+    choose_encoding,
+)
+
+LARGE = [{"id": i, "body": "A post about cats and dogs"} for i in range(200)]
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip, deflate", "gzip"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("gzip;q=0.5, br", "br"),
+        ("*", "br"),
+        ("br;q=0, *", "gzip"),
+        ("gzip;q=0", None),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_choose_encoding(header: str, expected):
+    assert choose_encoding(header, ["br", "gzip"]) == expected
+
+
+def test_available_codecs_always_include_gzip():
+    codecs = available_codecs()
+
+    assert gzip.decompress(codecs["gzip"](b"data")) == b"data"
+
+
+def test_cache_evicts_least_recently_used():
+    cache = CompressedCache(max_bytes=10)
+    first, second, third = (cache.key("gzip", body) for body in (b"1", b"2", b"3"))
+
+    cache.put(first, b"aaaa")
+    cache.put(second, b"bbbb")
+    cache.get(first)
+    cache.put(third, b"cccc")
+
+    assert cache.get(second) is None
+    assert cache.get(first) == b"aaaa"
+    assert cache.size == 8
+
+
+@pytest.fixture()
+def cache() -> CompressedCache:
+    return CompressedCache(max_bytes=1024 * 1024)
+
+
+@pytest.fixture()
+def compressed_app(cache: CompressedCache) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/large")
+    async def large():
+        return LARGE
+
+    @app.get("/small")
+    async def small():
+        return {"id": 1}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            yield b"x" * 2000
+            yield b"y" * 2000
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/events")
+    async def events():
+        return PlainTextResponse("data: {}\n\n" * 200, media_type="text/event-stream")
+
+    app.add_middleware(
+        CompressionMiddleware,
+        codecs=available_codecs(),
+        minimum_size=500,
+        cache=cache,
+    )
+    return app
+
+
+@pytest.fixture()
+async def client(compressed_app: FastAPI):
+    async with AsyncClient(app=compressed_app, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.anyio
+async def test_large_response_is_compressed(client: AsyncClient):
+    response = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(response.content) / 5
+    assert response.json() == LARGE
+
+
+@pytest.mark.anyio
+async def test_repeated_response_is_compressed_once(
+    client: AsyncClient, cache: CompressedCache
+):
+    for _ in range(3):
+        await client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert (cache.misses, cache.hits) == (1, 2)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "path, accept_encoding",
+    [
+        ("/small", "gzip"),
+        ("/large", "identity"),
+        ("/stream", "gzip"),
+        ("/events", "gzip"),
+    ],
+)
+async def test_response_is_not_compressed(
+    client: AsyncClient, path: str, accept_encoding: str
+):
+    response = await client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
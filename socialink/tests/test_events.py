@@ -0,0 +1,66 @@
+import pytest
+
+from socialink.events import EventBroker, TooManySubscribers
+
+
+@pytest.fixture()
+def broker() -> EventBroker:
+    return EventBroker(max_subscribers=3, buffer_size=2)
+
+
+@pytest.mark.anyio
+async def test_publish_reaches_subscribers(broker: EventBroker):
+    first, second = broker.subscribe(), broker.subscribe()
+
+    event = broker.publish("post", 1, {"id": 1, "body": "Hello"})
+
+    assert event.id == 1
+    expected = b'id: 1\nevent: post\ndata: {"id": 1, "body": "Hello"}\n\n'
+    assert await first.get() == expected
+    assert await second.get() == expected
+
+
+@pytest.mark.anyio
+async def test_subscription_to_one_post(broker: EventBroker):
+    subscription = broker.subscribe(post_id=2)
+
+    broker.publish("like", 1, {"post_id": 1})
+    broker.publish("like", 2, {"post_id": 2})
+
+    assert b'"post_id": 2' in await subscription.get()
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_is_evicted(broker: EventBroker):
+    slow, fast = broker.subscribe(), broker.subscribe()
+
+    for post_id in range(2):
+        broker.publish("post", post_id, {})
+        await fast.get()
+    broker.publish("post", 2, {})
+
+    assert slow.evicted
+    assert broker.evictions == 1
+    assert len(broker) == 1
+    messages = [await slow.get() for _ in range(3)]
+    assert messages[-1] is None
+    assert b"event: post" in await fast.get()
+
+
+def test_subscribers_are_capped(broker: EventBroker):
+    for _ in range(3):
+        broker.subscribe()
+
+    with pytest.raises(TooManySubscribers):
+        broker.subscribe()
+
+
+@pytest.mark.anyio
+async def test_close_ends_every_stream(broker: EventBroker):
+    subscription = broker.subscribe()
+
+    broker.close()
+
+    assert await subscription.get() is None
+    assert not subscription.evicted
+    assert len(broker) == 0
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from socialink.generation import (
+    CircuitBreaker,
+    CircuitOpenError,
+    GenerationError,
+    GenerationPipeline,
+)
+
+
+class FakeProvider:
+    def __init__(self, failures: int = 0, delay: float = 0) -> None:
+        self.failures = failures
+        self.delay = delay
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, prompt: str) -> dict:
+        self.calls += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.calls <= self.failures:
+                raise RuntimeError("provider error")
+            return {"output_url": "https://example.com/image.jpg"}
+        finally:
+            self.running -= 1
+
+
+def pipeline(**kwargs) -> GenerationPipeline:
+    return GenerationPipeline(backoff=0, **kwargs)
+
+
+def test_circuit_breaker_opens_after_threshold(mocker):
+    clock = mocker.patch("socialink.generation.time.monotonic", return_value=0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.return_value = 10
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_reopens_when_trial_fails(mocker):
+    clock = mocker.patch("socialink.generation.time.monotonic", return_value=0)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+
+    clock.return_value = 10
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+
+
+@pytest.mark.anyio
+async def test_run_retries_failures():
+    provider = FakeProvider(failures=2)
+
+    response = await pipeline(retries=2).run(provider, "A cat")
+
+    assert response == {"output_url": "https://example.com/image.jpg"}
+    assert provider.calls == 3
+
+
+@pytest.mark.anyio
+async def test_run_gives_up_after_retries():
+    provider = FakeProvider(failures=5)
+
+    with pytest.raises(GenerationError):
+        await pipeline(retries=1).run(provider, "A cat")
+
+    assert provider.calls == 2
+
+
+@pytest.mark.anyio
+async def test_run_times_out_attempts():
+    provider = FakeProvider(delay=1)
+
+    with pytest.raises(GenerationError) as exc_info:
+        await pipeline(retries=0, attempt_timeout=0.01).run(provider, "A cat")
+
+    assert isinstance(exc_info.value.__cause__, asyncio.TimeoutError)
+
+
+@pytest.mark.anyio
+async def test_run_fails_fast_when_circuit_open():
+    provider = FakeProvider(failures=5)
+    generation = pipeline(retries=0, breaker=CircuitBreaker(failure_threshold=1))
+
+    with pytest.raises(GenerationError):
+        await generation.run(provider, "A cat")
+    with pytest.raises(CircuitOpenError):
+        await generation.run(provider, "A cat")
+
+    assert provider.calls == 1
+
+
+@pytest.mark.anyio
+async def test_run_limits_concurrency():
+    provider = FakeProvider(delay=0.01)
+    generation = pipeline(concurrency=2)
+
+    await asyncio.gather(*(generation.run(provider, "A cat") for _ in range(6)))
+
+    assert provider.max_running == 2
+
+
+@pytest.mark.anyio
+async def test_stop_cancels_jobs_after_grace_period():
+    generation = pipeline()
+    quick = generation.submit(asyncio.sleep(0.01))
+    slow = generation.submit(asyncio.sleep(10))
+
+    await generation.stop(grace_period=0.1)
+
+    assert quick.done() and not quick.cancelled()
+    assert slow.cancelled()
@@ -0,0 +1,90 @@
+import asyncio
+import datetime
+
+import pytest
+from databases import Database
+
+from socialink.database import generated_image_table
+from socialink.image_cache import ImageCache, normalize_prompt, prompt_key
+from socialink.tasks import APIResponseError
+
+
+class FakeGenerator:
+    def __init__(self, delay: float = 0, error: Exception = None) -> None:
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self, prompt: str) -> dict:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"output_url": f"https://example.com/{self.calls}.jpg"}
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  A   Cat on a couch! ") == "a cat on a couch"
+    assert prompt_key("A cat.") == prompt_key("a  CAT")
+    assert prompt_key("A cat") != prompt_key("A dog")
+
+
+@pytest.mark.anyio
+async def test_cached_prompt_is_not_generated_again(db: Database):
+    cache = ImageCache(ttl=3600)
+    generate = FakeGenerator()
+
+    first = await cache.get_or_generate(db, "A cat", generate)
+    second = await cache.get_or_generate(db, "a cat!", generate)
+
+    assert first["output_url"] == second["output_url"] == "https://example.com/1.jpg"
+    assert generate.calls == 1
+    assert cache.stats == {"misses": 1, "hits": 1}
+    assert cache.saved_calls == 1
+
+
+@pytest.mark.anyio
+async def test_expired_image_is_generated_again(db: Database):
+    cache = ImageCache(ttl=3600)
+    generate = FakeGenerator()
+    await cache.get_or_generate(db, "A cat", generate)
+    await db.execute(
+        generated_image_table.update().values(
+            created_at=datetime.datetime.now(datetime.timezone.utc)
+            - datetime.timedelta(hours=2)
+        )
+    )
+
+    response = await cache.get_or_generate(db, "A cat", generate)
+
+    assert response["output_url"] == "https://example.com/2.jpg"
+    assert generate.calls == 2
+
+
+@pytest.mark.anyio
+async def test_concurrent_prompts_share_one_call(db: Database):
+    cache = ImageCache(ttl=3600)
+    generate = FakeGenerator(delay=0.05)
+
+    responses = await asyncio.gather(
+        *(cache.get_or_generate(db, "A cat", generate) for _ in range(3))
+    )
+
+    assert generate.calls == 1
+    assert all(response == responses[0] for response in responses)
+    assert cache.stats["coalesced"] == 2
+
+
+@pytest.mark.anyio
+async def test_errors_are_shared_and_not_cached(db: Database):
+    cache = ImageCache(ttl=3600)
+    generate = FakeGenerator(delay=0.05, error=APIResponseError("boom"))
+
+    results = await asyncio.gather(
+        *(cache.get_or_generate(db, "A cat", generate) for _ in range(2)),
+        return_exceptions=True,
+    )
+
+    assert generate.calls == 1
+    assert all(isinstance(result, APIResponseError) for result in results)
+    assert not await db.fetch_all(generated_image_table.select())
@@ -0,0 +1,73 @@
+import io
+
+import pytest
+from PIL import Image
+
+from socialink.libs.images import (
+    encode_variants,
+    run_in_image_worker,
+    shutdown_image_executor,
+    sniff_image_type,
+)
+from socialink.tests.helpers import png_bytes
+
+
+def image_size(data: bytes, format: str = "JPEG") -> tuple[int, int]:
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.format == format
+        return image.size
+
+
+def jpeg_bytes(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (40, 120, 200)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.mark.anyio
+async def test_run_in_image_worker():
+    try:
+        variants = await run_in_image_worker(
+            encode_variants, png_bytes(640, 480), [320], ["JPEG"]
+        )
+    finally:
+        shutdown_image_executor()
+
+    assert image_size(variants["320w.jpg"]) == (320, 240)
+
+
+@pytest.mark.parametrize(
+    "data, content_type",
+    [
+        (png_bytes(10, 10), "image/png"),
+        (jpeg_bytes(10, 10), "image/jpeg"),
+        (b"GIF89a\x01\x00\x01\x00", "image/gif"),
+        (b"RIFF\x24\x00\x00\x00WEBPVP8 ", "image/webp"),
+        (b"<svg xmlns=", None),
+        (b"", None),
+    ],
+)
+def test_sniff_image_type(data: bytes, content_type):
+    assert sniff_image_type(data[:12]) == content_type
+
+
+def test_encode_variants():
+    variants = encode_variants(png_bytes(2000, 1000), [320, 1280], ["WEBP", "JPEG"])
+
+    assert image_size(variants["320w.webp"], "WEBP") == (320, 160)
+    assert image_size(variants["320w.jpg"]) == (320, 160)
+    assert image_size(variants["1280w.webp"], "WEBP") == (1280, 640)
+    assert image_size(variants["1280w.jpg"]) == (1280, 640)
+
+
+def test_encode_variants_decodes_large_jpegs_at_reduced_scale():
+    variants = encode_variants(jpeg_bytes(4000, 3000), [320, 640], ["JPEG"])
+
+    assert image_size(variants["640w.jpg"]) == (640, 480)
+    assert image_size(variants["320w.jpg"]) == (320, 240)
+
+
+def test_encode_variants_does_not_upscale():
+    variants = encode_variants(png_bytes(200, 100), [1024], ["JPEG"])
+
+    assert image_size(variants["1024w.jpg"]) == (200, 100)
@@ -0,0 +1,190 @@
+import asyncio
+import datetime
+
+import pytest
+from databases import Database
+from httpx import AsyncClient
+
+from socialink.config import config
+from socialink.database import likes_table, post_ranking_table, post_table
+from socialink.like_buffer import LikeBuffer
+from socialink.ranking import hot_score
+from socialink.tests.helpers import create_post, like_post
+
+
+@pytest.fixture()
+def like_buffer(mocker) -> LikeBuffer:
+    buffer = LikeBuffer(max_size=10, flush_interval=60)
+    mocker.patch("socialink.routers.post.like_buffer", buffer)
+    mocker.patch.object(config, "LIKE_BUFFER_ENABLED", True)
+    return buffer
+
+
+async def count_likes(db: Database, post_id: int) -> int:
+    query = likes_table.select().where(likes_table.c.post_id == post_id)
+    return len(await db.fetch_all(query))
+
+
+@pytest.mark.anyio
+async def test_add_dedupes_likes(db: Database):
+    buffer = LikeBuffer()
+
+    assert await buffer.add(db, 1, 1)
+    assert not await buffer.add(db, 1, 1)
+    assert await buffer.add(db, 1, 2)
+
+    assert len(buffer) == 2
+    assert buffer.pending_likes(1) == 2
+
+
+@pytest.mark.anyio
+async def test_flush_writes_batch(
+    db: Database, created_post: dict, confirmed_user: dict
+):
+    buffer = LikeBuffer()
+    await buffer.add(db, created_post["id"], confirmed_user["id"])
+
+    assert await buffer.flush(db) == 1
+    assert await count_likes(db, created_post["id"]) == 1
+    assert buffer.pending_likes(created_post["id"]) == 0
+    assert len(buffer) == 0
+
+
+@pytest.mark.anyio
+async def test_flush_on_size_threshold(db: Database, created_post: dict):
+    buffer = LikeBuffer(max_size=2)
+
+    await buffer.add(db, created_post["id"], 1)
+    assert await count_likes(db, created_post["id"]) == 0
+
+    await buffer.add(db, created_post["id"], 2)
+    assert await count_likes(db, created_post["id"]) == 2
+
+
+@pytest.mark.anyio
+async def test_buffered_like_visible_on_read(
+    async_client: AsyncClient,
+    created_post: dict,
+    logged_in_token: str,
+    like_buffer: LikeBuffer,
+    db: Database,
+):
+    response = await async_client.post(
+        "/like",
+        json={"post_id": created_post["id"]},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+    assert response.status_code == 201
+    assert await count_likes(db, created_post["id"]) == 0
+
+    response = await async_client.get(f"/post/{created_post['id']}")
+    assert response.json()["post"]["likes"] == 1
+
+    await like_buffer.stop(db)
+
+    assert await count_likes(db, created_post["id"]) == 1
+    response = await async_client.get("/post")
+    assert response.json()[0]["likes"] == 1
+
+
+@pytest.mark.anyio
+async def test_buffered_like_reorders_most_likes(
+    async_client: AsyncClient, logged_in_token: str, like_buffer: LikeBuffer
+):
+    await create_post("Test Post 1", async_client, logged_in_token)
+    await create_post("Test Post 2", async_client, logged_in_token)
+    await like_post(2, async_client, logged_in_token)
+
+    response = await async_client.get("/post", params={"sorting": "most_likes"})
+
+    assert [post["id"] for post in response.json()] == [2, 1]
+
+
+@pytest.mark.anyio
+async def test_buffered_like_keeps_trending_time_decayed(
+    async_client: AsyncClient,
+    db: Database,
+    logged_in_token: str,
+    like_buffer: LikeBuffer,
+):
+    await create_post("Test Post 1", async_client, logged_in_token)
+    await create_post("Test Post 2", async_client, logged_in_token)
+    # A like is worth less than a week of age
+    week_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(7)
+    await db.execute(
+        post_table.update().where(post_table.c.id == 1).values(created_at=week_ago)
+    )
+    await db.execute(
+        post_ranking_table.update()
+        .where(post_ranking_table.c.post_id == 1)
+        .values(hot=hot_score(0, week_ago))
+    )
+    await like_post(1, async_client, logged_in_token)
+
+    response = await async_client.get("/post", params={"sorting": "trending"})
+
+    assert [post["id"] for post in response.json()] == [2, 1]
+    assert response.json()[1]["likes"] == 1
+
+
+@pytest.mark.anyio
+async def test_flush_drops_likes_that_cannot_be_written(
+    db: Database, created_post: dict
+):
+    buffer = LikeBuffer()
+    await buffer.add(db, created_post["id"], 1)
+    # Breaks the NOT NULL constraint, so it can never be written
+    await buffer.add(db, None, 2)
+    await buffer.add(db, created_post["id"], 3)
+
+    assert await buffer.flush(db) == 2
+    assert await count_likes(db, created_post["id"]) == 2
+    assert len(buffer) == 0
+    assert buffer.pending_likes(None) == 0
+
+
+@pytest.mark.anyio
+async def test_flush_keeps_likes_through_an_outage(
+    mocker, db: Database, created_post: dict
+):
+    buffer = LikeBuffer(flush_interval=1, max_backoff=4)
+    await buffer.add(db, created_post["id"], 1)
+    execute = mocker.patch.object(db, "execute", side_effect=ConnectionError)
+
+    backoffs = []
+    for _ in range(10):
+        assert await buffer.flush(db) == 0
+        backoffs.append(buffer._backoff)
+
+    assert backoffs[:4] == [1, 2, 4, 4]
+    assert buffer.backing_off
+    assert buffer.pending_likes(created_post["id"]) == 1
+
+    mocker.stop(execute)
+    assert await buffer.flush(db) == 1
+    assert await count_likes(db, created_post["id"]) == 1
+    assert not buffer.backing_off
+
+
+@pytest.mark.anyio
+async def test_stop_writes_likes_of_a_cancelled_flush(
+    mocker, db: Database, created_post: dict
+):
+    buffer = LikeBuffer(flush_interval=0.01)
+    write = buffer._write
+    writing = asyncio.Event()
+
+    async def hanging_write(database, keys):
+        writing.set()
+        await asyncio.Event().wait()
+
+    mocker.patch.object(buffer, "_write", side_effect=hanging_write)
+    await buffer.add(db, created_post["id"], 1)
+    buffer.start(db)
+    await writing.wait()
+
+    buffer._write.side_effect = write
+    await buffer.stop(db)
+
+    assert await count_likes(db, created_post["id"]) == 1
+    assert len(buffer) == 0
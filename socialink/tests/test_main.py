@@ -0,0 +1,27 @@
+import logging
+
+import pytest
+from httpx import AsyncClient
+
+import socialink.config
+from socialink.main import create_app
+
+
+def test_create_app_uses_environment_config():
+    assert create_app().state.config is socialink.config.config
+
+
+def test_create_app_returns_new_app():
+    assert create_app() is not create_app()
+
+
+@pytest.mark.anyio
+async def test_http_exceptions_are_logged(caplog):
+    app = create_app()
+
+    with caplog.at_level(logging.ERROR, logger="socialink"):
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.get("/post/42")
+
+    assert response.status_code == 404
+    assert "HTTP Exception: 404 - Post not found" in caplog.text
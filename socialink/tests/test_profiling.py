@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import pytest
+
+from socialink.profiling import Profile, ProfileStore, Sampler
+
+
+def busy_wait(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_store_drops_oldest_profiles():
+    store = ProfileStore(max_profiles=2)
+
+    for correlation_id in ["a", "b", "c"]:
+        store.add(Profile(correlation_id, "GET", "/post", 0.0))
+
+    assert store.get("a") is None
+    assert [profile.correlation_id for profile in store.all()] == ["c", "b"]
+
+
+def test_profile_collapsed_output():
+    profile = Profile("a", "GET", "/post", 0.0)
+    profile.samples["main;handler"] = 3
+    profile.samples["main;handler;query"] = 1
+
+    assert profile.collapsed() == "main;handler 3\nmain;handler;query 1\n"
+
+
+@pytest.mark.anyio
+async def test_sampler_records_stacks_of_registered_task():
+    sampler = Sampler(interval=0.001)
+
+    samples = sampler.register(asyncio.current_task())
+    busy_wait(0.1)
+    sampler.unregister(asyncio.current_task())
+
+    assert samples
+    assert any("busy_wait" in stack for stack in samples)
+
+
+@pytest.mark.anyio
+async def test_sampler_ignores_other_tasks():
+    sampler = Sampler(interval=0.001)
+    samples = sampler.register(asyncio.current_task())
+
+    async def other():
+        busy_wait(0.1)
+
+    await asyncio.create_task(other())
+    sampler.unregister(asyncio.current_task())
+
+    assert not any("busy_wait" in stack for stack in samples)
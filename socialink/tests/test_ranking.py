@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+
+import pytest
+from databases import Database
+from httpx import AsyncClient
+
+from socialink.database import post_ranking_table, post_table
+from socialink.ranking import add_likes_to_ranking, backfill_post_rankings, hot_score
+from socialink.tests.helpers import like_post
+
+
+async def get_ranking(db: Database, post_id: int):
+    query = post_ranking_table.select().where(post_ranking_table.c.post_id == post_id)
+    return await db.fetch_one(query)
+
+
+def test_hot_score_prefers_newer_posts():
+    old = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    new = old + datetime.timedelta(days=1)
+
+    assert hot_score(10, new) > hot_score(10, old)
+    assert hot_score(100, old) > hot_score(10, old)
+
+
+def test_hot_score_naive_datetime_is_utc():
+    created_at = datetime.datetime(2024, 1, 1)
+
+    assert hot_score(1, created_at) == hot_score(
+        1, created_at.replace(tzinfo=datetime.timezone.utc)
+    )
+
+
+def test_hot_score_without_created_at_ranks_as_oldest():
+    old = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    assert hot_score(100, None) < hot_score(0, old)
+    assert hot_score(100, None) > hot_score(10, None)
+
+
+@pytest.mark.anyio
+async def test_like_undated_post_updates_ranking(db: Database, confirmed_user: dict):
+    post_id = await db.execute(
+        post_table.insert().values(
+            body="Legacy post", user_id=confirmed_user["id"], created_at=None
+        )
+    )
+    await backfill_post_rankings(db)
+
+    await add_likes_to_ranking(db, post_id, 9)
+
+    ranking = await get_ranking(db, post_id)
+    assert (ranking.likes, ranking.hot) == (9, hot_score(9, None))
+
+
+@pytest.mark.anyio
+async def test_create_post_adds_ranking(db: Database, created_post: dict):
+    ranking = await get_ranking(db, created_post["id"])
+
+    assert ranking.likes == 0
+
+
+@pytest.mark.anyio
+async def test_like_post_updates_ranking(
+    async_client: AsyncClient, db: Database, created_post: dict, logged_in_token: str
+):
+    before = await get_ranking(db, created_post["id"])
+
+    await like_post(created_post["id"], async_client, logged_in_token)
+    await like_post(created_post["id"], async_client, logged_in_token)
+
+    after = await get_ranking(db, created_post["id"])
+    assert after.likes == 2
+    assert after.hot > before.hot
+
+
+@pytest.mark.anyio
+async def test_add_likes_to_ranking(db: Database, created_post: dict):
+    await add_likes_to_ranking(db, created_post["id"], 5)
+
+    ranking = await get_ranking(db, created_post["id"])
+    assert ranking.likes == 5
+
+
+@pytest.mark.anyio
+async def test_backfill_post_rankings(db: Database, confirmed_user: dict):
+    post_id = await db.execute(
+        post_table.insert().values(body="Legacy post", user_id=confirmed_user["id"])
+    )
+
+    assert await backfill_post_rankings(db) == 1
+    assert (await get_ranking(db, post_id)).likes == 0
+    assert await backfill_post_rankings(db) == 0
+
+
+@pytest.mark.anyio
+async def test_concurrent_backfills_rank_each_post_once(
+    db: Database, confirmed_user: dict
+):
+    post_id = await db.execute(
+        post_table.insert().values(body="Legacy post", user_id=confirmed_user["id"])
+    )
+
+    await asyncio.gather(backfill_post_rankings(db), backfill_post_rankings(db))
+
+    assert (await get_ranking(db, post_id)).likes == 0
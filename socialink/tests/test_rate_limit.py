@@ -0,0 +1,112 @@
+import pytest
+from databases import Database
+from fastapi import HTTPException
+
+from socialink.config import config
+from socialink.rate_limit import (
+    DatabaseBackend,
+    MemoryBackend,
+    Rate,
+    RateLimiter,
+    parse_rate,
+    take_token,
+)
+
+
+@pytest.fixture(autouse=True)
+def enable_rate_limit(mocker):
+    mocker.patch.object(config, "RATE_LIMIT_ENABLED", True)
+
+
+def test_parse_rate():
+    assert parse_rate("10/minute") == Rate(10, 10 / 60)
+
+
+def test_take_token_refills_up_to_capacity():
+    assert take_token(0, 3600, Rate(5, 1)) == (4, 0)
+
+
+def test_take_token_returns_retry_after_when_empty():
+    assert take_token(0.5, 0, Rate(5, 0.5)) == (0.5, 1.0)
+
+
+@pytest.mark.anyio
+async def test_memory_backend_allows_burst_then_limits():
+    backend = MemoryBackend()
+    rate = Rate(2, 1 / 60)
+
+    assert await backend.take("token:ip:1", rate) == 0
+    assert await backend.take("token:ip:1", rate) == 0
+    assert await backend.take("token:ip:1", rate) > 0
+    assert await backend.take("token:ip:2", rate) == 0
+
+
+@pytest.mark.anyio
+async def test_memory_backend_refills(mocker):
+    backend = MemoryBackend()
+    rate = Rate(1, 1)
+    clock = mocker.patch("socialink.rate_limit.time.monotonic", return_value=100.0)
+
+    assert await backend.take("key", rate) == 0
+    assert await backend.take("key", rate) > 0
+    clock.return_value = 101.0
+    assert await backend.take("key", rate) == 0
+
+
+@pytest.mark.anyio
+async def test_memory_backend_evicts_old_keys():
+    backend = MemoryBackend(max_keys=2)
+
+    for key in ["a", "b", "c"]:
+        await backend.take(key, Rate(1, 1))
+
+    assert list(backend._buckets) == ["b", "c"]
+
+
+@pytest.mark.anyio
+async def test_database_backend_allows_burst_then_limits(db: Database):
+    backend = DatabaseBackend(db)
+    rate = Rate(2, 1 / 60)
+
+    assert await backend.take("token:ip:1", rate) == 0
+    assert await backend.take("token:ip:1", rate) == 0
+    assert await backend.take("token:ip:1", rate) > 0
+    assert await backend.take("token:ip:2", rate) == 0
+
+
+@pytest.mark.anyio
+async def test_rate_limiter_rejects_with_429():
+    limiter = RateLimiter(MemoryBackend(), {"token": "1/minute"}, {})
+
+    async with limiter.admit("token", "ip:1"):
+        pass
+    with pytest.raises(HTTPException) as exc_info:
+        async with limiter.admit("token", "ip:1"):
+            pass
+
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers["Retry-After"] == "60"
+
+
+@pytest.mark.anyio
+async def test_rate_limiter_caps_concurrency_with_503():
+    limiter = RateLimiter(MemoryBackend(), {}, {"upload": 1})
+
+    async with limiter.admit("upload", "ip:1"):
+        with pytest.raises(HTTPException) as exc_info:
+            async with limiter.admit("upload", "ip:2"):
+                pass
+    async with limiter.admit("upload", "ip:2"):
+        pass
+
+    assert exc_info.value.status_code == 503
+
+
+@pytest.mark.anyio
+async def test_rate_limiter_disabled(mocker):
+    mocker.patch.object(config, "RATE_LIMIT_ENABLED", False)
+    limiter = RateLimiter(MemoryBackend(), {"token": "1/minute"}, {"token": 0})
+
+    for _ in range(3):
+        async with limiter.admit("token", "ip:1"):
+            pass
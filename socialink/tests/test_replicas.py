@@ -0,0 +1,145 @@
+import math
+import pathlib
+import time
+
+import pytest
+import sqlalchemy
+from databases import Database
+from httpx import AsyncClient
+
+from socialink.config import config
+from socialink.database import metadata, post_table, replication_heartbeat_table
+from socialink.main import create_app
+from socialink.replicas import STICKY_COOKIE, ReplicaRouter
+
+
+@pytest.fixture()
+async def replica(tmp_path: pathlib.Path):
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    metadata.create_all(sqlalchemy.create_engine(url))
+    replica = Database(url)
+    await replica.connect()
+    yield replica
+    await replica.disconnect()
+
+
+async def replicate_heartbeat(replica: Database, age: float = 0.0) -> None:
+    await replica.execute(
+        replication_heartbeat_table.insert().values(id=1, written_at=time.time() - age)
+    )
+
+
+@pytest.fixture()
+async def router(mocker, db, replica) -> ReplicaRouter:
+    router = ReplicaRouter(db, [replica], max_lag=3.0)
+    mocker.patch("socialink.replicas.replica_router", router)
+    return router
+
+
+@pytest.fixture()
+async def replica_post(replica: Database) -> dict:
+    # Only on the replica, so a read that finds it went there
+    data = {"body": "From the replica", "user_id": 1}
+    post_id = await replica.execute(post_table.insert().values(data))
+    return {**data, "id": post_id}
+
+
+@pytest.mark.anyio
+async def test_reads_go_to_caught_up_replica(
+    async_client: AsyncClient, router, replica, replica_post
+):
+    await replicate_heartbeat(replica)
+    await router.check()
+
+    posts = await async_client.get("/post")
+    post = await async_client.get(f"/post/{replica_post['id']}")
+
+    assert [p["body"] for p in posts.json()] == ["From the replica"]
+    assert post.status_code == 200
+    assert router.lags[0] < 3.0
+
+
+@pytest.mark.anyio
+async def test_lagging_replica_falls_back_to_primary(
+    async_client: AsyncClient, router, replica, replica_post
+):
+    await replicate_heartbeat(replica, age=10.0)
+    await router.check()
+
+    response = await async_client.get("/post")
+
+    assert response.json() == []
+    assert router.lags[0] > 3.0
+
+
+@pytest.mark.anyio
+async def test_unchecked_replica_gets_no_reads(
+    async_client: AsyncClient, router, replica_post
+):
+    response = await async_client.get("/post")
+
+    assert response.json() == []
+
+
+@pytest.mark.anyio
+async def test_reads_after_write_go_to_primary(
+    mocker, router, replica, replica_post, logged_in_token: str
+):
+    await replicate_heartbeat(replica)
+    await router.check()
+    mocker.patch.object(config, "READ_REPLICA_URLS", [str(replica.url)])
+    app = create_app()
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        created = await client.post(
+            "/post",
+            json={"body": "Just written"},
+            headers={"Authorization": f"Bearer {logged_in_token}"},
+        )
+        sticky = await client.get("/post")
+        client.cookies.clear()
+        expired = await client.get("/post")
+
+    assert STICKY_COOKIE in created.cookies
+    assert [p["body"] for p in sticky.json()] == ["Just written"]
+    assert [p["body"] for p in expired.json()] == ["From the replica"]
+
+
+@pytest.mark.anyio
+async def test_failed_write_does_not_pin_to_primary(
+    mocker, router, logged_in_token: str
+):
+    mocker.patch.object(config, "READ_REPLICA_URLS", ["sqlite://"])
+    app = create_app()
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/post", json={}, headers={"Authorization": f"Bearer {logged_in_token}"}
+        )
+
+    assert response.status_code == 422
+    assert STICKY_COOKIE not in response.cookies
+
+
+@pytest.mark.anyio
+async def test_unreachable_replica_is_infinitely_behind(db, tmp_path):
+    # A database with none of the tables, reading the heartbeat fails
+    replica = Database(f"sqlite:///{tmp_path / 'empty.db'}")
+    await replica.connect()
+    router = ReplicaRouter(db, [replica])
+
+    await router.check()
+    await replica.disconnect()
+
+    assert router.lags == [math.inf]
+    assert router.choose() is db
+
+
+def test_choose_round_robins_healthy_replicas():
+    primary, first, second, behind = (object() for _ in range(4))
+    router = ReplicaRouter(primary, [first, second, behind], max_lag=1.0)
+    router.lags = [0.5, 0.0, 5.0]
+
+    assert [router.choose() for _ in range(4)] == [first, second, first, second]
+    assert router.choose(time.time() + 5) is primary
+    assert router.choose(time.time() - 5) in (first, second)
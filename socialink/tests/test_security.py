@@ -154,3 +154,38 @@ async def test_get_current_user_with_wrong_access_token(registered_user: dict):
 
     with pytest.raises(security.HTTPException):
         await security.get_current_user(token)
+
+
+def test_hash_refresh_token():
+    token_hash = security.hash_refresh_token("token")
+
+    assert len(token_hash) == 64
+    assert token_hash == security.hash_refresh_token("token")
+    assert token_hash != security.hash_refresh_token("other")
+
+
+@pytest.mark.anyio
+async def test_rotate_refresh_token(confirmed_user: dict, db):
+    token = await security.create_refresh_token(confirmed_user["id"])
+
+    user, rotated = await security.rotate_refresh_token(token)
+
+    assert user.email == confirmed_user["email"]
+    assert rotated != token
+    stored = await db.fetch_all(security.refresh_token_table.select())
+    assert {row.token_hash for row in stored} == {
+        security.hash_refresh_token(token),
+        security.hash_refresh_token(rotated),
+    }
+    assert len({row.family_id for row in stored}) == 1
+
+
+@pytest.mark.anyio
+async def test_rotate_expired_refresh_token(confirmed_user: dict, mocker):
+    mocker.patch.object(security.config, "REFRESH_TOKEN_EXPIRE_DAYS", -1)
+    token = await security.create_refresh_token(confirmed_user["id"])
+
+    with pytest.raises(security.HTTPException) as exc_info:
+        await security.rotate_refresh_token(token)
+
+    assert exc_info.value.status_code == 401
@@ -0,0 +1,86 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import socialink
+import socialink.config
+
+# Cumulative microseconds `import socialink.main` may take under -X importtime,
+# most of which is spent importing fastapi, sqlalchemy and httpx. It measures
+# about 1.4s, so a 2x regression fails.
+IMPORT_TIME_BUDGET_US = 2_000_000
+# Loaded on first use: storage, image processing and password hashing
+LAZY_MODULES = ["b2sdk", "PIL", "bcrypt"]
+
+
+def run_python(tmp_path, *args: str) -> subprocess.CompletedProcess:
+    env = {
+        **os.environ,
+        "ENV_STATE": "test",
+        "TEST_DATABASE_URL": f"sqlite:///{tmp_path / 'startup.db'}",
+        "PYTHONPATH": str(pathlib.Path(socialink.__file__).parents[1]),
+    }
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_times(tmp_path) -> dict[str, int]:
+    result = run_python(tmp_path, "-X", "importtime", "-c", "import socialink.main")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_import_within_budget(tmp_path):
+    times = import_times(tmp_path)
+
+    assert times["socialink.main"] < IMPORT_TIME_BUDGET_US
+
+
+def test_import_has_no_side_effects(tmp_path):
+    times = import_times(tmp_path)
+
+    assert [module for module in LAZY_MODULES if module in times] == []
+    assert not (tmp_path / "startup.db").exists()
+    assert not (tmp_path / "socialink.log").exists()
+
+
+def test_config_is_built_once_at_import(tmp_path):
+    # Not lazily: socialink.database and the other module level singletons
+    # read it at import, so deferring it would defer nothing
+    result = run_python(
+        tmp_path,
+        "-c",
+        "import socialink.config; "
+        "print(socialink.config.get_config.cache_info().misses); "
+        "import socialink.main; "
+        "print(socialink.config.get_config.cache_info().misses)",
+    )
+
+    assert result.stdout.split() == ["1", "1"]
+
+
+def test_env_file_is_next_to_the_package(tmp_path, monkeypatch):
+    # Where .env.example is, whichever directory the app is started from
+    monkeypatch.chdir(tmp_path)
+    env_file = pathlib.Path(socialink.__file__).parent / ".env"
+
+    for config_class in (
+        socialink.config.BaseConfig,
+        socialink.config.DevConfig,
+        socialink.config.ProdConfig,
+        socialink.config.TestConfig,
+    ):
+        assert pathlib.Path(config_class.model_config["env_file"]) == env_file
@@ -0,0 +1,80 @@
+import hashlib
+import pathlib
+
+import pytest
+from httpx import AsyncClient
+
+from socialink import storage
+from socialink.config import config
+from socialink.tests.helpers import png_bytes
+
+IMAGE = png_bytes(64, 64)
+
+
+@pytest.fixture(autouse=True)
+def storage_dir(mocker, tmp_path: pathlib.Path) -> pathlib.Path:
+    mocker.patch.object(config, "LOCAL_STORAGE_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.anyio
+async def test_put_file_locally(storage_dir, tmp_path_factory):
+    source = tmp_path_factory.mktemp("source") / "photo.png"
+    source.write_bytes(IMAGE)
+
+    url = await storage.put_file(str(source), "uploads/abc/original.png")
+
+    assert url == "/storage/uploads/abc/original.png"
+    assert (storage_dir / "uploads/abc/original.png").read_bytes() == IMAGE
+    assert await storage.find("uploads/abc/original.png") == storage.StoredObject(
+        len(IMAGE), "image/png"
+    )
+
+
+@pytest.mark.anyio
+async def test_put_bytes_locally_and_delete(storage_dir):
+    await storage.put_bytes(b"data", "generated/abc.bin", "application/octet-stream")
+
+    assert [name for name, _ in await storage.list_objects("generated/")] == [
+        "generated/abc.bin"
+    ]
+    await storage.delete("generated/abc.bin")
+    assert await storage.find("generated/abc.bin") is None
+
+
+@pytest.mark.anyio
+async def test_put_bytes_to_b2(mocker):
+    mocker.patch.object(config, "STORAGE_BACKEND", "b2")
+    upload = mocker.patch(
+        "socialink.storage.b2_upload_bytes",
+        return_value="https://cdn.example.com/generated/abc.png",
+    )
+
+    url = await storage.put_bytes(IMAGE, "generated/abc.png", "image/png")
+
+    assert url == "https://cdn.example.com/generated/abc.png"
+    upload.assert_called_once_with(IMAGE, "generated/abc.png", "image/png")
+
+
+@pytest.mark.anyio
+async def test_upload_to_local_storage_is_served(
+    async_client: AsyncClient, storage_dir, mocker
+):
+    async def run_inline(func, *args):
+        return func(*args)
+
+    mocker.patch("socialink.routers.upload.run_in_image_worker", run_inline)
+    b2_upload = mocker.patch("socialink.storage.b2_upload_file")
+
+    response = await async_client.post(
+        "/upload", files={"file": ("photo.png", IMAGE, "image/png")}
+    )
+
+    content_hash = hashlib.sha256(IMAGE).hexdigest()
+    assert response.status_code == 201
+    assert (
+        response.json()["file_url"] == f"/storage/uploads/{content_hash}/original.png"
+    )
+    download = await async_client.get(response.json()["file_url"])
+    assert download.content == IMAGE
+    b2_upload.assert_not_called()
@@ -1,14 +1,19 @@
+import contextlib
 import httpx
 import json
 
 import pytest
+from socialink.config import config
+from socialink.events import event_broker
 from socialink.tasks import (
     send_simple_email,
     APIResponseError,
     _generate_cute_creature_api,
     generate_and_add_to_post,
+    mirror_image,
 )
-from socialink.database import post_table, database
+from socialink.tests.helpers import png_bytes
+from socialink.database import generated_image_table, post_table, database
 from databases import Database
 
 
@@ -73,12 +78,170 @@ async def test_generate_and_add_to_post_success(
         status_code=200, json=json_data, request=httpx.Request("POST", "//")
     )
 
-    await generate_and_add_to_post(
-        confirmed_user["email"], created_post["id"], "/post/1", db, "A cat"
-    )
+    await generate_and_add_to_post(created_post["id"], db, "A cat")
 
     query = post_table.select().where(post_table.c.id == created_post["id"])
 
     updated_post = await db.fetch_one(query)
 
     assert updated_post.image_url == json_data["output_url"]
+    assert updated_post.image_status == "ready"
+
+
+@pytest.mark.anyio
+async def test_generate_and_add_to_post_publishes_event(
+    mock_httpx_client, created_post: dict, db: Database
+):
+    mock_httpx_client.post.return_value = httpx.Response(
+        status_code=200,
+        json={"output_url": "https://example.com/image.jpg"},
+        request=httpx.Request("POST", "//"),
+    )
+    subscription = event_broker.subscribe(created_post["id"])
+
+    await generate_and_add_to_post(created_post["id"], db, "A cat")
+    event_broker.unsubscribe(subscription)
+
+    message = await subscription.get()
+    assert b"event: post_image" in message
+    assert b'"image_status": "ready"' in message
+
+
+@pytest.mark.anyio
+async def test_generate_and_add_to_post_failure(
+    mock_httpx_client, created_post: dict, db: Database, mocker
+):
+    mocker.patch("socialink.generation.generation_pipeline.retries", 0)
+    mock_httpx_client.post.return_value = httpx.Response(
+        status_code=500, content="", request=httpx.Request("POST", "//")
+    )
+
+    await generate_and_add_to_post(created_post["id"], db, "A cat")
+
+    query = post_table.select().where(post_table.c.id == created_post["id"])
+    updated_post = await db.fetch_one(query)
+
+    assert updated_post.image_url is None
+    assert updated_post.image_status == "failed"
+    assert [call.args[0] for call in mock_httpx_client.post.call_args_list][-1] == (
+        "https://api.deepai.org/api/cute-creature-generator"
+    )
+
+
+@pytest.mark.anyio
+async def test_generate_and_add_to_post_reuses_cached_image(
+    mock_httpx_client, created_post: dict, confirmed_user: dict, db: Database
+):
+    json_data = {"output_url": "https://example.com/image.jpg"}
+    mock_httpx_client.post.return_value = httpx.Response(
+        status_code=200, json=json_data, request=httpx.Request("POST", "//")
+    )
+
+    for _ in range(2):
+        await generate_and_add_to_post(created_post["id"], db, "A cat")
+
+    generation_calls = [
+        call
+        for call in mock_httpx_client.post.call_args_list
+        if "deepai" in call.args[0]
+    ]
+    assert len(generation_calls) == 1
+
+
+def serve_download(mocker, mock_httpx_client, content) -> None:
+    @contextlib.asynccontextmanager
+    async def stream(method, url, **kwargs):
+        yield httpx.Response(
+            status_code=200,
+            content=content,
+            headers={"content-type": "image/png"},
+            request=httpx.Request(method, url),
+        )
+
+    mock_httpx_client.stream = mocker.Mock(side_effect=stream)
+
+
+@pytest.fixture()
+def mirror_storage(mocker, mock_httpx_client):
+    mocker.patch.object(config, "MIRROR_GENERATED_IMAGES", True)
+    serve_download(mocker, mock_httpx_client, png_bytes(2000, 1000))
+
+    async def run_inline(func, *args):
+        return func(*args)
+
+    mocker.patch("socialink.tasks.run_in_image_worker", run_inline)
+    return mocker.patch(
+        "socialink.storage.put_bytes",
+        side_effect=lambda data, name, content_type: f"https://cdn.example.com/{name}",
+    )
+
+
+@pytest.mark.anyio
+async def test_mirror_image(mirror_storage):
+    image = await mirror_image("https://api.deepai.org/image.png")
+
+    uploaded = {call.args[1]: call.args[2] for call in mirror_storage.call_args_list}
+    assert image["output_url"].endswith(".png")
+    assert image["thumbnail_url"].endswith("-thumbnail.jpg")
+    assert image["medium_url"].endswith("-medium.jpg")
+    assert sorted(uploaded.values()) == ["image/jpeg", "image/jpeg", "image/png"]
+
+
+@pytest.mark.anyio
+async def test_generate_and_add_to_post_mirrors_image(
+    mock_httpx_client, mirror_storage, created_post: dict, db: Database
+):
+    mock_httpx_client.post.return_value = httpx.Response(
+        status_code=200,
+        json={"output_url": "https://api.deepai.org/image.png"},
+        request=httpx.Request("POST", "//"),
+    )
+
+    await generate_and_add_to_post(created_post["id"], db, "A cat")
+
+    query = post_table.select().where(post_table.c.id == created_post["id"])
+    updated_post = await db.fetch_one(query)
+    assert updated_post.image_url.startswith("https://cdn.example.com/generated/")
+    assert updated_post.thumbnail_url.endswith("-thumbnail.jpg")
+    assert updated_post.medium_url.endswith("-medium.jpg")
+
+
+@pytest.mark.anyio
+async def test_generate_and_add_to_post_links_original_when_mirror_fails(
+    mock_httpx_client, mirror_storage, created_post: dict, db: Database
+):
+    mirror_storage.side_effect = RuntimeError("B2 is down")
+    mock_httpx_client.post.return_value = httpx.Response(
+        status_code=200,
+        json={"output_url": "https://api.deepai.org/image.png"},
+        request=httpx.Request("POST", "//"),
+    )
+
+    await generate_and_add_to_post(created_post["id"], db, "A cat")
+
+    query = post_table.select().where(post_table.c.id == created_post["id"])
+    updated_post = await db.fetch_one(query)
+    assert updated_post.image_url == "https://api.deepai.org/image.png"
+    assert updated_post.image_status == "ready"
+    # The third-party link isn't cached, the next post tries to mirror again
+    assert not await db.fetch_all(generated_image_table.select())
+
+
+@pytest.mark.anyio
+async def test_mirror_image_stops_reading_past_max_bytes(
+    mocker, mock_httpx_client, mirror_storage
+):
+    mocker.patch.object(config, "GENERATED_IMAGE_MAX_BYTES", 1000)
+    sent = []
+
+    async def chunks():
+        for _ in range(100):
+            sent.append(1)
+            yield b"x" * 500
+
+    serve_download(mocker, mock_httpx_client, chunks())
+
+    with pytest.raises(APIResponseError, match="too large"):
+        await mirror_image("https://api.deepai.org/image.png")
+    assert len(sent) == 3
+    mirror_storage.assert_not_called()
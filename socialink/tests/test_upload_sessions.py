@@ -0,0 +1,31 @@
+import pytest
+
+from socialink.upload_sessions import add_range, missing_ranges
+
+
+@pytest.mark.parametrize(
+    "ranges, new, merged",
+    [
+        ([], (0, 10), [[0, 10]]),
+        ([[0, 10]], (10, 20), [[0, 20]]),
+        ([[0, 10]], (20, 30), [[0, 10], [20, 30]]),
+        ([[20, 30]], (0, 10), [[0, 10], [20, 30]]),
+        ([[0, 10], [20, 30]], (5, 25), [[0, 30]]),
+        ([[0, 10]], (0, 10), [[0, 10]]),
+    ],
+)
+def test_add_range(ranges, new, merged):
+    assert add_range(ranges, *new) == merged
+
+
+@pytest.mark.parametrize(
+    "ranges, missing",
+    [
+        ([], [[0, 100]]),
+        ([[0, 100]], []),
+        ([[10, 20], [50, 100]], [[0, 10], [20, 50]]),
+        ([[0, 20]], [[20, 100]]),
+    ],
+)
+def test_missing_ranges(ranges, missing):
+    assert missing_ranges(ranges, 100) == missing
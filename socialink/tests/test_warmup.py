@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from socialink.warmup import Warmup, warm_database
+
+
+async def succeed():
+    pass
+
+
+async def fail():
+    raise RuntimeError("B2 is down")
+
+
+async def hang():
+    await asyncio.sleep(10)
+
+
+@pytest.mark.anyio
+async def test_ready_when_required_steps_succeed():
+    warmup = Warmup({"database": succeed, "storage": fail}, required=["database"])
+
+    await warmup.run()
+
+    assert warmup.ready
+    assert warmup.results["database"].ok
+    assert warmup.results["storage"].error == "RuntimeError('B2 is down')"
+
+
+@pytest.mark.anyio
+async def test_not_ready_when_required_step_fails():
+    warmup = Warmup({"database": fail, "storage": succeed}, required=["database"])
+
+    await warmup.run()
+
+    assert warmup.done.is_set()
+    assert not warmup.ready
+
+
+@pytest.mark.anyio
+async def test_not_ready_until_done():
+    warmup = Warmup({"database": hang}, required=[])
+
+    warmup.start()
+    await asyncio.sleep(0)
+
+    assert not warmup.ready
+    await warmup.stop()
+
+
+@pytest.mark.anyio
+async def test_step_timeout():
+    warmup = Warmup({"database": hang}, required=["database"], timeout=0.01)
+
+    await warmup.run()
+
+    assert not warmup.ready
+    assert "TimeoutError" in warmup.results["database"].error
+
+
+@pytest.mark.anyio
+async def test_warm_database(db):
+    await warm_database(db, connections=2)
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from socialink.watchdog import BACKGROUND, LoopWatchdog
+
+
+def block_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.fixture()
+async def watchdog():
+    watchdog = LoopWatchdog(threshold=0.05, interval=0.01)
+    watchdog.start()
+    await asyncio.sleep(0.02)
+    yield watchdog
+    await watchdog.stop()
+
+
+@pytest.mark.anyio
+async def test_detects_stall_with_stack(watchdog: LoopWatchdog):
+    block_loop(0.2)
+    await asyncio.sleep(0.05)
+
+    assert watchdog.stalls == {BACKGROUND: 1}
+    stall = watchdog.recent[0]
+    assert stall.duration >= 0.05
+    assert "block_loop" in stall.stack
+
+
+@pytest.mark.anyio
+async def test_ignores_short_pauses(watchdog: LoopWatchdog):
+    block_loop(0.01)
+    await asyncio.sleep(0.05)
+
+    assert not watchdog.stalls
+
+
+@pytest.mark.anyio
+async def test_counts_stalls_per_route(watchdog: LoopWatchdog):
+    scope = {
+        "method": "GET",
+        "path": "/post/1",
+        "route": SimpleNamespace(path="/post/{post_id}"),
+    }
+    watchdog.track(asyncio.current_task(), scope)
+
+    for _ in range(2):
+        block_loop(0.1)
+        await asyncio.sleep(0.05)
+    watchdog.untrack(asyncio.current_task())
+
+    assert watchdog.stalls == {"GET /post/{post_id}": 2}
+
+
+@pytest.mark.anyio
+async def test_stall_is_logged(watchdog: LoopWatchdog, caplog):
+    with caplog.at_level(logging.WARNING, logger="socialink"):
+        block_loop(0.2)
+        await asyncio.sleep(0.05)
+
+    assert "Event loop blocked for at least" in caplog.text
@@ -0,0 +1,151 @@
+import logging
+from typing import Optional
+
+import sqlalchemy
+from databases import Database
+
+from socialink.config import config
+from socialink.database import (
+    follows_table,
+    post_ranking_table,
+    post_table,
+    pulled_post_table,
+    timeline_table,
+    upsert,
+    users_table,
+)
+
+logger = logging.getLogger(__name__)
+
+select_posts_with_likes = sqlalchemy.select(
+    post_table,
+    sqlalchemy.func.coalesce(post_ranking_table.c.likes, 0).label("likes"),
+)
+
+
+async def fan_out_post(database: Database, post_id: int, author_id: int) -> None:
+    # Posts of accounts above TIMELINE_FANOUT_THRESHOLD are only written to the
+    # author's own timeline and marked as pulled, followers pull them in when
+    # reading instead. The mark stays when the follower count drops again.
+    query = timeline_table.insert().values(user_id=author_id, post_id=post_id)
+    logger.debug(query)
+    await database.execute(query)
+
+    query = sqlalchemy.select(users_table.c.follower_count).where(
+        users_table.c.id == author_id
+    )
+    follower_count = await database.fetch_val(query) or 0
+    if follower_count > config.TIMELINE_FANOUT_THRESHOLD:
+        logger.debug(f"Skipping fan-out of post {post_id} to {follower_count} users")
+        query = pulled_post_table.insert().values(user_id=author_id, post_id=post_id)
+        await database.execute(query)
+        return
+
+    query = timeline_table.insert().from_select(
+        ["user_id", "post_id"],
+        sqlalchemy.select(
+            follows_table.c.follower_id, sqlalchemy.literal(post_id)
+        ).where(follows_table.c.followee_id == author_id),
+    )
+    logger.debug(query)
+    await database.execute(query)
+
+
+async def get_timeline(
+    database: Database, user_id: int, before: Optional[int], limit: int
+) -> list:
+    pushed = (
+        select_posts_with_likes.select_from(
+            timeline_table.join(post_table).outerjoin(post_ranking_table)
+        )
+        .where(timeline_table.c.user_id == user_id)
+        .order_by(timeline_table.c.post_id.desc())
+        .limit(limit)
+    )
+
+    followed = sqlalchemy.select(follows_table.c.followee_id).where(
+        follows_table.c.follower_id == user_id
+    )
+    pulled = (
+        select_posts_with_likes.select_from(
+            pulled_post_table.join(post_table).outerjoin(post_ranking_table)
+        )
+        .where(pulled_post_table.c.user_id.in_(followed))
+        .order_by(pulled_post_table.c.post_id.desc())
+        .limit(limit)
+    )
+
+    if before is not None:
+        pushed = pushed.where(timeline_table.c.post_id < before)
+        pulled = pulled.where(pulled_post_table.c.post_id < before)
+
+    logger.debug(pushed)
+    posts = {post.id: post for post in await database.fetch_all(pushed)}
+    for post in await database.fetch_all(pulled):
+        posts.setdefault(post.id, post)
+
+    return [posts[post_id] for post_id in sorted(posts, reverse=True)[:limit]]
+
+
+async def follow_user(database: Database, follower_id: int, followee_id: int) -> bool:
+    async with database.transaction():
+        # Of concurrent requests to follow, only the one that inserts the row
+        # counts the follower and fills the timeline
+        followed = await database.fetch_one(
+            upsert(database, follows_table)
+            .values(follower_id=follower_id, followee_id=followee_id)
+            .on_conflict_do_nothing()
+            .returning(follows_table.c.follower_id)
+        )
+        if followed is None:
+            return False
+
+        await database.execute(
+            users_table.update()
+            .where(users_table.c.id == followee_id)
+            .values(follower_count=users_table.c.follower_count + 1)
+        )
+        # Starts the new follower off with the followee's recent posts
+        recent_posts = (
+            sqlalchemy.select(sqlalchemy.literal(follower_id), post_table.c.id)
+            .where(post_table.c.user_id == followee_id)
+            .order_by(post_table.c.id.desc())
+            .limit(config.TIMELINE_FOLLOW_BACKFILL)
+        )
+        await database.execute(
+            upsert(database, timeline_table)
+            .from_select(["user_id", "post_id"], recent_posts)
+            .on_conflict_do_nothing()
+        )
+    return True
+
+
+async def unfollow_user(database: Database, follower_id: int, followee_id: int) -> bool:
+    async with database.transaction():
+        unfollowed = await database.fetch_one(
+            follows_table.delete()
+            .where(
+                follows_table.c.follower_id == follower_id,
+                follows_table.c.followee_id == followee_id,
+            )
+            .returning(follows_table.c.follower_id)
+        )
+        if unfollowed is None:
+            return False
+
+        await database.execute(
+            users_table.update()
+            .where(users_table.c.id == followee_id)
+            .values(follower_count=users_table.c.follower_count - 1)
+        )
+        await database.execute(
+            timeline_table.delete().where(
+                timeline_table.c.user_id == follower_id,
+                timeline_table.c.post_id.in_(
+                    sqlalchemy.select(post_table.c.id).where(
+                        post_table.c.user_id == followee_id
+                    )
+                ),
+            )
+        )
+    return True
@@ -0,0 +1,184 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import pathlib
+import secrets
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator
+
+from socialink.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def add_range(ranges: list[list[int]], start: int, end: int) -> list[list[int]]:
+    """Adds the half open range [start, end) and merges overlapping ranges."""
+    merged = []
+    for current in sorted([*ranges, [start, end]]):
+        if merged and current[0] <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], current[1])
+        else:
+            merged.append(list(current))
+    return merged
+
+
+def missing_ranges(ranges: list[list[int]], size: int) -> list[list[int]]:
+    missing, position = [], 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+
+class UploadSessionNotFound(Exception):
+    pass
+
+
+class ChunkOutOfRange(Exception):
+    pass
+
+
+@dataclass
+class UploadSession:
+    id: str
+    size: int
+    file_name: str
+    created_at: float
+    received: list[list[int]] = field(default_factory=list)
+
+    @property
+    def missing(self) -> list[list[int]]:
+        return missing_ranges(self.received, self.size)
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing
+
+
+class UploadSessionStore:
+    """Resumable uploads, kept on local disk until they are complete.
+
+    Each session is a file that chunks are written straight into at their
+    offset, growing only as bytes arrive, and a JSON file of the byte ranges
+    received so far. Chunks can arrive in any order and concurrently,
+    even on different workers, since updates to the JSON file are serialised
+    with a lock on the data file.
+    """
+
+    def __init__(self, directory: str, ttl: float) -> None:
+        self.directory = pathlib.Path(directory)
+        self.ttl = ttl
+
+    def data_path(self, session_id: str) -> pathlib.Path:
+        return self.directory / f"{session_id}.part"
+
+    def state_path(self, session_id: str) -> pathlib.Path:
+        return self.directory / f"{session_id}.json"
+
+    def _write_state(self, session: UploadSession) -> None:
+        # Written aside and renamed so a crash never leaves half a state file
+        temp_path = self.state_path(session.id).with_suffix(".tmp")
+        temp_path.write_text(json.dumps(asdict(session)))
+        os.replace(temp_path, self.state_path(session.id))
+
+    def _read_state(self, session_id: str) -> UploadSession:
+        # Ids come from the URL, only ever look them up as generated
+        if not session_id.replace("-", "").replace("_", "").isalnum():
+            raise UploadSessionNotFound(session_id)
+        try:
+            return UploadSession(**json.loads(self.state_path(session_id).read_text()))
+        except FileNotFoundError:
+            raise UploadSessionNotFound(session_id) from None
+
+    @contextmanager
+    def _locked(self, session_id: str):
+        try:
+            fd = os.open(self.data_path(session_id), os.O_RDONLY)
+        except FileNotFoundError:
+            raise UploadSessionNotFound(session_id) from None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _create(self, size: int, file_name: str) -> UploadSession:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        session = UploadSession(secrets.token_urlsafe(24), size, file_name, time.time())
+        # Empty until chunks arrive, so opening a session costs no disk space
+        os.close(
+            os.open(self.data_path(session.id), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        )
+        self._write_state(session)
+        return session
+
+    def _record(self, session_id: str, start: int, end: int) -> UploadSession:
+        with self._locked(session_id):
+            session = self._read_state(session_id)
+            session.received = add_range(session.received, start, end)
+            self._write_state(session)
+        return session
+
+    def _delete(self, session_id: str) -> None:
+        for path in (self.data_path(session_id), self.state_path(session_id)):
+            path.unlink(missing_ok=True)
+
+    def _sweep(self) -> None:
+        if not self.directory.exists():
+            return
+        expires = time.time() - self.ttl
+        for path in self.directory.glob("*.json"):
+            if path.stat().st_mtime < expires:
+                logger.info(f"Removing expired upload session {path.stem}")
+                self._delete(path.stem)
+
+    async def create(self, size: int, file_name: str) -> UploadSession:
+        await asyncio.to_thread(self._sweep)
+        session = await asyncio.to_thread(self._create, size, file_name)
+        logger.info(f"Created upload session {session.id} for {size} bytes")
+        return session
+
+    async def get(self, session_id: str) -> UploadSession:
+        return await asyncio.to_thread(self._read_state, session_id)
+
+    async def write(
+        self, session_id: str, offset: int, chunks: AsyncIterator[bytes]
+    ) -> UploadSession:
+        """Writes a chunk at `offset` and records it once it is all on disk.
+
+        A chunk cut off part way is not recorded at all, so the client sends
+        it again in full when it resumes.
+        """
+        session = await self.get(session_id)
+        if not 0 <= offset <= session.size:
+            raise ChunkOutOfRange(f"Offset {offset} is outside the upload")
+        fd = os.open(self.data_path(session_id), os.O_WRONLY)
+        try:
+            position = offset
+            async for chunk in chunks:
+                if position + len(chunk) > session.size:
+                    raise ChunkOutOfRange("Chunk runs past the end of the upload")
+                # pwrite doesn't move a shared file position, concurrent
+                # chunks of the same upload each write their own range
+                await asyncio.to_thread(os.pwrite, fd, chunk, position)
+                position += len(chunk)
+        finally:
+            os.close(fd)
+        if position == offset:
+            return session
+        return await asyncio.to_thread(self._record, session_id, offset, position)
+
+    async def delete(self, session_id: str) -> None:
+        await asyncio.to_thread(self._delete, session_id)
+
+
+upload_sessions = UploadSessionStore(
+    config.UPLOAD_SESSION_DIR, config.UPLOAD_SESSION_TTL
+)
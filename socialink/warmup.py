@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from databases import Database
+
+from socialink.config import GlobalConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StepResult:
+    ok: bool
+    duration: float
+    error: Optional[str] = None
+
+
+class Warmup:
+    """Runs the warm-up steps concurrently and tracks whether the app is ready.
+
+    The app counts as ready once every step has finished and all of the
+    `required` ones succeeded. Steps that aren't required only log a warning
+    when they fail, the first requests just pay their setup cost instead.
+    """
+
+    def __init__(
+        self,
+        steps: dict[str, Callable[[], Awaitable]],
+        required: list[str],
+        timeout: float = 30.0,
+    ) -> None:
+        self.steps = steps
+        self.required = [name for name in required if name in steps]
+        self.timeout = timeout
+        self.results: dict[str, StepResult] = {}
+        self.done = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.done.is_set() and all(
+            self.results[name].ok for name in self.required
+        )
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable]) -> None:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(step(), self.timeout)
+        except Exception as err:
+            self.results[name] = StepResult(
+                False, time.perf_counter() - started, repr(err)
+            )
+            logger.warning(f"Warm-up step {name} failed: {err!r}")
+        else:
+            self.results[name] = StepResult(True, time.perf_counter() - started)
+            logger.debug(f"Warm-up step {name} took {self.results[name].duration:.3f}s")
+
+    async def run(self) -> None:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(self._run_step(name, step) for name, step in self.steps.items())
+        )
+        self.done.set()
+        logger.info(
+            f"Warm-up finished in {time.perf_counter() - started:.3f}s, "
+            f"{'ready' if self.ready else 'not ready'}"
+        )
+
+    def start(self) -> asyncio.Task:
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+async def warm_database(database: Database, connections: int) -> None:
+    # Every task gets its own connection, so this opens `connections` of them
+    await asyncio.gather(*(database.fetch_val("SELECT 1") for _ in range(connections)))
+
+
+async def warm_storage(config: GlobalConfig) -> None:
+    from socialink.libs.b2 import b2_api, b2_get_bucket
+
+    # Authorizing and looking up the bucket are cached for the worker's lifetime
+    if config.STORAGE_BACKEND == "b2" and config.B2_KEY_ID:
+        await asyncio.to_thread(lambda: b2_get_bucket(b2_api()))
+
+
+async def warm_password_hashing() -> None:
+    from socialink.security import pwd_context
+
+    # Picks and loads the bcrypt backend, which passlib does on first use
+    await asyncio.to_thread(pwd_context.hash, "warm-up")
+
+
+async def warm_http_client() -> None:
+    # Loads the CA bundle and the modules httpx imports lazily
+    async with httpx.AsyncClient():
+        pass
+
+
+async def warm_image_workers(workers: int) -> None:
+    from socialink.libs.images import run_in_image_worker, warm_image_worker
+
+    # Worker processes are spawned one per job waiting, so queue one each
+    await asyncio.gather(
+        *(run_in_image_worker(warm_image_worker) for _ in range(workers))
+    )
+
+
+async def warm_routes(app, paths: list[str]) -> None:
+    # The first request to a route builds its SQL and response validators
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://warmup"
+    ) as client:
+        for path in paths:
+            response = await client.get(path)
+            response.raise_for_status()
+
+
+def default_steps(app, database: Database, config: GlobalConfig) -> dict:
+    steps = {
+        "database": lambda: warm_database(database, config.DB_MIN_SIZE),
+        "storage": lambda: warm_storage(config),
+        "password_hashing": warm_password_hashing,
+        "http_client": warm_http_client,
+        "image_workers": lambda: warm_image_workers(config.IMAGE_WORKERS),
+        "routes": lambda: warm_routes(app, config.WARMUP_ROUTES),
+    }
+    return {name: step for name, step in steps.items() if name in config.WARMUP_STEPS}
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Optional
+
+from asgi_correlation_id import correlation_id
+
+logger = logging.getLogger(__name__)
+
+# Label for stalls that happen outside of a request, e.g. in the like buffer
+BACKGROUND = "background"
+
+
+@dataclass
+class Stall:
+    route: str
+    correlation_id: Optional[str]
+    duration: float
+    stack: str
+
+
+class LoopWatchdog:
+    """Detects code that blocks the event loop.
+
+    A coroutine on the loop records a heartbeat every `interval` seconds and a
+    thread checks how old the last one is. Once it is more than `threshold`
+    seconds late the thread grabs the loop thread's stack, which is the code
+    holding the loop at that moment, and the request the running task serves.
+    """
+
+    def __init__(
+        self, threshold: float = 0.1, interval: float = 0.02, max_stalls: int = 50
+    ) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls: Counter = Counter()
+        self.recent: deque[Stall] = deque(maxlen=max_stalls)
+        self._requests: dict[asyncio.Task, tuple[dict, Optional[str]]] = {}
+        self._last_beat = time.monotonic()
+        self._reported_beat: Optional[float] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def track(self, task: asyncio.Task, scope: dict) -> None:
+        self._requests[task] = (scope, correlation_id.get())
+
+    def untrack(self, task: asyncio.Task) -> None:
+        self._requests.pop(task, None)
+
+    def route(self, task: Optional[asyncio.Task]) -> tuple[str, Optional[str]]:
+        if task not in self._requests:
+            return BACKGROUND, None
+        scope, request_id = self._requests[task]
+        # FastAPI stores the matched route in the scope, the template keeps the
+        # number of labels bounded unlike the raw path
+        route = scope.get("route")
+        path = route.path if route else scope["path"]
+        return f"{scope['method']} {path}", request_id
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _monitor(self) -> None:
+        while not self._stopped.wait(self.interval):
+            last_beat = self._last_beat
+            lag = time.monotonic() - last_beat - self.interval
+            # Every stall is reported once, when it first crosses the threshold
+            if lag >= self.threshold and last_beat != self._reported_beat:
+                self._reported_beat = last_beat
+                try:
+                    self.report(lag)
+                except Exception:
+                    logger.exception("Failed to report event loop stall")
+
+    def report(self, lag: float) -> Stall:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame else ""
+        route, request_id = self.route(asyncio.current_task(self._loop))
+        stall = Stall(route, request_id, lag, stack)
+        self.stalls[route] += 1
+        self.recent.append(stall)
+
+        # Logged with the blocked request's correlation id rather than none
+        token = correlation_id.set(request_id)
+        try:
+            logger.warning(
+                f"Event loop blocked for at least {lag * 1000:.0f}ms in {route}\n{stack}"
+            )
+        finally:
+            correlation_id.reset(token)
+        return stall
+
+    def start(self) -> None:
+        if self._heartbeat_task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._monitor, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if self._heartbeat_task is None:
+            return
+        self._stopped.set()
+        self._heartbeat_task.cancel()
+        try:
+            await self._heartbeat_task
+        except asyncio.CancelledError:
+            pass
+        self._heartbeat_task = None
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+
+class StallTrackingMiddleware:
+    """Lets the watchdog attribute a stall to the request being served."""
+
+    def __init__(self, app, watchdog: LoopWatchdog) -> None:
+        self.app = app
+        self.watchdog = watchdog
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        self.watchdog.track(task, scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.watchdog.untrack(task)